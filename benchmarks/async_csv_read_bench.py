@@ -0,0 +1,75 @@
+# coding: utf8
+"""
+对比同步CsvFileUtils与AsyncCsvFileUtils逐行/按批读取csv的吞吐
+
+用法: python benchmarks/async_csv_read_bench.py [行数] [每批行数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common_utils.async_file_utils import AsyncCsvFileUtils
+from common_utils.file_utils import CsvFileUtils
+
+
+def make_csv(file_path, rows):
+    header = ['id', 'name', 'city', 'comment', 'score']
+    data = ([i, 'user_%d' % i, 'city_%d' % (i % 100), 'line1\nline2, "quoted"' if i % 50 == 0 else 'plain', i * 0.5]
+            for i in range(rows))
+    CsvFileUtils(file_path).write_csv(data, header=header)
+
+
+def bench_sync(file_path):
+    count = 0
+    for _ in CsvFileUtils(file_path).read_csv_generator(header=False):
+        count += 1
+    return count
+
+
+async def bench_async_rows(file_path, batch_size):
+    count = 0
+    async for _ in AsyncCsvFileUtils(file_path, batch_size=batch_size).read_csv_generator(header=False):
+        count += 1
+    return count
+
+
+async def bench_async_batches(file_path, batch_size):
+    count = 0
+    async for batch in AsyncCsvFileUtils(file_path, batch_size=batch_size).read_csv_batches(header=True):
+        count += len(batch)
+    return count
+
+
+def report(name, count, size, elapsed):
+    print('%-24s %10d %10.3f %12.1f %12.0f' % (name, count, elapsed, size / 1024 / 1024 / elapsed, count / elapsed))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'bench.csv')
+        make_csv(file_path, rows)
+        size = os.path.getsize(file_path)
+        print('文件大小: %.1f MB' % (size / 1024 / 1024))
+        print('%-24s %10s %10s %12s %12s' % ('方式', '行数', '耗时(s)', 'MB/s', '行/s'))
+
+        start = time.perf_counter()
+        count = bench_sync(file_path)
+        report('sync read_csv_generator', count, size, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        count = asyncio.run(bench_async_rows(file_path, batch_size))
+        report('async read_csv_generator', count, size, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        count = asyncio.run(bench_async_batches(file_path, batch_size))
+        report('async read_csv_batches', count, size, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
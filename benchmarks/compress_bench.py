@@ -0,0 +1,55 @@
+# coding: utf8
+"""
+对比不压缩与各压缩格式下CsvFileUtils写入、逐行读取的耗时和磁盘读取字节数
+
+用法: python benchmarks/compress_bench.py [行数] [压缩级别]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common_utils.file_utils import CsvFileUtils
+
+
+def make_rows(rows):
+    return ([i, 'user_%d' % i, 'city_%d' % (i % 100), i * 0.5, 'some repeated comment text'] for i in range(rows))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    level = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    codecs = [('', None), ('.gz', 'gzip'), ('.bz2', 'bz2'), ('.xz', 'xz')]
+    try:
+        import zstandard  # noqa: F401
+        codecs.append(('.zst', 'zstd'))
+    except ImportError:
+        print('未安装zstandard，跳过zstd')
+
+    print('%8s %12s %12s %12s %10s' % ('格式', '磁盘MB', '写入(s)', '读取(s)', '压缩比'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_size = None
+        for ext, codec in codecs:
+            file_path = os.path.join(tmp_dir, 'bench.csv' + ext)
+            csv_utils = CsvFileUtils(file_path, codec=codec, compress_level=level)
+
+            start = time.perf_counter()
+            csv_utils.write_csv(make_rows(rows), header=['id', 'name', 'city', 'score', 'comment'])
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in csv_utils.read_csv_generator():
+                pass
+            read_time = time.perf_counter() - start
+
+            # 读取时从磁盘读入的字节数即文件大小
+            size = os.path.getsize(file_path)
+            raw_size = raw_size or size
+            print('%8s %12.1f %12.3f %12.3f %10.1f' % (
+                codec or 'none', size / 1024 / 1024, write_time, read_time, raw_size / size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# coding: utf8
+"""
+对比CsvFileUtils单进程读取与多进程并行读取的吞吐
+
+用法: python benchmarks/csv_read_bench.py [行数] [进程数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common_utils.file_utils import CsvFileUtils, CsvReadStats
+
+
+def make_csv(file_path, rows):
+    csv_utils = CsvFileUtils(file_path)
+    header = ['id', 'name', 'city', 'comment', 'score']
+    data = ([i, 'user_%d' % i, 'city_%d' % (i % 100), 'line1\nline2, "quoted"' if i % 50 == 0 else 'plain', i * 0.5]
+            for i in range(rows))
+    csv_utils.write_csv(data, header=header)
+
+
+def bench_single(csv_utils):
+    stats = CsvReadStats()
+    stats.bytes = os.path.getsize(csv_utils.file_path)
+    stats.start()
+    for _ in csv_utils.read_csv_generator(header=False):
+        stats.rows += 1
+    stats.stop()
+    return stats
+
+
+def bench_parallel(csv_utils, max_workers, ordered):
+    stats = CsvReadStats()
+    for _ in csv_utils.read_csv_parallel(header=True, ordered=ordered, max_workers=max_workers,
+                                         chunk_bytes=8 * 1024 * 1024, stats=stats):
+        pass
+    return stats
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'bench.csv')
+        start = time.perf_counter()
+        make_csv(file_path, rows)
+        print('生成 %d 行, %.1f MB, 耗时 %.2fs' % (
+            rows, os.path.getsize(file_path) / 1024 / 1024, time.perf_counter() - start))
+
+        csv_utils = CsvFileUtils(file_path)
+        print('单进程 read_csv_generator:', bench_single(csv_utils))
+        print('并行有序 read_csv_parallel:', bench_parallel(csv_utils, max_workers, ordered=True))
+        print('并行无序 read_csv_parallel:', bench_parallel(csv_utils, max_workers, ordered=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# coding: utf8
+"""
+对比ExcelUtils.append_data流式追加与读取-合并-重写两种方式随sheet增大的耗时
+
+用法: python benchmarks/excel_append_bench.py [追加行数]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from common_utils.file_utils import ExcelUtils
+
+
+def make_frame(rows, start=0):
+    return pd.DataFrame({
+        'id': range(start, start + rows),
+        'name': ['name_%d' % i for i in range(start, start + rows)],
+        'value': [i * 0.5 for i in range(start, start + rows)],
+    })
+
+
+def time_append(file_path, data, streaming):
+    start = time.perf_counter()
+    ExcelUtils(file_path).append_data(data, sheet_name='Sheet1', streaming=streaming)
+    return time.perf_counter() - start
+
+
+def main():
+    append_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    data = make_frame(append_rows, start=10 ** 7)
+    print('%10s %12s %12s %12s' % ('sheet行数', '文件MB', '流式追加(s)', '重写追加(s)'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for sheet_rows in (10000, 50000, 100000, 200000):
+            base_path = os.path.join(tmp_dir, 'base_%d.xlsx' % sheet_rows)
+            make_frame(sheet_rows).to_excel(base_path, sheet_name='Sheet1', index=False)
+            streaming_path = os.path.join(tmp_dir, 'streaming.xlsx')
+            rewrite_path = os.path.join(tmp_dir, 'rewrite.xlsx')
+            shutil.copy(base_path, streaming_path)
+            shutil.copy(base_path, rewrite_path)
+            print('%10d %12.1f %12.3f %12.3f' % (
+                sheet_rows, os.path.getsize(base_path) / 1024 / 1024,
+                time_append(streaming_path, data, streaming=True),
+                time_append(rewrite_path, data, streaming=False)))
+
+
+if __name__ == '__main__':
+    main()
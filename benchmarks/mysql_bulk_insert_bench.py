@@ -0,0 +1,63 @@
+# coding: utf8
+"""
+对比MysqlPool逐行save_mysql与bulk_insert的写入吞吐，需要可写的MySQL库，会创建并删除表bulk_insert_bench
+
+用法: python benchmarks/mysql_bulk_insert_bench.py host port user password database [行数] [并行连接数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common_utils.mysql_utils import MysqlPool, close_mysql_pools
+
+TABLE = 'bulk_insert_bench'
+
+
+def make_rows(rows):
+    return ([i, 'user_%d' % i, 'city_%d' % (i % 100), i * 0.5] for i in range(rows))
+
+
+async def run(config, rows, concurrency):
+    pool = MysqlPool(config=config, maxsize=max(concurrency, 4))
+    await pool.save_mysql('DROP TABLE IF EXISTS %s' % TABLE)
+    await pool.save_mysql('CREATE TABLE %s (id BIGINT PRIMARY KEY, name VARCHAR(64), city VARCHAR(64), '
+                          'score DOUBLE)' % TABLE)
+    try:
+        # 逐行写入较慢，只写入十分之一的行估算吞吐
+        single_rows = max(rows // 10, 1)
+        start = time.perf_counter()
+        for row in make_rows(single_rows):
+            await pool.save_mysql('INSERT INTO %s (id, name, city, score) VALUES (%%s, %%s, %%s, %%s)' % TABLE, row)
+        elapsed = time.perf_counter() - start
+        print('%-12s %10d %10.3f %12.0f' % ('save_mysql', single_rows, elapsed, single_rows / elapsed))
+
+        await pool.save_mysql('TRUNCATE TABLE %s' % TABLE)
+        result = await pool.bulk_insert(TABLE, ['id', 'name', 'city', 'score'], make_rows(rows),
+                                        concurrency=concurrency)
+        print('%-12s %10d %10.3f %12.0f' % ('bulk_insert', result.rows, result.elapsed, result.rows_per_sec))
+
+        result = await pool.bulk_upsert(TABLE, ['id', 'name', 'city', 'score'], make_rows(rows),
+                                        update_columns=['score'], concurrency=concurrency)
+        print('%-12s %10d %10.3f %12.0f' % ('bulk_upsert', result.rows, result.elapsed, result.rows_per_sec))
+    finally:
+        await pool.save_mysql('DROP TABLE IF EXISTS %s' % TABLE)
+        await close_mysql_pools()
+
+
+def main():
+    if len(sys.argv) < 6:
+        print(__doc__)
+        sys.exit(1)
+    config = {'host': sys.argv[1], 'port': int(sys.argv[2]), 'user': sys.argv[3], 'password': sys.argv[4],
+              'database': sys.argv[5], 'ssh': None}
+    rows = int(sys.argv[6]) if len(sys.argv) > 6 else 200000
+    concurrency = int(sys.argv[7]) if len(sys.argv) > 7 else 4
+    print('%-12s %10s %10s %12s' % ('方式', '行数', '耗时(s)', '行/s'))
+    asyncio.run(run(config, rows, concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,166 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import itertools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import aiofiles
 import pandas as pd
 
+from common_utils.file_utils import ExcelUtils, FileFollower
+
+
+class _CsvBatchReader:
+    """ 在工作线程中按批解析csv，文件以大块缓冲读取，解析使用csv模块，正确处理引号和字段内换行 """
+
+    def __init__(self, file_path, delimiter, encoding, block_size):
+        self.file = open(file_path, 'r', newline='', encoding=encoding, buffering=block_size)
+        self.reader = csv.reader(self.file, delimiter=delimiter)
+
+    def read_batch(self, batch_size):
+        return list(itertools.islice(self.reader, batch_size))
+
+    def close(self):
+        self.file.close()
+
+
+class _CsvAppendWriter:
+    """
+    单个文件的后台追加写入任务。
+
+    追加的行经有界队列进入写入任务，队列满时追加方等待（背压）；写入任务每次取出队列中已有的所有行
+    （最多max_batch_rows行），在线程池中格式化并一次写入文件，上一批写入期间到达的行自然合并为下一批。
+    队列中的每一项是(行, future)，future不为None时在该行所在的批写入后完成，写入出错时带上异常。
+    """
+
+    def __init__(self, file_path, delimiter, encoding, queue_size, max_batch_rows):
+        self.file_path = file_path
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.max_batch_rows = max_batch_rows
+        self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.file = None
+        self.error = None
+        self.closed = False
+        self.rows_written = 0  # 已写入文件的行数
+        self.flush_count = 0  # 写入文件的次数
+        self.max_batch_size = 0
+        self.max_queue_depth = 0
+        self.task = self.loop.create_task(self._run())
+
+    async def put(self, row, wait=True):
+        self._raise_error()
+        if self.closed:
+            raise ValueError("写入任务已关闭")
+        future = self.loop.create_future() if wait else None
+        await self.queue.put((row, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        if future is not None:
+            await future
+
+    async def flush(self):
+        await self.queue.join()
+        self._raise_error()
+
+    async def aclose(self):
+        if self.closed:
+            return
+        try:
+            await self.flush()
+        finally:
+            self.closed = True
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            if self.file is not None:
+                await self.loop.run_in_executor(None, self.file.close)
+                self.file = None
+
+    def metrics(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'rows_written': self.rows_written,
+            'flush_count': self.flush_count,
+            'max_batch_size': self.max_batch_size,
+            'avg_batch_size': self.rows_written / self.flush_count if self.flush_count else 0.0,
+        }
+
+    async def _run(self):
+        while True:
+            items = [await self.queue.get()]
+            while len(items) < self.max_batch_rows:
+                try:
+                    items.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            rows = [row for row, _ in items]
+            try:
+                # 出错后不再写入，剩余的行在flush/aclose时随错误一起报告
+                if self.error is None:
+                    await self.loop.run_in_executor(None, self._write, rows)
+                    self.rows_written += len(rows)
+                    self.flush_count += 1
+                    self.max_batch_size = max(self.max_batch_size, len(rows))
+            except Exception as e:
+                self.error = e
+            finally:
+                for _, future in items:
+                    if future is not None and not future.done():
+                        if self.error is None:
+                            future.set_result(None)
+                        else:
+                            future.set_exception(self.error)
+                    self.queue.task_done()
+
+    def _write(self, rows):
+        sio = io.StringIO()
+        csv.writer(sio, delimiter=self.delimiter).writerows(rows)
+        if self.file is None:
+            self.file = open(self.file_path, 'a', newline='', encoding=self.encoding)
+        self.file.write(sio.getvalue())
+        self.file.flush()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+
+# 每个(文件, 分隔符, 编码)一个写入任务，同一事件循环中操作同一文件且格式相同的AsyncCsvFileUtils对象共享
+_append_writers = {}
+
 
 class AsyncCsvFileUtils:
-    def __init__(self, file_path, delimiter=',', encoding='utf-8'):
+    def __init__(self, file_path, delimiter=',', encoding='utf-8', block_size=1024 * 1024, batch_size=10000,
+                 queue_size=10000, max_batch_rows=10000):
+        """
+        初始化AsyncCsvFileUtils对象。
+
+        :param file_path: csv文件路径。
+        :param delimiter: 分隔符。
+        :param encoding: 文件编码。
+        :param block_size: 读取文件时每次从磁盘读入的字节数。
+        :param batch_size: 每次在工作线程中解析的行数，也是read_csv_batches每批的最大行数。
+        :param queue_size: append_to_csv的队列容量，队列满时追加方等待。
+        :param max_batch_rows: 后台写入任务每次写入文件的最大行数。
+                               queue_size和max_batch_rows以第一个创建该文件写入任务的对象为准。
+        """
         self.file_path = file_path
         self.delimiter = delimiter
         self.encoding = encoding
+        self.block_size = block_size
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_batch_rows = max_batch_rows
+        # 分隔符或编码不同的对象使用各自的写入任务，避免按第一个对象的格式写入
+        self._writer_key = (os.path.abspath(file_path), delimiter, encoding)
 
     async def read_csv(self, header=False):
         """
@@ -19,12 +170,8 @@ class AsyncCsvFileUtils:
         :return: 数据列表，每个元素是一个代表行的列表
         """
         data = []
-        async with aiofiles.open(self.file_path, 'r', encoding=self.encoding) as file:
-            if header:
-                # 跳过表头行
-                await file.readline()
-            async for line in file:
-                data.append(line.strip().split(self.delimiter))
+        async for batch in self.read_csv_batches(header=not header):
+            data.extend(batch)
         return data
 
     async def write_csv(self, data, header=None):
@@ -34,6 +181,8 @@ class AsyncCsvFileUtils:
         :param data: 写入的数据，应为行列表
         :param header: 可选的头部行，是字符串的列表
         """
+        # 先写完之前追加的行，避免其在覆盖写入之后才落盘
+        await self.flush()
         # 使用 StringIO 来构建 CSV 内容，然后一次性写入文件
         from io import StringIO
         import csv
@@ -49,81 +198,325 @@ class AsyncCsvFileUtils:
         async with aiofiles.open(self.file_path, 'w', encoding=self.encoding) as file:
             await file.write(sio.getvalue())
 
-    async def append_to_csv(self, data):
+    async def append_to_csv(self, data, wait=True):
         """
-        异步追加到csv文件
+        异步追加到csv文件。
+
+        行进入该文件的后台写入任务的队列，由写入任务合并成批写入，多个协程并发追加时行不会交错；
+        队列满时等待写入任务消化。默认等到该行所在的批写入文件后才返回，并发追加的行仍会合并成批。
+
+        wait=False时行进入队列即返回，吞吐更高，但行在写入前不应再被修改，并且必须在事件循环结束前
+        调用flush或aclose（或使用async with），否则队列中尚未写入的行会丢失。
 
         :param data: 单行数据作为列表
+        :param wait: 是否等待该行写入文件。
+        :raises IOError: 如果写入出错
         """
-        # 类似 write_csv，使用 StringIO 来构建 CSV 内容
-        from io import StringIO
-        import csv
+        await self._get_writer().put(data, wait)
 
-        sio = StringIO()
-        csv_writer = csv.writer(sio, delimiter=self.delimiter)
-        csv_writer.writerow(data)
+    async def flush(self):
+        """
+        等待已追加的行全部写入文件。
 
-        # 移动到字符串的开始位置
-        sio.seek(0)
-        async with aiofiles.open(self.file_path, 'a', encoding=self.encoding) as file:
-            await file.write(sio.getvalue())
+        :raises IOError: 如果写入过程出错
+        """
+        writer = _append_writers.get(self._writer_key)
+        if writer is not None:
+            await writer.flush()
+
+    async def aclose(self):
+        """
+        写入剩余的行并停止该文件的后台写入任务，之后追加会创建新的写入任务。
+
+        :raises IOError: 如果写入过程出错
+        """
+        writer = _append_writers.get(self._writer_key)
+        if writer is not None:
+            try:
+                await writer.aclose()
+            finally:
+                if _append_writers.get(self._writer_key) is writer:
+                    del _append_writers[self._writer_key]
+
+    def append_metrics(self):
+        """
+        后台写入任务的统计信息。
+
+        :return: 字典，包含当前队列深度queue_depth、最大队列深度max_queue_depth、已写入行数rows_written、
+                 写入次数flush_count、最大批量max_batch_size、平均批量avg_batch_size；没有写入任务时返回None。
+        """
+        writer = _append_writers.get(self._writer_key)
+        return writer.metrics() if writer is not None else None
+
+    def _get_writer(self):
+        writer = _append_writers.get(self._writer_key)
+        if writer is None or writer.closed or writer.loop is not asyncio.get_event_loop():
+            if writer is not None and writer.file is not None:
+                # 上一个事件循环已结束，其写入任务不会再运行
+                writer.file.close()
+            writer = _CsvAppendWriter(self.file_path, self.delimiter, self.encoding, self.queue_size,
+                                      self.max_batch_rows)
+            _append_writers[self._writer_key] = writer
+        return writer
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
 
     async def read_csv_generator(self, header=True):
         """
-        异步使用生成器逐行读取csv文件
+        异步使用生成器逐行读取csv文件，文件按批在线程池中解析，每批只切换一次线程，参见read_csv_batches。
 
-        :param header: 如果为True，将返回包含表头的第一行。
+        :param header: 如果为True，将返回包含表头的第一行；为False时第一行同样作为数据返回（与之前的行为一致）。
         :yield: 下一行数据的列表。
         """
-        async with aiofiles.open(self.file_path, 'r', newline='', encoding=self.encoding) as file:
-            if header:
-                yield (await file.readline()).strip().split(self.delimiter)
-            async for line in file:
-                yield line.strip().split(self.delimiter)
+        async for batch in self.read_csv_batches(header=True):
+            for row in batch:
+                yield row
+
+    async def read_csv_batches(self, header=True, batch_size=None):
+        """
+        异步生成器按批读取csv文件。文件以block_size大块读取，在线程池中用csv模块解析，
+        引号内的分隔符和换行都能正确处理，事件循环每批只等待一次。
+
+        :param header: 如果为True，第一批的第一行是表头；否则跳过表头。
+        :param batch_size: 每批的最大行数，默认使用初始化时的batch_size。
+        :yield: 行列表，每个元素是一个代表行的列表。
+        """
+        batch_size = batch_size or self.batch_size
+        loop = asyncio.get_event_loop()
+        reader = await loop.run_in_executor(None, _CsvBatchReader, self.file_path, self.delimiter, self.encoding,
+                                            self.block_size)
+        try:
+            skip_header = not header
+            while True:
+                batch = await loop.run_in_executor(None, reader.read_batch, batch_size)
+                if skip_header and batch:
+                    # 跳过表头行，只剩表头时继续读取下一批
+                    skip_header = False
+                    del batch[0]
+                    if not batch:
+                        continue
+                if not batch:
+                    break
+                yield batch
+        finally:
+            await loop.run_in_executor(None, reader.close)
+
+
+class AsyncFileFollower:
+    """ 异步跟踪不断增长的文件，文件读取在线程池中进行，等待新数据时不阻塞事件循环，参见FileFollower """
+
+    def __init__(self, path, **kwargs):
+        """
+        初始化AsyncFileFollower对象。
+
+        :param path: 要跟踪的文件路径。
+        :param kwargs: 传给FileFollower的参数，如offset_path、batch_size、min_interval、max_interval、from_end。
+        """
+        self.follower = FileFollower(path, **kwargs)
+
+    async def follow(self, timeout=None):
+        """
+        异步生成器持续跟踪文件，有新行时按批产出，每批处理完后保存偏移量。
+
+        :param timeout: 连续多少秒没有新数据时结束，默认为None，表示一直跟踪。
+        :yield: 行列表（不含行尾换行符）。
+        """
+        loop = asyncio.get_event_loop()
+        follower = self.follower
+        interval = follower.min_interval
+        idle_since = time.monotonic()
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, follower.poll)
+                if batch:
+                    yield batch
+                    await loop.run_in_executor(None, follower.save_state)
+                    interval = follower.min_interval
+                    idle_since = time.monotonic()
+                    continue
+                if timeout is not None and time.monotonic() - idle_since >= timeout:
+                    return
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, follower.max_interval)
+        finally:
+            follower.close()
+
+
+def _read_sheet(file_path, sheet_name):
+    return pd.read_excel(file_path, sheet_name=sheet_name)
+
+
+def _write_sheet(file_path, data, sheet_name):
+    data.to_excel(file_path, sheet_name=sheet_name, index=False)
+
+
+def _append_data(file_path, data, sheet_name, streaming):
+    ExcelUtils(file_path).append_data(data, sheet_name, streaming)
+
+
+def _get_sheet_names(file_path):
+    return pd.ExcelFile(file_path).sheet_names
 
 
 class AsyncExcelUtils:
-    """ 用于处理Excel文件的异步工具类 """
+    """
+    用于处理Excel文件的异步工具类
+
+    所有对象共享线程池和进程池（首次使用时创建，AsyncExcelUtils.shutdown关闭），
+    同时进行的工作簿操作数量受全局的max_concurrency限制，超出的操作在事件循环中等待，不占用线程。
+    mode为'process'时读取、写入、追加在进程池中执行，不受GIL限制，DataFrame按列块序列化传回。
+    """
+
+    MODES = ('thread', 'process')
+    max_workers = None  # 共享线程池的线程数，None表示使用ThreadPoolExecutor的默认值
+    process_workers = None  # 共享进程池的进程数，None表示CPU核数
+    max_concurrency = 8  # 全局同时进行的工作簿操作数
+    _executors = {}
+    _executor_lock = threading.Lock()
+    _semaphores = weakref.WeakKeyDictionary()
 
-    def __init__(self, file_path):
-        """ 初始化AsyncExcelUtils对象。 """
+    def __init__(self, file_path, mode='thread', executor=None):
+        """
+        初始化AsyncExcelUtils对象。
+
+        :param file_path: Excel文件路径。
+        :param mode: 'thread'在共享线程池中执行，'process'在共享进程池中执行读取、写入和追加。
+        :param executor: 可选的自定义执行器，替代mode对应的共享执行器，由调用方负责关闭。
+        :raises ValueError: mode不是MODES之一。
+        """
+        if mode not in self.MODES:
+            raise ValueError("mode必须是%s之一" % (self.MODES,))
         self.file_path = file_path
-        self.executor = ThreadPoolExecutor()
+        self.mode = mode
+        self._custom_executor = executor
+        self._pending = set()
+        self._closed = False
+
+    @property
+    def executor(self):
+        """ 读取、写入、追加使用的执行器。 """
+        return self._custom_executor or self.get_executor(self.mode)
+
+    @classmethod
+    def configure(cls, max_workers=None, process_workers=None, max_concurrency=None):
+        """
+        修改共享执行器和并发限制的配置，为None的参数保持不变。执行器的大小在下次创建时生效（参见shutdown）。
+
+        :param max_workers: 共享线程池的线程数。
+        :param process_workers: 共享进程池的进程数。
+        :param max_concurrency: 全局同时进行的工作簿操作数。
+        """
+        if max_workers is not None:
+            AsyncExcelUtils.max_workers = max_workers
+        if process_workers is not None:
+            AsyncExcelUtils.process_workers = process_workers
+        if max_concurrency is not None:
+            AsyncExcelUtils.max_concurrency = max_concurrency
+            AsyncExcelUtils._semaphores = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_executor(cls, mode='thread'):
+        """
+        获取共享执行器，不存在时创建。
+
+        :param mode: 'thread'或'process'。
+        :return: 共享的ThreadPoolExecutor或ProcessPoolExecutor。
+        """
+        with AsyncExcelUtils._executor_lock:
+            executor = AsyncExcelUtils._executors.get(mode)
+            if executor is None:
+                if mode == 'process':
+                    executor = ProcessPoolExecutor(max_workers=AsyncExcelUtils.process_workers)
+                else:
+                    executor = ThreadPoolExecutor(max_workers=AsyncExcelUtils.max_workers,
+                                                  thread_name_prefix='AsyncExcelUtils')
+                AsyncExcelUtils._executors[mode] = executor
+            return executor
 
-    async def run_in_executor(self, func, *args):
-        """ 在线程池中异步运行函数。 """
+    @classmethod
+    def shutdown(cls, wait=True):
+        """
+        关闭共享的线程池和进程池，之后的操作会重新创建执行器。
+
+        :param wait: 是否等待正在执行的操作完成。
+        """
+        with AsyncExcelUtils._executor_lock:
+            executors = list(AsyncExcelUtils._executors.values())
+            AsyncExcelUtils._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+    async def aclose(self):
+        """ 等待该对象发起的操作全部完成，之后不能再使用该对象。共享执行器由shutdown关闭。 """
+        self._closed = True
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def run_in_executor(self, func, *args, executor=None):
+        """
+        在执行器中异步运行函数，受全局并发限制。
+
+        :param func: 要运行的函数，进程池中运行时必须可以pickle。
+        :param args: 函数参数。
+        :param executor: 使用的执行器，默认为self.executor。
+        :return: 函数的返回值。
+        :raises ValueError: 对象已关闭。
+        """
+        if self._closed:
+            raise ValueError("AsyncExcelUtils已关闭")
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, func, *args)
+        semaphore = AsyncExcelUtils._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = AsyncExcelUtils._semaphores[loop] = asyncio.Semaphore(AsyncExcelUtils.max_concurrency)
+        async with semaphore:
+            future = loop.run_in_executor(executor or self.executor, func, *args)
+            self._pending.add(future)
+            try:
+                return await future
+            finally:
+                self._pending.discard(future)
 
     async def read_sheet(self, sheet_name=""):
         """ 异步读取指定sheet """
-        func = pd.read_excel
-        return await self.run_in_executor(func, self.file_path, sheet_name)
+        return await self.run_in_executor(_read_sheet, self.file_path, sheet_name)
 
     async def write_sheet(self, data, sheet_name='Sheet1'):
         """ 异步写入指定sheet """
-        func = data.to_excel
-        await self.run_in_executor(func, self.file_path, sheet_name, False)
+        await self.run_in_executor(_write_sheet, self.file_path, data, sheet_name)
         return
 
-    async def append_data(self, data, sheet_name='Sheet1'):
-        """ 异步追加数据到指定sheet """
-        orig_data = await self.read_sheet(sheet_name=sheet_name)
-        updated_data = pd.concat([orig_data, data], ignore_index=True)
-        await self.write_sheet(updated_data, sheet_name)
+    async def append_data(self, data, sheet_name='Sheet1', streaming=True):
+        """ 异步追加数据到指定sheet，默认只写入新行，参见ExcelUtils.append_data """
+        await self.run_in_executor(_append_data, self.file_path, data, sheet_name, streaming)
 
     async def get_sheet_names(self):
         """ 异步获取所有sheet的名称 """
-        excel_file = await self.run_in_executor(pd.ExcelFile, self.file_path)
-        return excel_file.sheet_names
+        return await self.run_in_executor(_get_sheet_names, self.file_path)
 
     async def read_sheet_by_chunk(self, sheet_name=0, chunk_size=1000):
-        """ 异步生成器逐块读取sheet """
-        func = pd.read_excel
-        iterator = await self.run_in_executor(func, self.file_path, sheet_name, chunk_size)
-
-        async for chunk in self.yield_chunks(iterator):
-            yield chunk
+        """ 异步生成器逐块读取sheet，每块在线程池中流式解析，参见ExcelUtils.read_sheet_by_chunk """
+        chunks = ExcelUtils(self.file_path).read_sheet_by_chunk(sheet_name, chunk_size)
+        end = object()
+        # 生成器无法在进程间传递，总是在线程池中解析
+        executor = self.executor if self.mode == 'thread' else self.get_executor('thread')
+        try:
+            while True:
+                chunk = await self.run_in_executor(next, chunks, end, executor=executor)
+                if chunk is end:
+                    break
+                yield chunk
+        finally:
+            chunks.close()
 
     async def yield_chunks(self, iterator):
         """ 异步输出chunk数据 """
@@ -0,0 +1,341 @@
+import asyncio
+import inspect
+import itertools
+
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+
+from common_utils.mongo_utils import BulkWriteSummary
+
+try:
+    # pymongo>=4.10自带原生asyncio客户端
+    from pymongo import AsyncMongoClient as _AsyncClient
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as _AsyncClient
+    except ImportError:
+        _AsyncClient = None
+
+# 连接池的默认配置，min_pool_size保持少量预热连接，max_idle_time_ms回收长时间空闲的连接
+DEFAULT_POOL_CONFIG = {
+    'maxPoolSize': 100,
+    'minPoolSize': 5,
+    'maxIdleTimeMS': 60000,
+    'waitQueueTimeoutMS': 30000,
+    'connectTimeoutMS': 10000,
+    'serverSelectionTimeoutMS': 10000,
+    'retryWrites': True,
+    'retryReads': True,
+}
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class AsyncMongoCursor(object):
+    """
+    按批读取的异步游标，find和aggregate的返回值。
+
+    底层游标在第一次读取时才创建，每次从服务器取batch_size条文档，取数时占用客户端的一个并发名额。
+    支持 ``async for doc in cursor`` 逐条迭代、``async for batch in cursor.batches()`` 按批迭代和
+    ``await cursor.to_list()`` 一次读取全部文档。
+    """
+
+    def __init__(self, mongo_client, open_cursor, batch_size):
+        """
+        初始化AsyncMongoCursor对象。
+
+        :param mongo_client: 所属的AsyncProductionMongoClient。
+        :param open_cursor: 无参函数，返回驱动的游标或返回游标的awaitable。
+        :param batch_size: 每批读取的文档数。
+        """
+        self.mongo_client = mongo_client
+        self.batch_size = batch_size
+        self._open_cursor = open_cursor
+        self._cursor = None
+        self._buffer = []
+        self._exhausted = False
+
+    async def next_batch(self):
+        """
+        读取下一批文档。
+
+        :return: 文档列表，读取完毕时返回空列表。
+        """
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            return batch
+        if self._exhausted:
+            return []
+        async with self.mongo_client.semaphore:
+            try:
+                if self._cursor is None:
+                    self._cursor = await _maybe_await(self._open_cursor())
+                    if hasattr(self._cursor, 'batch_size'):
+                        self._cursor.batch_size(self.batch_size)
+                batch = await self._cursor.to_list(length=self.batch_size)
+            except OperationFailure as e:
+                raise OperationFailure(f"An error occurred: {e}")
+        if not batch:
+            self._exhausted = True
+        return batch
+
+    async def batches(self):
+        """
+        按批迭代文档。
+
+        :yield: 文档列表，每批最多batch_size条。
+        """
+        try:
+            while True:
+                batch = await self.next_batch()
+                if not batch:
+                    break
+                yield batch
+        finally:
+            await self.close()
+
+    async def to_list(self, length=None):
+        """
+        读取文档。
+
+        :param length: 最多读取的文档数，None表示读取全部。
+        :return: 文档列表。
+        """
+        documents = []
+        while length is None or len(documents) < length:
+            batch = await self.next_batch()
+            if not batch:
+                break
+            documents.extend(batch)
+        if length is not None and len(documents) > length:
+            self._buffer = documents[length:]
+            documents = documents[:length]
+        return documents
+
+    async def close(self):
+        """ 关闭底层游标，释放服务器上的游标资源 """
+        self._exhausted = True
+        self._buffer = []
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            await _maybe_await(cursor.close())
+
+    def __aiter__(self):
+        return self._iter_documents()
+
+    async def _iter_documents(self):
+        async for batch in self.batches():
+            for document in batch:
+                yield document
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncProductionMongoClient(object):
+    """
+    ProductionMongoClient的asyncio版本，方法与ProductionMongoClient一致，调用时需要await。
+
+    默认使用pymongo自带的AsyncMongoClient，旧版pymongo使用motor。同时执行的操作数由max_concurrency限制，
+    超出的操作在进程内排队，不会全部堆到驱动的连接等待队列上。
+
+    用法::
+
+        async with AsyncProductionMongoClient('db', uri) as client:
+            inserted_id = await client.insert_one('collection', {'key': 'value'})
+            async for document in client.find('collection', {'key': 'value'}):
+                ...
+            # 并发执行的操作数不超过max_concurrency
+            await asyncio.gather(*[client.insert_one('collection', {'key': i}) for i in range(1000)])
+    """
+
+    def __init__(self, db_name, uri="mongodb://localhost:27017/", max_concurrency=None, batch_size=1000,
+                 client=None, **pool_config):
+        """
+        初始化AsyncProductionMongoClient对象，需要调用connect（或使用async with）检查连接。
+
+        :param db_name: 数据库名。
+        :param uri: 连接字符串。
+        :param max_concurrency: 同时执行的最大操作数，默认等于连接池的maxPoolSize。
+        :param batch_size: find、aggregate游标每批读取的文档数。
+        :param client: 可选的异步客户端对象（接口与AsyncMongoClient/motor一致），用于接入已有客户端或测试替身，
+                       传入时忽略uri和pool_config。
+        :param pool_config: 连接池配置，覆盖DEFAULT_POOL_CONFIG中的对应项，如maxPoolSize=50。
+        :raises ImportError: 未传入client，且pymongo不支持asyncio、也未安装motor。
+        """
+        if client is None:
+            if _AsyncClient is None:
+                raise ImportError("需要pymongo>=4.10或安装motor: pip install -U pymongo")
+            config = dict(DEFAULT_POOL_CONFIG, **pool_config)
+            client = _AsyncClient(uri, **config)
+            if max_concurrency is None:
+                max_concurrency = config['maxPoolSize']
+        self.client = client
+        self.db = client[db_name]
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency or DEFAULT_POOL_CONFIG['maxPoolSize']
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # 在事件循环中第一次使用时创建，兼容创建Semaphore时绑定事件循环的旧版Python
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def connect(self):
+        """
+        检查与服务器的连接。
+
+        :raises ConnectionFailure: 服务器不可用。
+        """
+        try:
+            # 运行一个服务器状态的命令，测试连接是否成功
+            await self.client.admin.command('ping')
+        except ConnectionFailure:
+            raise ConnectionFailure("Server not available")
+        return self
+
+    async def close(self):
+        await _maybe_await(self.client.close())
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self, collection_name, method, *args, **kwargs):
+        async with self.semaphore:
+            try:
+                collection = self.db[collection_name]
+                return await getattr(collection, method)(*args, **kwargs)
+            except BulkWriteError:
+                raise
+            except OperationFailure as e:
+                raise OperationFailure(f"An error occurred: {e}")
+
+    async def insert_one(self, collection_name, data):
+        return (await self._run(collection_name, 'insert_one', data)).inserted_id
+
+    async def find_one(self, collection_name, query):
+        return await self._run(collection_name, 'find_one', query)
+
+    def find(self, collection_name, query, batch_size=None):
+        """
+        查询文档。
+
+        :param collection_name: 集合名。
+        :param query: 查询条件。
+        :param batch_size: 每批读取的文档数，默认使用客户端的batch_size。
+        :return: AsyncMongoCursor对象。
+        """
+        collection = self.db[collection_name]
+        return AsyncMongoCursor(self, lambda: collection.find(query), batch_size or self.batch_size)
+
+    async def update_one(self, collection_name, query, data):
+        return await self._run(collection_name, 'update_one', query, data)
+
+    async def delete_one(self, collection_name, query):
+        return await self._run(collection_name, 'delete_one', query)
+
+    async def delete_many(self, collection_name, query):
+        return await self._run(collection_name, 'delete_many', query)
+
+    async def update_many(self, collection_name, query, data):
+        return await self._run(collection_name, 'update_many', query, data)
+
+    async def insert_many(self, collection_name, data):
+        return await self._run(collection_name, 'insert_many', data)
+
+    async def find_one_and_delete(self, collection_name, query):
+        return await self._run(collection_name, 'find_one_and_delete', query)
+
+    async def find_one_and_replace(self, collection_name, query, data):
+        return await self._run(collection_name, 'find_one_and_replace', query, data)
+
+    async def find_one_and_update(self, collection_name, query, data):
+        return await self._run(collection_name, 'find_one_and_update', query, data)
+
+    async def replace_one(self, collection_name, query, data):
+        return await self._run(collection_name, 'replace_one', query, data)
+
+    async def count_documents(self, collection_name, query):
+        return await self._run(collection_name, 'count_documents', query)
+
+    def aggregate(self, collection_name, query, batch_size=None):
+        """
+        执行聚合管道。
+
+        :param collection_name: 集合名。
+        :param query: 聚合管道。
+        :param batch_size: 每批读取的文档数，默认使用客户端的batch_size。
+        :return: AsyncMongoCursor对象。
+        """
+        collection = self.db[collection_name]
+        return AsyncMongoCursor(self, lambda: collection.aggregate(query), batch_size or self.batch_size)
+
+    async def bulk_write(self, collection_name, operations, ordered=False, batch_size=1000):
+        """
+        分批执行bulk_write，对应ProductionMongoClient.bulk_writer的一次性写入版本。
+
+        operations按批惰性读取，最多max_concurrency个批同时写入（无序时），内存中只保留正在写入的批。
+        单条操作的错误记录在返回结果的errors中；某批因连接错误等其他异常失败时，
+        该批记录在返回结果的failed_batches中（含起始序号、操作和异常），便于调用方重试。
+        按顺序执行时遇到任何错误后不再执行后续批次。
+
+        :param collection_name: 集合名。
+        :param operations: pymongo的写操作列表或可迭代对象，如InsertOne、UpdateOne、DeleteOne。
+        :param ordered: 是否按顺序执行，按顺序执行时各批依次写入。
+        :param batch_size: 每批的操作数。
+        :return: BulkWriteSummary对象。
+        """
+        summary = BulkWriteSummary()
+        iterator = iter(operations)
+        next_offset = 0
+        stopped = [False]
+        # 拿到名额后才读取下一批并启动任务，内存中只有正在写入的批，任务数也不超过批数
+        slots = asyncio.Semaphore(1 if ordered else self.max_concurrency)
+        tasks = []
+
+        async def write(ops, offset):
+            try:
+                try:
+                    result = (await self._run(collection_name, 'bulk_write', ops, ordered=ordered)).bulk_api_result
+                except BulkWriteError as e:
+                    result = e.details
+                except Exception as e:
+                    # 该批执行情况未知，记录下来由调用方决定是否重试
+                    summary.add_failed_batch(ops, offset, e)
+                    stopped[0] = stopped[0] or ordered
+                    return
+                summary.add(result, ops, offset)
+                if ordered and result.get('writeErrors'):
+                    stopped[0] = True
+            finally:
+                # 记录结果后再释放名额，按顺序执行时读取下一批前已能看到stopped
+                slots.release()
+
+        try:
+            while True:
+                await slots.acquire()
+                ops = list(itertools.islice(iterator, batch_size)) if not stopped[0] else []
+                if not ops:
+                    slots.release()
+                    break
+                tasks = [task for task in tasks if not task.done()]
+                tasks.append(asyncio.ensure_future(write(ops, next_offset)))
+                next_offset += len(ops)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return summary
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarCache(object):
+    """
+    解析结果的列式磁盘缓存。
+
+    每个DataFrame的每一列保存为一个.npy文件，数值、布尔、日期时间列再次读取时直接内存映射（写时复制），
+    不需要重新解析源文件；其他类型的列以对象数组保存，读取时还原原有类型。
+    缓存键由源文件的路径、sheet、大小、修改时间和读取参数组成，源文件变化后自动使用新的缓存项，
+    旧缓存项按最近最少使用的顺序在总大小超过max_bytes时淘汰。
+    """
+
+    META_FILE = 'meta.json'
+    # 可以直接内存映射的numpy类型
+    MMAP_KINDS = 'biufcmM'
+
+    def __init__(self, cache_dir, max_bytes=10 * 1024 * 1024 * 1024):
+        """
+        初始化ColumnarCache对象。
+
+        :param cache_dir: 缓存目录，不存在时自动创建。
+        :param max_bytes: 缓存的最大总字节数。
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, path, sheet=None, **options):
+        """
+        生成缓存键。
+
+        :param path: 源文件路径。
+        :param sheet: sheet名或索引，CSV文件为None。
+        :param options: 影响解析结果的读取参数。
+        :return: 缓存键。
+        :raises FileNotFoundError: 源文件不存在。
+        """
+        file_stat = os.stat(path)
+        raw = json.dumps([os.path.abspath(path), repr(sheet), file_stat.st_size, file_stat.st_mtime_ns,
+                          repr(sorted(options.items()))])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get_or_load(self, path, loader, sheet=None, **options):
+        """
+        读取缓存，未命中时调用loader解析源文件并写入缓存。
+
+        :param path: 源文件路径。
+        :param loader: 无参函数，返回解析后的DataFrame。
+        :param sheet: sheet名或索引，CSV文件为None。
+        :param options: 影响解析结果的读取参数。
+        :return: DataFrame。
+        """
+        key = self.make_key(path, sheet, **options)
+        frame = self.get(key)
+        if frame is None:
+            frame = loader()
+            self.put(key, frame)
+        return frame
+
+    def get(self, key):
+        """
+        读取缓存项。
+
+        :param key: 缓存键。
+        :return: DataFrame，未命中时返回None。
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        meta_path = os.path.join(entry_dir, self.META_FILE)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            frame = self._load_frame(entry_dir, meta)
+            os.utime(meta_path)  # 记录最近访问时间，用于LRU淘汰
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        """
+        写入缓存项，写入后按LRU淘汰超出容量的旧缓存项。
+
+        :param key: 缓存键。
+        :param frame: 要缓存的DataFrame。
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = os.path.join(self.cache_dir, '.tmp-%s' % uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        try:
+            meta = self._save_frame(tmp_dir, frame)
+            with open(os.path.join(tmp_dir, self.META_FILE), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # 其他进程已经写入了相同的缓存项
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._evict(keep=key)
+
+    def total_bytes(self):
+        """ 缓存的总字节数 """
+        return sum(size for _, _, size in self._entries())
+
+    def clear(self):
+        """ 删除所有缓存项 """
+        for key, _, _ in self._entries():
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    def _entries(self):
+        """ :return: [(缓存键, 最近访问时间, 字节数), ...] """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            try:
+                accessed = os.stat(os.path.join(entry.path, self.META_FILE)).st_mtime
+                size = sum(item.stat().st_size for item in os.scandir(entry.path))
+            except OSError:
+                continue
+            entries.append((entry.name, accessed, size))
+        return entries
+
+    def _evict(self, keep=None):
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _save_frame(self, entry_dir, frame):
+        np.save(os.path.join(entry_dir, 'columns.npy'), np.array(list(frame.columns), dtype=object),
+                allow_pickle=True)
+        items = [self._save_array(entry_dir, str(i), frame.iloc[:, i]) for i in range(frame.shape[1])]
+        index = None
+        if not frame.index.equals(pd.RangeIndex(len(frame))):
+            index = self._save_array(entry_dir, 'index', frame.index)
+        return {'rows': len(frame), 'items': items, 'index': index}
+
+    def _save_array(self, entry_dir, name, values):
+        dtype = values.dtype
+        file_name = name + '.npy'
+        if isinstance(dtype, np.dtype) and dtype.kind in self.MMAP_KINDS:
+            np.save(os.path.join(entry_dir, file_name), np.ascontiguousarray(values.to_numpy()))
+            return {'file': file_name, 'dtype': str(dtype), 'mmap': True}
+        np.save(os.path.join(entry_dir, file_name), values.to_numpy(dtype=object), allow_pickle=True)
+        return {'file': file_name, 'dtype': str(dtype), 'mmap': False}
+
+    def _load_frame(self, entry_dir, meta):
+        columns = np.load(os.path.join(entry_dir, 'columns.npy'), allow_pickle=True).tolist()
+        data = {i: self._load_array(entry_dir, item) for i, item in enumerate(meta['items'])}
+        index = None
+        if meta['index'] is not None:
+            index = pd.Index(self._load_array(entry_dir, meta['index']))
+        frame = pd.DataFrame(data, index=index, copy=False)
+        if index is None:
+            frame.index = pd.RangeIndex(meta['rows'])
+        frame.columns = columns
+        return frame
+
+    @staticmethod
+    def _load_array(entry_dir, item):
+        path = os.path.join(entry_dir, item['file'])
+        if item['mmap']:
+            # 写时复制的内存映射，修改DataFrame不会影响缓存文件
+            return np.load(path, mmap_mode='c').view(np.ndarray)
+        values = pd.Series(np.load(path, allow_pickle=True), dtype=object)
+        try:
+            values = values.astype(item['dtype'])
+        except (TypeError, ValueError):
+            pass
+        return values.array
@@ -0,0 +1,91 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+# 文件扩展名与压缩格式的对应关系
+EXTENSION_CODECS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.lzma': 'xz',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+CODECS = ('gzip', 'bz2', 'xz', 'zstd')
+
+# 各压缩格式的默认压缩级别，兼顾速度和压缩率
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'bz2': 9,
+    'xz': 6,
+    'zstd': 3,
+}
+
+
+def resolve_codec(path, codec='infer'):
+    """
+    确定文件使用的压缩格式。
+
+    :param path: 文件路径。
+    :param codec: 'infer'表示根据扩展名判断，None表示不压缩，也可以直接指定CODECS中的格式。
+    :return: 压缩格式名称，不压缩时返回None。
+    :raises ValueError: 不支持的压缩格式。
+    """
+    if codec == 'infer':
+        return EXTENSION_CODECS.get(os.path.splitext(str(path))[1].lower())
+    if codec is not None and codec not in CODECS:
+        raise ValueError("不支持的压缩格式: %s" % codec)
+    return codec
+
+
+def open_file(path, mode='r', encoding=None, newline=None, codec='infer', level=None):
+    """
+    打开文件，压缩文件按块流式压缩/解压，用法与内置open一致。
+
+    gzip、bz2、zstd的追加模式会在文件末尾写入一个新的压缩帧，读取时各帧连续解压。
+
+    :param path: 文件路径。
+    :param mode: 'r'、'w'、'a'及对应的二进制模式'rb'、'wb'、'ab'。
+    :param encoding: 文本模式下的编码。
+    :param newline: 文本模式下的换行符处理，同内置open。
+    :param codec: 'infer'表示根据扩展名判断，None表示不压缩，也可以直接指定CODECS中的格式。
+    :param level: 压缩级别，默认使用DEFAULT_LEVELS中的值。
+    :return: 文件对象。
+    :raises ValueError: 不支持的压缩格式。
+    :raises ImportError: 使用zstd但未安装zstandard。
+    """
+    codec = resolve_codec(path, codec)
+    if codec is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+    binary = 'b' in mode
+    raw_mode = mode.replace('t', '').replace('b', '') + 'b'
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+    if codec == 'gzip':
+        stream = gzip.open(path, raw_mode, compresslevel=level)
+    elif codec == 'bz2':
+        stream = bz2.open(path, raw_mode, compresslevel=level)
+    elif codec == 'xz':
+        stream = lzma.open(path, raw_mode, preset=level if 'r' not in raw_mode else None)
+    else:
+        stream = _open_zstd(path, raw_mode, level)
+    if binary:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+
+
+def _open_zstd(path, mode, level):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("读写zstd文件需要安装zstandard: pip install zstandard")
+    if 'r' in mode:
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                           closefd=True)
+        return io.BufferedReader(reader)
+    writer = zstandard.ZstdCompressor(level=level).stream_writer(open(path, mode), closefd=True)
+    return io.BufferedWriter(writer)
@@ -0,0 +1,258 @@
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CopyStats(object):
+    """ 复制过程的统计信息 """
+
+    def __init__(self):
+        self.files_total = 0  # 需要处理的文件数
+        self.files_copied = 0  # 实际复制的文件数
+        self.files_skipped = 0  # 目标已是最新、跳过的文件数
+        self.bytes_total = 0  # 源文件总字节数
+        self.bytes_done = 0  # 已完成的字节数（含跳过和续传前已存在的部分）
+        self.bytes_copied = 0  # 本次实际复制的字节数
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """ 已耗时（秒），未结束时返回截至当前的耗时。 """
+        if self.start_time is None:
+            return 0.0
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    @property
+    def mb_per_sec(self):
+        """ 按实际复制的字节数计算的吞吐 """
+        elapsed = self.elapsed
+        return self.bytes_copied / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return 'CopyStats(files=%d/%d, skipped=%d, bytes=%d/%d, copied=%d, elapsed=%.3fs, MB/s=%.1f)' % (
+            self.files_copied + self.files_skipped, self.files_total, self.files_skipped, self.bytes_done,
+            self.bytes_total, self.bytes_copied, self.elapsed, self.mb_per_sec)
+
+
+class FileCopier(object):
+    """
+    文件复制引擎。
+
+    大文件通过copy_file_range/sendfile在内核中复制，数据不经过用户态；小文件在有界线程池中并行复制。
+    大文件先写入 目标路径 + '.part'，完成后再重命名，开启resume时可以从.part的末尾继续复制。
+    .part旁边的 目标路径 + '.part.meta' 记录源文件的大小、修改时间和inode，续传前核对这些信息，
+    并比较.part末尾一段与源文件对应位置的内容，不一致时（如源文件已变化）从头复制。
+    """
+
+    PART_SUFFIX = '.part'
+    PART_META_SUFFIX = '.part.meta'
+    # 续传前比较.part末尾的字节数
+    RESUME_CHECK_BYTES = 1024 * 1024
+    # 内核复制不可用时触发回退的错误码
+    _FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+    def __init__(self, max_workers=8, large_file_threshold=64 * 1024 * 1024, chunk_size=64 * 1024 * 1024,
+                 progress_callback=None, resume=False, preserve_metadata=True):
+        """
+        初始化FileCopier对象。
+
+        :param max_workers: 并行复制小文件的线程数。
+        :param large_file_threshold: 不小于该字节数的文件按大文件处理。
+        :param chunk_size: 大文件每次内核复制的字节数，也是进度回调的粒度。
+        :param progress_callback: 进度回调 callback(bytes_done, bytes_total)，可能在工作线程中被调用。
+        :param resume: 为True时跳过大小和修改时间都一致的目标文件，并从大文件的.part末尾继续复制
+                       （源文件与.part记录的信息一致、末尾内容相同时才续传）。
+        :param preserve_metadata: 是否复制文件的修改时间和权限（同shutil.copy2）。
+        """
+        self.max_workers = max_workers
+        self.large_file_threshold = large_file_threshold
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.resume = resume
+        self.preserve_metadata = preserve_metadata
+        self._lock = threading.Lock()
+
+    def copy_file(self, src, dst):
+        """
+        复制单个文件，dst为目录时复制到该目录下。
+
+        :param src: 源文件路径。
+        :param dst: 目标文件或目录路径。
+        :return: CopyStats对象。
+        :raises FileNotFoundError: 源文件不存在。
+        :raises OSError: 复制文件时发生系统错误。
+        """
+        if not os.path.isfile(src):
+            raise FileNotFoundError("源文件不存在")
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        size = os.path.getsize(src)
+        stats = self._begin([(src, dst, size)])
+        try:
+            self._copy_one(stats, src, dst, size)
+        finally:
+            stats.stop()
+        return stats
+
+    def copy_tree(self, src_dir, dst_dir):
+        """
+        复制整个目录树。大文件在当前线程中依次做内核复制，小文件同时在线程池中并行复制。
+
+        :param src_dir: 源目录。
+        :param dst_dir: 目标目录，不存在时自动创建。
+        :return: CopyStats对象。
+        :raises FileNotFoundError: 源目录不存在。
+        :raises OSError: 复制文件时发生系统错误。
+        """
+        if not os.path.isdir(src_dir):
+            raise FileNotFoundError("源目录不存在")
+        jobs = []
+        for root, dirs, files in os.walk(src_dir):
+            target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                src = os.path.join(root, name)
+                jobs.append((src, os.path.join(target_root, name), os.path.getsize(src)))
+        stats = self._begin(jobs)
+        large_jobs = [job for job in jobs if job[2] >= self.large_file_threshold]
+        small_jobs = [job for job in jobs if job[2] < self.large_file_threshold]
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._copy_one, stats, *job) for job in small_jobs]
+                for job in large_jobs:
+                    self._copy_one(stats, *job)
+                for future in futures:
+                    future.result()
+        finally:
+            stats.stop()
+        if self.preserve_metadata:
+            shutil.copystat(src_dir, dst_dir)
+        return stats
+
+    def _begin(self, jobs):
+        stats = CopyStats()
+        stats.files_total = len(jobs)
+        stats.bytes_total = sum(job[2] for job in jobs)
+        stats.start()
+        return stats
+
+    def _copy_one(self, stats, src, dst, size):
+        # stats由每次调用单独创建并逐层传递，同一个FileCopier可以被多个线程同时使用
+        if self.resume and self._is_up_to_date(src, dst, size):
+            with self._lock:
+                stats.files_skipped += 1
+            self._report(stats, size, 0)
+            return
+        if size >= self.large_file_threshold:
+            self._copy_large(stats, src, dst, size)
+        else:
+            shutil.copyfile(src, dst)
+            self._report(stats, size, size)
+        if self.preserve_metadata:
+            shutil.copystat(src, dst)
+        with self._lock:
+            stats.files_copied += 1
+
+    def _copy_large(self, stats, src, dst, size):
+        part_path = dst + self.PART_SUFFIX
+        meta_path = dst + self.PART_META_SUFFIX
+        with open(src, 'rb') as fsrc:
+            src_stat = os.fstat(fsrc.fileno())
+            source = {'size': size, 'mtime_ns': src_stat.st_mtime_ns, 'ino': src_stat.st_ino}
+            offset = self._resume_offset(fsrc, part_path, meta_path, source) if self.resume else 0
+            if offset:
+                # 续传之前的部分视为已完成
+                self._report(stats, offset, 0)
+            else:
+                with open(meta_path, 'w') as f:
+                    json.dump(source, f)
+            with open(part_path, 'r+b' if offset else 'wb') as fdst:
+                fdst.truncate(offset)
+                self._kernel_copy(stats, fsrc, fdst, offset, size)
+        os.replace(part_path, dst)
+        os.remove(meta_path)
+
+    def _resume_offset(self, fsrc, part_path, meta_path, source):
+        """
+        确定续传的起始位置。
+
+        :return: .part可以续传时返回其长度，否则返回0。
+        """
+        try:
+            with open(meta_path) as f:
+                if json.load(f) != source:
+                    return 0
+            with open(part_path, 'rb') as fpart:
+                offset = os.fstat(fpart.fileno()).st_size
+                if offset > source['size']:
+                    return 0
+                check = min(offset, self.RESUME_CHECK_BYTES)
+                fpart.seek(offset - check)
+                fsrc.seek(offset - check)
+                if fpart.read(check) != fsrc.read(check):
+                    return 0
+        except (OSError, ValueError):
+            return 0
+        return offset
+
+    def _kernel_copy(self, stats, fsrc, fdst, offset, size):
+        """ 依次尝试copy_file_range、sendfile，都不可用时回退为用户态读写。 """
+        src_fd = fsrc.fileno()
+        dst_fd = fdst.fileno()
+        position = offset
+        methods = []
+        if hasattr(os, 'copy_file_range'):
+            methods.append('copy_file_range')
+        if hasattr(os, 'sendfile'):
+            methods.append('sendfile')
+        methods.append('readwrite')
+        for method in methods:
+            try:
+                while position < size:
+                    count = min(self.chunk_size, size - position)
+                    if method == 'copy_file_range':
+                        copied = os.copy_file_range(src_fd, dst_fd, count, position, position)
+                    elif method == 'sendfile':
+                        os.lseek(dst_fd, position, os.SEEK_SET)
+                        copied = os.sendfile(dst_fd, src_fd, position, count)
+                    else:
+                        fsrc.seek(position)
+                        fdst.seek(position)
+                        copied = fdst.write(fsrc.read(count))
+                    if copied == 0:
+                        raise OSError("源文件在复制过程中被截断")
+                    position += copied
+                    self._report(stats, copied, copied)
+                return
+            except OSError as e:
+                if method == 'readwrite' or e.errno not in self._FALLBACK_ERRNOS:
+                    raise
+
+    def _is_up_to_date(self, src, dst, size):
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            return False
+        return dst_stat.st_size == size and abs(dst_stat.st_mtime - os.stat(src).st_mtime) < 1
+
+    def _report(self, stats, done, copied):
+        with self._lock:
+            stats.bytes_done += done
+            stats.bytes_copied += copied
+            bytes_done = stats.bytes_done
+            bytes_total = stats.bytes_total
+        if self.progress_callback is not None:
+            self.progress_callback(bytes_done, bytes_total)
@@ -1,20 +1,49 @@
+import contextlib
 import csv
+import gc
+import io
+import json
+import math
+import mmap
+import numbers
 import os
-import shutil
+import posixpath
+import re
+import struct
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
 
+import numpy as np
+import openpyxl
 import pandas as pd
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter, range_boundaries
+
+from common_utils.compress_utils import open_file, resolve_codec
+from common_utils.copy_utils import FileCopier
+from common_utils.hash_utils import file_checksum
 
 
 class FileUtils:
     """ 文件工具类，提供基础的文件操作功能。 """
 
-    def __init__(self, path):
+    def __init__(self, path, codec='infer', compress_level=None):
         """
         初始化FileUtils对象。
 
         :param path: 需要操作的文件路径。
+        :param codec: 压缩格式，'infer'表示根据扩展名判断（如.gz、.zst），None表示不压缩，
+                      也可以直接指定'gzip'、'bz2'、'xz'、'zstd'。
+        :param compress_level: 写入压缩文件时的压缩级别，默认使用各格式的默认值。
         """
         self.path = path
+        self.codec = codec
+        self.compress_level = compress_level
+        self._line_index = None
 
     def read_file(self, encoding='utf-8'):
         """
@@ -24,7 +53,7 @@ class FileUtils:
         :return: 文件的内容。
         :raises FileNotFoundError: 如果文件不存在。
         """
-        with open(self.path, 'r', encoding=encoding) as f:
+        with self._open('r', encoding=encoding) as f:
             return f.read()
 
     def read_file_line_by_line(self, encoding='utf-8'):
@@ -35,7 +64,7 @@ class FileUtils:
         :yield: 文件的下一行。
         :raises FileNotFoundError: 如果文件不存在。
         """
-        with open(self.path, 'r', encoding=encoding) as f:
+        with self._open('r', encoding=encoding) as f:
             for line in f:
                 yield line.rstrip('\n')  # 使用 rstrip 删除行尾的换行符
 
@@ -47,7 +76,7 @@ class FileUtils:
         :param encoding: 文件编码，默认为'utf-8'。
         :raises IOError: 写入文件时发生I/O错误。
         """
-        with open(self.path, 'w', encoding=encoding) as f:
+        with self._open('w', encoding=encoding) as f:
             f.write(content)
 
     def append_to_file(self, content, encoding='utf-8'):
@@ -58,20 +87,24 @@ class FileUtils:
         :param encoding: 文件编码，默认为'utf-8'。
         :raises IOError: 写入文件时发生I/O错误。
         """
-        with open(self.path, 'a', encoding=encoding) as f:
+        with self._open('a', encoding=encoding) as f:
             f.write(content)
 
-    def copy_file(self, new_path):
+    def copy_file(self, new_path, resume=False, progress_callback=None):
         """
-        将文件复制到新的路径。
+        将文件复制到新的路径，大文件通过copy_file_range/sendfile在内核中复制，目录树复制参见FileCopier。
 
         :param new_path: 目标文件路径。
+        :param resume: 为True时目标已是最新则跳过，大文件从上次中断处继续复制。
+        :param progress_callback: 进度回调 callback(bytes_done, bytes_total)。
+        :return: CopyStats对象。
         :raises FileNotFoundError: 源文件不存在。
         :raises IOError: 复制文件时发生I/O错误。
         """
         if not os.path.isfile(self.path):
             raise FileNotFoundError("源文件不存在")
-        shutil.copy2(self.path, new_path)
+        copier = FileCopier(progress_callback=progress_callback, resume=resume)
+        return copier.copy_file(self.path, new_path)
 
     def rename_file(self, new_name):
         """
@@ -84,6 +117,7 @@ class FileUtils:
         new_path = os.path.join(os.path.dirname(self.path), new_name)
         os.rename(self.path, new_path)
         self.path = new_path  # 更新文件路径属性
+        self._close_line_index()  # 旧的行索引绑定的是旧路径
 
     def delete_file(self):
         """
@@ -93,13 +127,14 @@ class FileUtils:
         :raises OSError: 删除文件时发生系统错误。
         """
         if os.path.isfile(self.path):
+            self._close_line_index()
             os.remove(self.path)
         else:
             raise FileNotFoundError("文件不存在")
 
     def get_file_info(self):
         """
-        返回文件的信息。
+        返回文件的信息，批量扫描目录树参见scan_utils.scan_tree。
 
         :return: 包含文件信息的字典。
         :raises FileNotFoundError: 文件不存在。
@@ -116,12 +151,562 @@ class FileUtils:
             'modified_time': file_stat.st_mtime  # 文件最后修改时间
         }
 
+    def get_checksum(self, algorithm='blake2b'):
+        """
+        计算文件内容的哈希值，目录树批量计算和查重参见hash_utils。
+
+        :param algorithm: 哈希算法，如'blake2b'、'sha256'、'md5'，或快速非加密哈希'xxh64'、'xxh3_64'（需安装xxhash）。
+        :return: 十六进制的哈希值。
+        :raises FileNotFoundError: 文件不存在。
+        """
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError("文件不存在")
+        return file_checksum(self.path, algorithm)
+
+    def get_line_index(self, encoding='utf-8', index_path=None):
+        """
+        获取文件的行偏移索引，首次调用时构建（或从旁路索引文件加载），文件变化后自动重建。
+
+        :param encoding: 文件编码，需与ASCII兼容（如'utf-8'、'gbk'），默认为'utf-8'。
+        :param index_path: 旁路索引文件路径，默认为 文件路径 + '.lidx'。
+        :return: LineIndex对象。
+        :raises FileNotFoundError: 文件不存在。
+        :raises ValueError: 压缩文件无法建立行索引。
+        """
+        if resolve_codec(self.path, self.codec) is not None:
+            raise ValueError("压缩文件无法建立行索引")
+        index = self._line_index
+        if index is None or index.encoding != encoding or index.is_stale() or \
+                (index_path is not None and index.index_path != index_path):
+            self._close_line_index()
+            index = LineIndex(self.path, index_path=index_path, encoding=encoding)
+            index.open()
+            self._line_index = index
+        return index
+
+    def read_lines(self, start, count=1, encoding='utf-8'):
+        """
+        按行号随机读取文件中的若干行，定位开销为O(1)，不需要从头扫描文件。
+
+        :param start: 起始行号，从0开始。
+        :param count: 读取的行数，默认为1。
+        :param encoding: 文件编码，默认为'utf-8'。
+        :return: 行内容列表（不含行尾换行符）。
+        :raises FileNotFoundError: 文件不存在。
+        """
+        return self.get_line_index(encoding=encoding).read_lines(start, count)
+
+    def line_count(self, encoding='utf-8'):
+        """
+        返回文件的总行数。
+
+        :param encoding: 文件编码，默认为'utf-8'。
+        :return: 行数。
+        :raises FileNotFoundError: 文件不存在。
+        """
+        return self.get_line_index(encoding=encoding).line_count()
+
+    def follow(self, offset_path=None, encoding='utf-8', batch_size=1000, timeout=None, from_end=False):
+        """
+        跟踪不断增长的文件，从上次保存的偏移处继续按批产出新行，参见FileFollower。
+
+        :param offset_path: 保存偏移量的状态文件路径，默认为 文件路径 + '.offset'。
+        :param encoding: 文件编码，默认为'utf-8'。
+        :param batch_size: 每批最多产出的行数。
+        :param timeout: 连续多少秒没有新数据时结束，默认为None，表示一直跟踪。
+        :param from_end: 没有保存的偏移量时，是否从文件末尾开始跟踪。
+        :yield: 行列表（不含行尾换行符）。
+        """
+        follower = FileFollower(self.path, offset_path=offset_path, encoding=encoding, batch_size=batch_size,
+                                from_end=from_end)
+        return follower.follow(timeout=timeout)
+
+    def _open(self, mode, encoding):
+        return open_file(self.path, mode, encoding=encoding, codec=self.codec, level=self.compress_level)
+
+    def _close_line_index(self):
+        if self._line_index is not None:
+            self._line_index.close()
+            self._line_index = None
+
+
+class LineIndex(object):
+    """
+    基于mmap的行偏移索引。
+
+    索引是一个uint64数组，第i个元素为第i行的起始字节偏移，最后一个元素为文件大小。
+    索引保存在旁路文件中，文件头记录了源文件的大小和修改时间，二者任一变化索引即失效。
+    """
+
+    MAGIC = b'LIDX0001'
+    # 魔数、源文件大小、源文件修改时间(ns)、行数
+    HEADER = struct.Struct('<8sQqQ')
+    SCAN_CHUNK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, path, index_path=None, encoding='utf-8'):
+        """
+        初始化LineIndex对象。
+
+        :param path: 文本文件路径。
+        :param index_path: 旁路索引文件路径，默认为 文件路径 + '.lidx'。
+        :param encoding: 文件编码，需与ASCII兼容，默认为'utf-8'。
+        """
+        self.path = path
+        self.index_path = index_path if index_path is not None else path + '.lidx'
+        self.encoding = encoding
+        self._file = None
+        self._mm = None
+        self._offsets = None
+        self._stat_key = None
+
+    def open(self):
+        """
+        打开源文件并加载索引，旁路索引文件缺失或失效时重新构建。
+
+        :return: self
+        :raises FileNotFoundError: 文件不存在。
+        """
+        self.close()
+        file_stat = os.stat(self.path)
+        self._stat_key = (file_stat.st_size, file_stat.st_mtime_ns)
+        self._offsets = self._load_index()
+        if self._offsets is None:
+            self._offsets = self._build_index(file_stat.st_size)
+            self._save_index()
+        self._file = open(self.path, 'rb')
+        if file_stat.st_size > 0:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def close(self):
+        """ 释放mmap和文件句柄。 """
+        self._offsets = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_stale(self):
+        """
+        判断源文件自索引加载后是否发生了变化（大小或修改时间）。
+
+        :return: 索引失效返回True。
+        """
+        try:
+            file_stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return self._stat_key != (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def line_count(self):
+        """
+        返回文件的总行数。
+
+        :return: 行数。
+        """
+        self._ensure_open()
+        return len(self._offsets) - 1
+
+    def read_line(self, lineno):
+        """
+        读取指定行。
+
+        :param lineno: 行号，从0开始。
+        :return: 行内容（不含行尾换行符）。
+        :raises IndexError: 行号越界。
+        """
+        if not 0 <= lineno < self.line_count():
+            raise IndexError("行号越界")
+        return self.read_lines(lineno, 1)[0]
+
+    def read_lines(self, start, count=1):
+        """
+        读取从start开始的count行，超出文件末尾的部分会被截断。
+
+        :param start: 起始行号，从0开始。
+        :param count: 读取的行数。
+        :return: 行内容列表（不含行尾换行符）。
+        :raises ValueError: start或count为负数。
+        """
+        if start < 0 or count < 0:
+            raise ValueError("start和count不能为负数")
+        total = self.line_count()
+        end = min(start + count, total)
+        if start >= end:
+            return []
+        begin_offset = int(self._offsets[start])
+        end_offset = int(self._offsets[end])
+        lines = self._mm[begin_offset:end_offset].decode(self.encoding).split('\n')
+        if len(lines) > end - start:
+            lines.pop()  # 最后一行以换行符结尾时split会多出一个空串
+        return [line[:-1] if line.endswith('\r') else line for line in lines]
+
+    def _ensure_open(self):
+        if self._offsets is None:
+            self.open()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                header = f.read(self.HEADER.size)
+        except OSError:
+            return None
+        if len(header) != self.HEADER.size:
+            return None
+        magic, size, mtime_ns, count = self.HEADER.unpack(header)
+        if magic != self.MAGIC or (size, mtime_ns) != self._stat_key:
+            return None
+        if os.path.getsize(self.index_path) != self.HEADER.size + (count + 1) * 8:
+            return None
+        # 直接映射索引文件，加载开销与行数无关
+        return np.memmap(self.index_path, dtype='<u8', mode='r', offset=self.HEADER.size, shape=(count + 1,))
+
+    def _build_index(self, size):
+        parts = [np.zeros(1, dtype=np.uint64)]
+        if size > 0:
+            with open(self.path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    for chunk_start in range(0, size, self.SCAN_CHUNK_SIZE):
+                        chunk_len = min(self.SCAN_CHUNK_SIZE, size - chunk_start)
+                        buf = np.frombuffer(mm, dtype=np.uint8, count=chunk_len, offset=chunk_start)
+                        newlines = np.flatnonzero(buf == ord('\n'))
+                        del buf  # 释放对mmap的引用，否则无法关闭mmap
+                        if newlines.size:
+                            parts.append(newlines.astype(np.uint64) + np.uint64(chunk_start + 1))
+                finally:
+                    mm.close()
+        offsets = np.concatenate(parts)
+        if offsets[-1] != size:
+            # 最后一行没有换行符结尾
+            offsets = np.append(offsets, np.uint64(size))
+        return offsets
+
+    def _save_index(self):
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self._stat_key[0], self._stat_key[1], len(self._offsets) - 1))
+                self._offsets.astype('<u8', copy=False).tofile(f)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # 目录不可写时仅使用内存中的索引
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __enter__(self):
+        self._ensure_open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FileFollower(object):
+    """
+    跟踪不断增长的文件（类似tail -F），从持久化的字节偏移处继续读取新增的行。
+
+    - 偏移量和inode保存在旁路状态文件中，程序重启后从上次处理到的位置继续；
+    - 文件变小视为被截断（copytruncate），从头开始读取；
+    - 路径指向了新的inode视为发生了轮转，先读完旧文件剩余内容，再从头读取新文件；
+    - 没有新数据时按指数退避休眠（min_interval到max_interval），而不是忙轮询；
+    - 只产出完整的行，末尾未写完的半行会等到换行符写入后再产出。
+    """
+
+    def __init__(self, path, offset_path=None, encoding='utf-8', batch_size=1000, block_size=1024 * 1024,
+                 min_interval=0.05, max_interval=2.0, from_end=False):
+        """
+        初始化FileFollower对象。
+
+        :param path: 要跟踪的文件路径。
+        :param offset_path: 保存偏移量的状态文件路径，默认为 文件路径 + '.offset'；为False时不持久化。
+        :param encoding: 文件编码，默认为'utf-8'。
+        :param batch_size: 每批最多产出的行数。
+        :param block_size: 每次从文件读取的字节数。
+        :param min_interval: 没有新数据时的最短等待秒数。
+        :param max_interval: 没有新数据时的最长等待秒数。
+        :param from_end: 没有保存的偏移量时，是否从文件末尾开始跟踪。
+        """
+        self.path = path
+        self.offset_path = path + '.offset' if offset_path is None else offset_path
+        self.encoding = encoding
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.from_end = from_end
+        self.offset = 0  # 已产出的最后一行之后的字节偏移
+        self.inode = None  # 已产出的最后一行所在文件的inode
+        self._file = None
+        self._file_inode = None
+        self._read_offset = 0  # 已读入的最后一个完整行之后的字节偏移
+        self._partial = b''
+        self._lines = deque()  # 已解析未产出的行: (行内容, inode, 行尾偏移)
+        self._saved_state = None
+
+    def follow(self, timeout=None):
+        """
+        持续跟踪文件，有新行时按批产出。每批在调用方处理完（请求下一批）后才保存偏移量，保证至少处理一次。
+
+        :param timeout: 连续多少秒没有新数据时结束，默认为None，表示一直跟踪。
+        :yield: 行列表（不含行尾换行符）。
+        """
+        interval = self.min_interval
+        idle_since = time.monotonic()
+        try:
+            while True:
+                batch = self.poll()
+                if batch:
+                    yield batch
+                    self.save_state()
+                    interval = self.min_interval
+                    idle_since = time.monotonic()
+                    continue
+                if timeout is not None and time.monotonic() - idle_since >= timeout:
+                    return
+                time.sleep(interval)
+                interval = min(interval * 2, self.max_interval)
+        finally:
+            self.close()
+
+    def poll(self):
+        """
+        不等待地读取当前可用的新行，处理截断和轮转。
+
+        :return: 行列表，最多batch_size行，没有新数据时为空列表。
+        """
+        if self._file is None and not self._open():
+            return []
+        while len(self._lines) < self.batch_size:
+            file_stat = os.fstat(self._file.fileno())
+            if file_stat.st_size < self._read_offset + len(self._partial):
+                # 文件被截断，从头开始
+                self._seek(0)
+            data = self._file.read(self.block_size)
+            if data:
+                self._feed(data)
+                continue
+            if not self._rotated():
+                break
+            # 旧文件已读完，末尾没有换行符的半行也是完整的一行
+            if self._partial:
+                self._read_offset += len(self._partial)
+                self._lines.append((self._decode(self._partial), self._file_inode, self._read_offset))
+                self._partial = b''
+            self._file.close()
+            self._file = None
+            if not self._open(rotated=True):
+                break
+        batch = []
+        for _ in range(min(len(self._lines), self.batch_size)):
+            line, self.inode, self.offset = self._lines.popleft()
+            batch.append(line)
+        return batch
+
+    def save_state(self):
+        """ 将已产出的偏移量和inode写入状态文件。 """
+        if self.offset_path is False or self.inode is None:
+            return
+        state = {'inode': self.inode, 'offset': self.offset}
+        if state == self._saved_state:
+            return
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.offset_path)
+        self._saved_state = state
+
+    def close(self):
+        """ 关闭文件，未产出的行会被丢弃，下次从已保存的偏移处重新读取。 """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._lines.clear()
+        self._partial = b''
+
+    def _open(self, rotated=False):
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        file_stat = os.fstat(self._file.fileno())
+        self._file_inode = file_stat.st_ino
+        offset = 0
+        state = None if rotated else self._load_state()
+        if state is not None and state.get('inode') == self._file_inode and \
+                state.get('offset', 0) <= file_stat.st_size:
+            offset = state['offset']
+        elif state is None and self.from_end and not rotated:
+            offset = file_stat.st_size
+        self._seek(offset)
+        if self.inode is None:
+            self.inode, self.offset = self._file_inode, offset
+        return True
+
+    def _seek(self, offset):
+        self._file.seek(offset)
+        self._read_offset = offset
+        self._partial = b''
+
+    def _load_state(self):
+        if self.offset_path is False:
+            return None
+        try:
+            with open(self.offset_path) as f:
+                self._saved_state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return self._saved_state
+
+    def _rotated(self):
+        try:
+            return os.stat(self.path).st_ino != self._file_inode
+        except FileNotFoundError:
+            return False  # 轮转过程中新文件尚未创建，继续等待
+
+    def _feed(self, data):
+        data = self._partial + data
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._partial = data
+            return
+        self._partial = data[end + 1:]
+        offset = self._read_offset
+        for line in data[:end].split(b'\n'):
+            offset += len(line) + 1
+            self._lines.append((self._decode(line), self._file_inode, offset))
+        self._read_offset = offset
+
+    def _decode(self, line):
+        line = line.decode(self.encoding)
+        return line[:-1] if line.endswith('\r') else line
+
+
+class CsvReadStats(object):
+    """ CSV读取的吞吐统计，用于对比不同读取方式的性能。 """
+
+    def __init__(self):
+        self.rows = 0  # 已读取的行数
+        self.bytes = 0  # 已解析的字节数
+        self.batches = 0  # 已产出的批次数
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """ 已耗时（秒），未结束时返回截至当前的耗时。 """
+        if self.start_time is None:
+            return 0.0
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    @property
+    def rows_per_sec(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mb_per_sec(self):
+        elapsed = self.elapsed
+        return self.bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return 'CsvReadStats(rows=%d, bytes=%d, batches=%d, elapsed=%.3fs, rows/s=%.0f, MB/s=%.1f)' % (
+            self.rows, self.bytes, self.batches, self.elapsed, self.rows_per_sec, self.mb_per_sec)
+
+
+# 进程间传输解析结果时使用的分隔符（ASCII记录分隔符/单元分隔符）
+_RECORD_SEP = '\x1e'
+_FIELD_SEP = '\x1f'
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """ 批量创建大量容器对象时暂停循环垃圾回收，避免反复触发全量回收。 """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _parse_csv_range(file_path, start, end, encoding, delimiter, skip_first):
+    """
+    解析CSV文件中[start, end)字节范围内的记录，供进程池调用。
+
+    解析后的行被打包成一个用分隔符连接的字符串返回，主进程用str.split还原，
+    比直接pickle行列表快得多；数据本身含有分隔符时退回为返回行列表。
+
+    :return: (打包后的行, 是否为打包字符串, 字节数)
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = data.decode(encoding)
+    with _gc_paused():
+        reader = csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+        if skip_first:
+            next(reader, None)
+        rows = list(reader)
+    # 空行解析为[]，打包后无法与['']区分，同样退回为行列表
+    if not rows or _RECORD_SEP in text or _FIELD_SEP in text or [] in rows:
+        return rows, False, len(data)
+    return _RECORD_SEP.join([_FIELD_SEP.join(row) for row in rows]), True, len(data)
+
+
+def _unpack_csv_rows(payload, packed):
+    if not packed:
+        return payload
+    with _gc_paused():
+        return [row.split(_FIELD_SEP) for row in payload.split(_RECORD_SEP)]
+
 
 class CsvFileUtils(object):
-    def __init__(self, file_path, delimiter=',', encoding='utf-8'):
+    FSYNC_POLICIES = ('never', 'flush', 'close')
+
+    def __init__(self, file_path, delimiter=',', encoding='utf-8', buffer_size=1000, flush_interval=1.0,
+                 fsync='never', codec='infer', compress_level=None):
+        """
+        初始化CsvFileUtils对象。
+
+        :param codec: 压缩格式，'infer'表示根据扩展名判断（如.gz、.zst），None表示不压缩，
+                      也可以直接指定'gzip'、'bz2'、'xz'、'zstd'。
+        :param compress_level: 写入压缩文件时的压缩级别，默认使用各格式的默认值。
+
+        以下参数只作用于上下文管理器（with语句）中的缓冲写入：
+
+        :param buffer_size: 缓冲的行数达到该值时写入文件。
+        :param flush_interval: 距上次写入文件超过该秒数时写入文件，在每次写入行时检查；为None时不按时间写入。
+        :param fsync: fsync策略，'never'不调用，'flush'每次写入文件后调用，'close'仅在退出with语句时调用。
+        """
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError("fsync必须是%s之一" % (self.FSYNC_POLICIES,))
         self.file_path = file_path
         self.delimiter = delimiter
         self.encoding = encoding
+        self.codec = codec
+        self.compress_level = compress_level
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.file = None
+        self.rows_written = 0  # 已写入文件的行数
+        self.flush_count = 0  # 写入文件的次数
+        self.fsync_count = 0
+        self._buffer = io.StringIO()
+        self._buffered_rows = 0
+        self._last_flush = time.monotonic()
 
     def read_csv(self, header=False):
         """
@@ -132,7 +717,7 @@ class CsvFileUtils(object):
         :raises IOError: 如果文件读取过程出错
         """
         data = []
-        with open(self.file_path, 'r', newline='', encoding=self.encoding) as file:
+        with self._open('r') as file:
             reader = csv.reader(file, delimiter=self.delimiter)
             if header:
                 next(reader, None)  # 跳过头部
@@ -148,7 +733,7 @@ class CsvFileUtils(object):
         :param header: 可选的头部行
         :raises IOError: 如果文件写入过程出错
         """
-        with open(self.file_path, 'w', newline='', encoding=self.encoding) as file:
+        with self._open('w') as file:
             writer = csv.writer(file, delimiter=self.delimiter)
             if header is not None:
                 writer.writerow(header)
@@ -156,12 +741,15 @@ class CsvFileUtils(object):
 
     def append_to_csv(self, data):
         """
-        追加到csv文件
+        追加到csv文件，在with语句中使用时写入缓冲区。
 
         :param data: 单行数据作为列表
         :raises IOError: 如果文件追加过程出错
         """
-        with open(self.file_path, 'a', newline='', encoding=self.encoding) as file:
+        if self.file is not None:
+            self.write_row(data)
+            return
+        with self._open('a') as file:
             writer = csv.writer(file, delimiter=self.delimiter)
             writer.writerow(data)
 
@@ -173,25 +761,312 @@ class CsvFileUtils(object):
         :yield: 文件的下一行作为列表。
         :raises IOError: 如果文件读取过程出错。
         """
-        with open(self.file_path, 'r', newline='', encoding=self.encoding) as file:
+        with self._open('r') as file:
             reader = csv.reader(file, delimiter=self.delimiter)
             if header:
                 yield next(reader)  # 返回表头
             for row in reader:
                 yield row
 
+    def read_csv_columns(self, usecols=None, dtypes=None, header=True, as_frame=True, cache=None):
+        """
+        按列读取csv文件，只解析需要的列并直接转换为定长类型的数组，未选中的列不会生成Python对象。
+
+        :param usecols: 需要读取的列，可以是列名或列序号的列表，默认为全部列。
+        :param dtypes: 列类型，如 {'price': 'float64', 'qty': 'int32'}，未指定的列自动推断类型。
+        :param header: 如果为True，第一行作为列名；否则列名为列序号。
+        :param as_frame: 为True时返回DataFrame，为False时返回 {列名: 连续的NumPy数组}。
+        :param cache: 可选的ColumnarCache对象，文件未变化时直接读取缓存的列数据，不再重新解析。
+        :return: DataFrame或列数组字典。
+        :raises IOError: 如果文件读取过程出错。
+        :raises ValueError: 如果usecols中的列不存在。
+        """
+        kwargs = self._column_read_kwargs(usecols, dtypes, header)
+        if cache is None:
+            frame = pd.read_csv(self.file_path, **kwargs)
+        else:
+            frame = cache.get_or_load(self.file_path, lambda: pd.read_csv(self.file_path, **kwargs), **kwargs)
+        return frame if as_frame else self._frame_to_arrays(frame)
+
+    def iter_csv_columns(self, usecols=None, dtypes=None, header=True, chunk_size=100000, as_frame=True):
+        """
+        分块流式地按列读取csv文件，内存占用只与chunk_size有关。
+
+        每个块独立推断类型，为保证各块类型一致，建议通过dtypes显式指定。
+
+        :param usecols: 需要读取的列，可以是列名或列序号的列表，默认为全部列。
+        :param dtypes: 列类型，如 {'price': 'float64', 'qty': 'int32'}。
+        :param header: 如果为True，第一行作为列名；否则列名为列序号。
+        :param chunk_size: 每一块的行数。
+        :param as_frame: 为True时产出DataFrame，为False时产出 {列名: 连续的NumPy数组}。
+        :yield: 每次返回一个数据块。
+        :raises IOError: 如果文件读取过程出错。
+        """
+        reader = pd.read_csv(self.file_path, chunksize=chunk_size,
+                             **self._column_read_kwargs(usecols, dtypes, header))
+        try:
+            for chunk in reader:
+                yield chunk if as_frame else self._frame_to_arrays(chunk)
+        finally:
+            reader.close()
+
+    def _column_read_kwargs(self, usecols, dtypes, header):
+        return {
+            'sep': self.delimiter,
+            'encoding': self.encoding,
+            'header': 0 if header else None,
+            'usecols': usecols,
+            'dtype': dtypes,
+            'engine': 'c',  # C解析器对未选中的列只做分词，不做类型转换
+            'compression': resolve_codec(self.file_path, self.codec),
+        }
+
+    @staticmethod
+    def _frame_to_arrays(frame):
+        return {column: np.ascontiguousarray(frame[column].to_numpy()) for column in frame.columns}
+
+    def read_csv_parallel(self, header=False, ordered=True, max_workers=None, chunk_bytes=32 * 1024 * 1024,
+                          stats=None):
+        """
+        多进程并行读取csv文件，按字节范围切分文件，每个范围在进程池中独立解析。
+
+        切分点总是落在记录边界上：通过统计切分点之前引号字符的奇偶性判断换行符是否位于引号字段内，
+        因此字段内的换行不会被错误切开（要求使用默认的'"'引号且不使用转义字符）。
+
+        :param header: 如果为True，将跳过第一行。
+        :param ordered: 为True时按文件原始顺序产出批次，为False时按解析完成顺序产出。
+        :param max_workers: 进程数，默认为CPU核数。
+        :param chunk_bytes: 每个字节范围的目标大小，也决定了每批的行数。
+        :param stats: 可选的CsvReadStats对象，读取过程中实时更新；同时可通过self.last_read_stats获取。
+        :yield: 行批次，每个批次是行列表。
+        :raises IOError: 如果文件读取过程出错。
+        :raises ValueError: 压缩文件无法按字节范围切分。
+        """
+        if resolve_codec(self.file_path, self.codec) is not None:
+            raise ValueError("压缩文件无法按字节范围切分，请使用read_csv_generator")
+        stats = stats if stats is not None else CsvReadStats()
+        self.last_read_stats = stats
+        stats.start()
+        ranges = self._split_csv_ranges(chunk_bytes)
+        tasks = ((self.file_path, start, end, self.encoding, self.delimiter, header and i == 0)
+                 for i, (start, end) in enumerate(ranges))
+        try:
+            if len(ranges) <= 1:
+                # 小文件不值得启动进程池
+                for task in tasks:
+                    for batch in self._collect_csv_batch(_parse_csv_range(*task), stats):
+                        yield batch
+                return
+            max_workers = max_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                # 限制在途任务数量，避免解析结果堆积在内存中
+                max_pending = max_workers * 2
+                pending = deque()
+                try:
+                    for task in tasks:
+                        pending.append(executor.submit(_parse_csv_range, *task))
+                        if len(pending) < max_pending:
+                            continue
+                        for batch in self._drain_csv_futures(pending, ordered, stats, drain_all=False):
+                            yield batch
+                    for batch in self._drain_csv_futures(pending, ordered, stats, drain_all=True):
+                        yield batch
+                finally:
+                    for future in pending:
+                        future.cancel()
+        finally:
+            stats.stop()
+
+    def _drain_csv_futures(self, pending, ordered, stats, drain_all):
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                for batch in self._collect_csv_batch(future.result(), stats):
+                    yield batch
+            if not drain_all:
+                return
+
+    @staticmethod
+    def _collect_csv_batch(result, stats):
+        payload, packed, nbytes = result
+        rows = _unpack_csv_rows(payload, packed)
+        stats.bytes += nbytes
+        if rows:
+            stats.rows += len(rows)
+            stats.batches += 1
+            yield rows
+
+    def _split_csv_ranges(self, chunk_bytes):
+        """
+        将文件切分为以记录边界结尾的字节范围。
+
+        :return: [(start, end), ...]
+        """
+        size = os.path.getsize(self.file_path)
+        if size == 0:
+            return []
+        if size <= chunk_bytes:
+            return [(0, size)]
+        quote = ord('"')
+        boundaries = [0]
+        with open(self.file_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                pos = 0
+                quotes = 0  # [0, pos) 范围内引号字符的个数
+                target = chunk_bytes
+                while target < size:
+                    quotes += self._count_byte(mm, quote, pos, target)
+                    pos = target
+                    # 向后寻找第一个不在引号字段内的换行符
+                    while True:
+                        newline = mm.find(b'\n', pos)
+                        if newline == -1:
+                            pos = size
+                            break
+                        quotes += self._count_byte(mm, quote, pos, newline + 1)
+                        pos = newline + 1
+                        if quotes % 2 == 0:
+                            break
+                    if pos >= size:
+                        break
+                    boundaries.append(pos)
+                    target = pos + chunk_bytes
+            finally:
+                mm.close()
+        boundaries.append(size)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    @staticmethod
+    def _count_byte(mm, value, start, end, block_size=16 * 1024 * 1024):
+        count = 0
+        needle = bytes([value])
+        for block_start in range(start, end, block_size):
+            count += mm[block_start:min(block_start + block_size, end)].count(needle)
+        return count
+
+    def write_row(self, row):
+        """
+        向缓冲区写入一行，达到buffer_size或flush_interval时写入文件，需在with语句中使用。
+
+        :param row: 单行数据作为列表
+        :raises ValueError: 如果不在with语句中使用
+        :raises IOError: 如果文件写入过程出错
+        """
+        self._check_open()
+        self.writer.writerow(row)
+        self._buffered_rows += 1
+        self._maybe_flush()
+
+    def write_rows(self, rows):
+        """
+        向缓冲区写入多行，需在with语句中使用。
+
+        :param rows: 行列表
+        :raises ValueError: 如果不在with语句中使用
+        :raises IOError: 如果文件写入过程出错
+        """
+        self._check_open()
+        for row in rows:
+            self.writer.writerow(row)
+            self._buffered_rows += 1
+            if self._buffered_rows >= self.buffer_size:
+                self.flush()
+        self._maybe_flush()
+
+    def flush(self):
+        """
+        将缓冲区中的行写入文件。
+
+        :raises IOError: 如果文件写入过程出错
+        """
+        self._check_open()
+        if self._buffered_rows:
+            self.file.write(self._buffer.getvalue())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self.rows_written += self._buffered_rows
+            self._buffered_rows = 0
+            self.flush_count += 1
+        self.file.flush()
+        if self.fsync == 'flush':
+            self._fsync()
+        self._last_flush = time.monotonic()
+
+    @property
+    def buffered_rows(self):
+        """ 缓冲区中尚未写入文件的行数 """
+        return self._buffered_rows
+
+    def _maybe_flush(self):
+        if self._buffered_rows >= self.buffer_size:
+            self.flush()
+        elif self.flush_interval is not None and self._buffered_rows and \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _fsync(self):
+        os.fsync(self.file.fileno())
+        self.fsync_count += 1
+
+    def _open(self, mode):
+        return open_file(self.file_path, mode, encoding=self.encoding, newline='', codec=self.codec,
+                         level=self.compress_level)
+
+    def _check_open(self):
+        if self.file is None:
+            raise ValueError("文件未打开，请在with语句中使用")
+
     # 上下文管理器支持 (__enter__ 和 __exit__ 方法)
     def __enter__(self):
-        try:
-            self.file = open(self.file_path, 'a', newline='', encoding=self.encoding)
-            self.writer = csv.writer(self.file, delimiter=self.delimiter)
-            return self
-        except IOError as e:
-            raise e
+        self.file = self._open('a')
+        # 写入的行先进入缓冲区，由flush统一写入文件
+        self.writer = csv.writer(self._buffer, delimiter=self.delimiter)
+        self._last_flush = time.monotonic()
+        return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.file:
+        if self.file is None:
+            return
+        try:
+            self.flush()
+            if self.fsync == 'close':
+                self._fsync()
+        finally:
             self.file.close()
+            self.file = None
+
+
+def _cell_xml(value):
+    """
+    生成单元格的类型属性和值部分，空值返回空串。
+
+    :raises TypeError: 值需要单元格样式才能正确显示（如日期时间）或类型不受支持。
+    """
+    if value is None or value is pd.NaT:
+        return ''
+    if isinstance(value, (bool, np.bool_)):
+        return ' t="b"><v>%d</v>' % bool(value)
+    if isinstance(value, numbers.Integral):
+        return ' t="n"><v>%d</v>' % value
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if math.isnan(value):
+            return ''
+        if math.isinf(value):
+            raise TypeError("无法写入无穷大的数值")
+        return ' t="n"><v>%r</v>' % value
+    if isinstance(value, str):
+        if ILLEGAL_CHARACTERS_RE.search(value):
+            raise TypeError("字符串中含有Excel不允许的字符")
+        space = ' xml:space="preserve"' if value != value.strip() else ''
+        return ' t="inlineStr"><is><t%s>%s</t></is>' % (space, escape(value))
+    raise TypeError("不支持流式写入的类型: %s" % type(value).__name__)
 
 
 class ExcelUtils:
@@ -206,17 +1081,20 @@ class ExcelUtils:
         self.file_path = file_path
         # 确保文件存在，如果不存在则创建一个新的Excel文件
         if not os.path.exists(self.file_path):
-            with pd.ExcelWriter(self.file_path, engine='openpyxl') as writer:
-                writer.save()
+            openpyxl.Workbook().save(self.file_path)
 
-    def read_sheet(self, sheet_name=0):
+    def read_sheet(self, sheet_name=0, cache=None):
         """
         读取Excel文件中指定的sheet。
 
         :param sheet_name: 要读取的sheet名，如果是integer，0表示第一个sheet，也是默认值。
+        :param cache: 可选的ColumnarCache对象，文件未变化时直接读取缓存的列数据，不再重新解析。
         :return: 指定sheet的数据，作为pandas的DataFrame对象。
         """
-        return pd.read_excel(self.file_path, sheet_name=sheet_name)
+        if cache is None or not isinstance(sheet_name, (str, int)):
+            return pd.read_excel(self.file_path, sheet_name=sheet_name)
+        return cache.get_or_load(self.file_path, lambda: pd.read_excel(self.file_path, sheet_name=sheet_name),
+                                 sheet=sheet_name)
 
     def write_sheet(self, data, sheet_name='Sheet1'):
         """
@@ -235,19 +1113,24 @@ class ExcelUtils:
             with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='append') as writer:
                 data.to_excel(writer, sheet_name=sheet_name, index=False)
 
-    def append_data(self, data, sheet_name='Sheet1'):
+    def append_data(self, data, sheet_name='Sheet1', streaming=True):
         """
         向Excel文件的指定sheet追加数据。
 
+        默认使用流式追加：直接在sheet的XML末尾（最后一个已用行之后）写入新行，不再读取原有数据并整体重写，
+        不会把已有的单元格解析成Python对象。新数据含日期时间等需要样式的值、含有表头中不存在的列，
+        或sheet为空、表头有空白或重复的单元格时，自动退回为读取-合并-重写的方式。
+
         :param data: 要追加的DataFrame数据。
         :param sheet_name: 要追加数据的sheet名称，默认为'Sheet1'。
+        :param streaming: 为False时强制使用读取-合并-重写的方式。
         """
         # 检查sheet是否存在，如果不存在则创建
         sheet_exists = any(sheet_name == name for name in self.get_sheet_names())
         if not sheet_exists:
             # 创建新sheet并写入数据
             data.to_excel(self.file_path, sheet_name=sheet_name, index=False)
-        else:
+        elif not streaming or not self._append_rows_streaming(data, sheet_name):
             # 如果sheet已存在，追加数据
             with pd.ExcelWriter(self.file_path, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
                 # 读取现有sheet的数据
@@ -257,6 +1140,180 @@ class ExcelUtils:
                 # 将合并后的数据写回Excel
                 updated_data.to_excel(writer, sheet_name=sheet_name, index=False)
 
+    # 流式读写sheet XML时每次处理的字节数
+    XML_CHUNK_SIZE = 1024 * 1024
+    # 流式追加时重新压缩sheet XML使用的压缩级别
+    ZIP_COMPRESS_LEVEL = 1
+
+    _ROW_NUMBER_RE = re.compile(rb'<row\b[^>]*?\br="(\d+)"')
+    _ROW_TAGS = (b'<row ', b'<row>', b'<row\n', b'<row\r', b'<row\t')
+    _DIMENSION_RE = re.compile(rb'<dimension ref="([^"]*)"\s*/>')
+
+    def _append_rows_streaming(self, data, sheet_name):
+        """
+        将数据作为新行拼接到sheet XML的</sheetData>之前，其余zip条目原样复制。
+
+        :return: 成功返回True；数据无法用此方式写入时返回False，文件保持不变。
+        """
+        if data.empty:
+            return True
+        header = self._read_header_row(sheet_name)
+        columns = [str(column) for column in data.columns]
+        # 空sheet需要先写表头；表头有空白、重复单元格或数据有重复列时无法按表头对齐，都交给重写方式处理
+        if not header or None in header or len(set(header)) != len(header) or \
+                len(set(columns)) != len(columns) or not set(columns) <= set(header):
+            return False
+        data = data.copy(deep=False)
+        data.columns = columns
+        data = data.reindex(columns=header)
+        sheet_path = self._sheet_xml_path(sheet_name)
+        with zipfile.ZipFile(self.file_path) as zin:
+            last_row, has_rows = self._scan_last_row(zin, sheet_path)
+            if has_rows and last_row is None:
+                return False  # 行未标注行号，无法确定追加位置
+            last_row = last_row or 0
+            try:
+                rows_xml = self._rows_to_xml(data, last_row + 1)
+            except TypeError:
+                return False
+            new_last_row = last_row + len(data)
+            tmp_path = self.file_path + '.tmp'
+            try:
+                with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED,
+                                     compresslevel=self.ZIP_COMPRESS_LEVEL) as zout:
+                    for info in zin.infolist():
+                        if info.filename == sheet_path:
+                            self._copy_sheet_xml(zin, zout, info, rows_xml, new_last_row, len(data.columns))
+                        else:
+                            zout.writestr(info, zin.read(info))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, self.file_path)
+        return True
+
+    def _read_header_row(self, sheet_name):
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            for row in workbook[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True):
+                return [None if value is None else str(value) for value in row]
+            return []
+        finally:
+            workbook.close()
+
+    def _sheet_xml_path(self, sheet_name):
+        """ 根据workbook.xml及其关系文件找到sheet对应的XML路径。 """
+        main_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        rel_id_attr = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+        pkg_ns = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+        with zipfile.ZipFile(self.file_path) as zin:
+            workbook = ElementTree.fromstring(zin.read('xl/workbook.xml'))
+            rels = ElementTree.fromstring(zin.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(pkg_ns + 'Relationship')}
+        for sheet in workbook.iter(main_ns + 'sheet'):
+            if sheet.get('name') == sheet_name:
+                target = targets[sheet.get(rel_id_attr)]
+                if target.startswith('/'):
+                    return target.lstrip('/')
+                return posixpath.normpath(posixpath.join('xl', target))
+        raise KeyError("sheet不存在: %s" % sheet_name)
+
+    def _scan_last_row(self, zin, sheet_path):
+        """
+        流式扫描sheet XML，找到最后一个已用行的行号。
+
+        :return: (最后的行号或None, 是否存在行)
+        """
+        last_row = None
+        has_rows = False
+        carry = b''
+        with zin.open(sheet_path) as f:
+            while True:
+                chunk = f.read(self.XML_CHUNK_SIZE)
+                if not chunk:
+                    break
+                window = carry + chunk
+                # 只匹配<row>和<row ...>，不匹配<rowBreaks>等其他标签
+                index = max(window.rfind(tag) for tag in self._ROW_TAGS)
+                if index >= 0:
+                    has_rows = True
+                    match = self._ROW_NUMBER_RE.match(window, index)
+                    if match:
+                        last_row = int(match.group(1))
+                # 保留末尾一段，避免行标签被块边界截断
+                carry = window[-4096:]
+        return last_row, has_rows
+
+    def _copy_sheet_xml(self, zin, zout, info, rows_xml, new_last_row, column_count):
+        """ 复制sheet XML，同时更新dimension并在sheetData末尾插入新行。 """
+        end_tag = b'</sheetData>'
+        empty_tag = b'<sheetData/>'
+        keep = max(len(end_tag), len(empty_tag)) - 1
+        inserted = False
+        head = True
+        pending = b''
+        with zin.open(info) as src, zout.open(info.filename, 'w', force_zip64=True) as dst:
+            while True:
+                chunk = src.read(self.XML_CHUNK_SIZE)
+                window = pending + chunk
+                if head:
+                    window = self._DIMENSION_RE.sub(
+                        lambda match: self._new_dimension(match.group(1), new_last_row, column_count), window, 1)
+                    head = False
+                if not inserted:
+                    index = window.find(end_tag)
+                    if index >= 0:
+                        window = window[:index] + rows_xml + window[index:]
+                        inserted = True
+                    else:
+                        index = window.find(empty_tag)
+                        if index >= 0:
+                            window = window[:index] + b'<sheetData>' + rows_xml + end_tag + \
+                                     window[index + len(empty_tag):]
+                            inserted = True
+                if not chunk:
+                    dst.write(window)
+                    break
+                if inserted:
+                    dst.write(window)
+                    pending = b''
+                else:
+                    dst.write(window[:-keep])
+                    pending = window[-keep:]
+        if not inserted:
+            raise ValueError("sheet XML中未找到sheetData: %s" % info.filename)
+
+    @staticmethod
+    def _new_dimension(old_ref, new_last_row, column_count):
+        try:
+            min_col, min_row, max_col, _ = range_boundaries(old_ref.decode())
+        except (TypeError, ValueError):
+            min_col = min_row = max_col = None
+        min_col = min_col or 1
+        min_row = min_row or 1
+        max_col = max(max_col or 1, column_count, 1)
+        return ('<dimension ref="%s%d:%s%d"/>' % (
+            get_column_letter(min_col), min_row, get_column_letter(max_col), max(new_last_row, min_row))).encode()
+
+    @staticmethod
+    def _rows_to_xml(data, first_row):
+        """
+        把DataFrame转换为sheetData中的<row>元素，字符串使用内联字符串，无需改动sharedStrings。
+
+        :raises TypeError: 含有无法直接写入的值（如日期时间）。
+        """
+        letters = [get_column_letter(i + 1) for i in range(len(data.columns))]
+        parts = []
+        for row_number, values in enumerate(data.itertuples(index=False, name=None), first_row):
+            parts.append('<row r="%d">' % row_number)
+            for letter, value in zip(letters, values):
+                cell = _cell_xml(value)
+                if cell:
+                    parts.append('<c r="%s%d"%s</c>' % (letter, row_number, cell))
+            parts.append('</row>')
+        return ''.join(parts).encode('utf-8')
+
     def get_sheet_names(self):
         """
         获取Excel文件中所有sheet的名称。
@@ -270,11 +1327,46 @@ class ExcelUtils:
         """
         使用生成器逐块读取Excel文件中指定的sheet。
 
+        基于openpyxl只读模式（iter_rows(values_only=True)）流式解析，不把整个sheet读入内存，
+        每次只在内存中保留一块数据（共享字符串表除外，它由openpyxl整体加载）。第一行作为表头，所有块使用相同的列名。
+
         :param sheet_name: 要读取的sheet名，可以是一个索引，也可以是一个字符串，默认为0，表示第一个sheet。
         :param chunk_size: 每一块的行数。
         :yield: 生成器，每次返回一个包含数据块的DataFrame。
+        :raises ValueError: chunk_size不是正整数。
         """
-        with pd.ExcelFile(self.file_path) as xls:
-            iterator = pd.read_excel(xls, sheet_name=sheet_name, chunksize=chunk_size)
-            for chunk in iterator:
-                yield chunk
+        if chunk_size <= 0:
+            raise ValueError("chunk_size必须是正整数: %r" % chunk_size)
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            if isinstance(sheet_name, int):
+                worksheet = workbook.worksheets[sheet_name]
+            else:
+                worksheet = workbook[sheet_name]
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            width = max(len(header), worksheet.max_column or 0)
+            header = header + (None,) * (width - len(header))
+            columns = ['Unnamed: %d' % i if name is None else name for i, name in enumerate(header)]
+            empty_row = (None,) * width
+            chunk = []
+            blank_count = 0  # 与pd.read_excel一致，丢弃sheet末尾的空行，因此空行先计数不产出
+            for row in rows:
+                if all(value is None for value in row):
+                    blank_count += 1
+                    continue
+                if len(row) != width:
+                    row = (row + empty_row)[:width]
+                if blank_count:
+                    chunk.extend([empty_row] * blank_count)
+                    blank_count = 0
+                chunk.append(row)
+                while len(chunk) >= chunk_size:
+                    yield pd.DataFrame(chunk[:chunk_size], columns=columns)
+                    chunk = chunk[chunk_size:]
+            if chunk:
+                yield pd.DataFrame(chunk, columns=columns)
+        finally:
+            workbook.close()
@@ -0,0 +1,240 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import stat
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def new_hasher(algorithm='blake2b'):
+    """
+    创建哈希对象。
+
+    :param algorithm: hashlib支持的算法（如'blake2b'、'sha256'、'md5'），
+                      或xxhash的非加密快速哈希'xxh64'、'xxh3_64'、'xxh3_128'（需安装xxhash）。
+    :return: 带update/hexdigest方法的哈希对象。
+    :raises ValueError: 不支持的算法。
+    :raises ImportError: 使用xxhash算法但未安装xxhash。
+    """
+    if algorithm.startswith('xxh'):
+        if xxhash is None:
+            raise ImportError("使用%s需要安装xxhash: pip install xxhash" % algorithm)
+        if not hasattr(xxhash, algorithm):
+            raise ValueError("不支持的算法: %s" % algorithm)
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def file_checksum(path, algorithm='blake2b', block_size=DEFAULT_BLOCK_SIZE):
+    """
+    计算文件内容的哈希值。文件通过mmap映射后按块直接送入哈希函数，不经过额外的读缓冲复制。
+
+    :param path: 文件路径。
+    :param algorithm: 哈希算法，参见new_hasher。
+    :param block_size: 每次送入哈希函数的字节数。
+    :return: 十六进制的哈希值。
+    :raises FileNotFoundError: 文件不存在。
+    """
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigest()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, block_size):
+                    # hashlib在处理大块数据时会释放GIL，因此多线程可以并行计算
+                    hasher.update(view[offset:offset + block_size])
+            finally:
+                view.release()
+        finally:
+            mm.close()
+    return hasher.hexdigest()
+
+
+class HashCache(object):
+    """
+    基于sqlite的持久化哈希缓存，以(inode, 大小, 修改时间)判断文件是否变化，未变化的文件无需重新计算哈希。
+    """
+
+    def __init__(self, db_path):
+        """
+        初始化HashCache对象。
+
+        :param db_path: sqlite数据库文件路径，不存在时自动创建。
+        """
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS file_hash ('
+            'path TEXT NOT NULL, algorithm TEXT NOT NULL, inode INTEGER NOT NULL, size INTEGER NOT NULL, '
+            'mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL, PRIMARY KEY (path, algorithm))')
+        self._conn.commit()
+
+    def get(self, path, file_stat, algorithm):
+        """
+        查询缓存的哈希值。
+
+        :param path: 文件路径。
+        :param file_stat: 文件的stat结果。
+        :param algorithm: 哈希算法。
+        :return: 文件未变化时返回缓存的哈希值，否则返回None。
+        """
+        row = self._conn.execute(
+            'SELECT digest FROM file_hash WHERE path=? AND algorithm=? AND inode=? AND size=? AND mtime_ns=?',
+            (path, algorithm, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put_many(self, entries, algorithm):
+        """
+        批量写入哈希值。
+
+        :param entries: [(路径, stat结果, 哈希值), ...]
+        :param algorithm: 哈希算法。
+        """
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO file_hash (path, algorithm, inode, size, mtime_ns, digest) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(path, algorithm, st.st_ino, st.st_size, st.st_mtime_ns, digest) for path, st, digest in entries])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_files(root, follow_symlinks=False, onerror=None):
+    """
+    递归遍历目录下的普通文件，直接使用scandir返回的stat信息。
+
+    :param root: 根目录。
+    :param follow_symlinks: 是否跟随符号链接。
+    :param onerror: 可选的错误回调 onerror(OSError)，无法访问的目录和文件会被跳过并通过它报告。
+    :yield: (文件路径, stat结果)
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=follow_symlinks):
+                            continue
+                        file_stat = entry.stat(follow_symlinks=follow_symlinks)
+                    except OSError as e:
+                        if onerror is not None:
+                            onerror(e)
+                        continue
+                    yield entry.path, file_stat
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+
+
+def hash_tree(root, algorithm='blake2b', max_workers=8, cache=None, block_size=DEFAULT_BLOCK_SIZE, onerror=None):
+    """
+    并行计算目录树中所有文件的哈希值。
+
+    :param root: 根目录。
+    :param algorithm: 哈希算法，参见new_hasher。
+    :param max_workers: 计算哈希的线程数。
+    :param cache: 可选的HashCache对象，命中的文件不再重新计算。
+    :param block_size: 每次送入哈希函数的字节数。
+    :param onerror: 可选的错误回调 onerror(OSError)，无法访问的目录、无法读取或已被删除的文件会被跳过并通过它报告。
+    :return: {文件路径: 哈希值}，不包含被跳过的文件。
+    """
+    return _hash_files(iter_files(root, onerror=onerror), algorithm, max_workers, cache, block_size, onerror=onerror)
+
+
+def find_duplicates(root, algorithm='blake2b', max_workers=8, cache=None, min_size=1, onerror=None):
+    """
+    查找目录树中内容相同的文件。先按文件大小分组，只对大小相同的文件计算哈希。
+
+    :param root: 根目录。
+    :param algorithm: 哈希算法，参见new_hasher。
+    :param max_workers: 计算哈希的线程数。
+    :param cache: 可选的HashCache对象。
+    :param min_size: 小于该字节数的文件不参与查找，默认忽略空文件。
+    :param onerror: 可选的错误回调 onerror(OSError)，参见hash_tree。
+    :return: 重复文件分组的列表，每组是内容相同的文件路径列表（已排序）。
+    """
+    by_size = defaultdict(list)
+    for path, file_stat in iter_files(root, onerror=onerror):
+        if file_stat.st_size >= min_size:
+            by_size[file_stat.st_size].append((path, file_stat))
+    candidates = [item for items in by_size.values() if len(items) > 1 for item in items]
+    by_digest = defaultdict(list)
+    for path, digest in _hash_files(candidates, algorithm, max_workers, cache, onerror=onerror).items():
+        by_digest[digest].append(path)
+    return sorted(sorted(paths) for paths in by_digest.values() if len(paths) > 1)
+
+
+def _hash_files(files, algorithm, max_workers, cache, block_size=DEFAULT_BLOCK_SIZE, cache_batch=1000,
+                onerror=None):
+    result = {}
+    computed = []
+    pending = deque()
+
+    def collect(item):
+        path, file_stat, future = item
+        try:
+            result[path] = future.result()
+        except OSError as e:
+            # 单个文件无法读取（权限、运行中被删除等）时跳过，不影响其他文件
+            if onerror is not None:
+                onerror(e)
+            return
+        if cache is None:
+            return
+        computed.append((path, file_stat, result[path]))
+        if len(computed) >= cache_batch:
+            cache.put_many(computed, algorithm)
+            del computed[:]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, file_stat in files:
+                if not stat.S_ISREG(file_stat.st_mode):
+                    continue
+                digest = cache.get(path, file_stat, algorithm) if cache is not None else None
+                if digest is not None:
+                    result[path] = digest
+                    continue
+                pending.append((path, file_stat, executor.submit(file_checksum, path, algorithm, block_size)))
+                # 限制在途任务数量，文件数很多时不会堆积大量future
+                if len(pending) >= max_workers * 4:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+    finally:
+        # 出现其他异常时也保存已经计算出的哈希
+        if computed:
+            cache.put_many(computed, algorithm)
+    return result
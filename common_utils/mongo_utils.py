@@ -1,6 +1,9 @@
+import threading
+import time
+
 import pymongo
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import DeleteMany, DeleteOne, InsertOne, MongoClient, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
 
 
 class ProductionMongoClient:
@@ -111,6 +114,271 @@ class ProductionMongoClient:
         except OperationFailure as e:
             raise OperationFailure(f"An error occurred: {e}")
 
+    def bulk_writer(self, collection_name, batch_size=1000, flush_interval=1.0, ordered=False):
+        """
+        创建集合的缓冲批量写入器，见BulkWriter。
+
+        :param collection_name: 集合名。
+        :param batch_size: 缓冲的操作数达到该值时写入一批。
+        :param flush_interval: 距上次写入超过该秒数时写入缓冲的操作，None表示只按数量写入。
+        :param ordered: 是否按顺序执行，默认无序执行，单条失败不影响其他操作。
+        :return: BulkWriter对象。
+        """
+        return BulkWriter(self.db[collection_name], batch_size, flush_interval, ordered)
+
+
+class BulkWriteSummary(object):
+    """
+    BulkWriter累计的写入结果。
+
+    upserted_ids和errors中的index是操作在写入器中的全局序号（从0开始，按添加顺序），
+    errors中每一项包含index、code、errmsg和op（失败的操作）。
+    failed_batches记录因连接错误等异常整批失败、执行情况未知的批，每一项包含index（该批第一个操作的序号）、
+    ops和error（由AsyncProductionMongoClient.bulk_write使用，BulkWriter会把这类批放回缓冲区）。
+    """
+
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.upserted_ids = {}
+        self.errors = []
+        self.write_concern_errors = []
+        self.failed_batches = []
+        self.batches = 0
+
+    def add(self, result, ops, offset):
+        """
+        合并一批的bulk_write结果。
+
+        :param result: BulkWriteResult.bulk_api_result或BulkWriteError.details。
+        :param ops: 该批的操作列表。
+        :param offset: 该批第一个操作的全局序号。
+        """
+        self.batches += 1
+        self.inserted_count += result.get('nInserted', 0)
+        self.matched_count += result.get('nMatched', 0)
+        self.modified_count += result.get('nModified', 0)
+        self.deleted_count += result.get('nRemoved', 0)
+        self.upserted_count += result.get('nUpserted', 0)
+        for item in result.get('upserted', []):
+            self.upserted_ids[offset + item['index']] = item['_id']
+        for error in result.get('writeErrors', []):
+            self.errors.append({'index': offset + error['index'], 'code': error.get('code'),
+                                'errmsg': error.get('errmsg'), 'op': ops[error['index']]})
+        self.write_concern_errors.extend(result.get('writeConcernErrors', []))
+
+    def add_failed_batch(self, ops, offset, error):
+        """
+        记录整批失败的批。
+
+        :param ops: 该批的操作列表。
+        :param offset: 该批第一个操作的全局序号。
+        :param error: 异常对象。
+        """
+        self.failed_batches.append({'index': offset, 'ops': ops, 'error': error})
+
+    def as_dict(self):
+        return {
+            'inserted_count': self.inserted_count,
+            'matched_count': self.matched_count,
+            'modified_count': self.modified_count,
+            'deleted_count': self.deleted_count,
+            'upserted_count': self.upserted_count,
+            'upserted_ids': dict(self.upserted_ids),
+            'errors': list(self.errors),
+            'write_concern_errors': list(self.write_concern_errors),
+            'failed_batches': list(self.failed_batches),
+            'batches': self.batches,
+        }
+
+    def __repr__(self):
+        return ('BulkWriteSummary(inserted=%d, matched=%d, modified=%d, deleted=%d, upserted=%d, errors=%d, '
+                'failed_batches=%d)') % (self.inserted_count, self.matched_count, self.modified_count,
+                                         self.deleted_count, self.upserted_count, len(self.errors),
+                                         len(self.failed_batches))
+
+
+class BulkWriter(object):
+    """
+    集合的缓冲批量写入器。
+
+    插入、更新、替换、删除操作先放入缓冲区，操作数达到batch_size或距上次写入超过flush_interval秒时，
+    以一次bulk_write（默认无序）写入，代替逐条insert_one/update_one的往返。
+    单条操作的错误（如唯一键冲突）不抛出，记录在summary.errors中；连接错误等其他异常会在
+    下一次添加操作、flush或close时抛出。出现这类异常时停止写入，失败的批及其后的操作都放回缓冲区
+    （可通过pending查看），再次调用flush会从失败的批开始重试；失败的批可能已部分写入，重试前需要确认操作可以重复执行。
+    按顺序执行（ordered=True）时服务器在第一个单条操作错误处停止，该错误记录在summary.errors中，
+    之后未执行的操作放回缓冲区并停止写入后续批次，同时抛出BulkWriteError（包装为OperationFailure）通知调用方。
+
+    用法::
+
+        with client.bulk_writer('users') as writer:
+            for doc in docs:
+                writer.insert_one(doc)
+        print(writer.summary.as_dict())
+    """
+
+    def __init__(self, collection, batch_size=1000, flush_interval=1.0, ordered=False):
+        """
+        初始化BulkWriter对象。
+
+        :param collection: pymongo的Collection对象。
+        :param batch_size: 缓冲的操作数达到该值时写入一批。
+        :param flush_interval: 距上次写入超过该秒数时写入缓冲的操作，None表示只按数量写入。
+        :param ordered: 是否按顺序执行。
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ordered = ordered
+        self.summary = BulkWriteSummary()
+        self._ops = []
+        self._offset = 0  # 缓冲区第一个操作的全局序号
+        self._last_flush = time.monotonic()
+        self._error = None
+        self._closed = False
+        self._lock = threading.Lock()  # 保护缓冲区
+        self._flush_lock = threading.Lock()  # 保证各批按添加顺序写入
+        self._stop = threading.Event()
+        self._timer = None
+        if flush_interval is not None:
+            # 后台线程定时写入，缓冲区在没有新操作时也不会一直滞留
+            self._timer = threading.Thread(target=self._run_timer, name='mongo-bulk-writer', daemon=True)
+            self._timer.start()
+
+    def insert_one(self, document):
+        self._add(InsertOne(document))
+
+    def update_one(self, query, data, upsert=False):
+        self._add(UpdateOne(query, data, upsert=upsert))
+
+    def update_many(self, query, data, upsert=False):
+        self._add(UpdateMany(query, data, upsert=upsert))
+
+    def replace_one(self, query, data, upsert=False):
+        self._add(ReplaceOne(query, data, upsert=upsert))
+
+    def delete_one(self, query):
+        self._add(DeleteOne(query))
+
+    def delete_many(self, query):
+        self._add(DeleteMany(query))
+
+    @property
+    def pending(self):
+        """ 缓冲区中尚未写入的操作列表（副本） """
+        with self._lock:
+            return list(self._ops)
+
+    def flush(self):
+        """
+        立即写入缓冲区中的所有操作。
+
+        :return: 累计的写入结果BulkWriteSummary。
+        :raises OperationFailure: 之前或本次写入时发生了单条操作错误以外的异常。
+        """
+        self._raise_error()
+        self._flush()
+        self._raise_error()
+        return self.summary
+
+    def close(self):
+        """
+        写入剩余的操作并停止后台线程。
+
+        :return: 累计的写入结果BulkWriteSummary。
+        """
+        if self._closed:
+            return self.summary
+        self._closed = True
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add(self, op):
+        if self._closed:
+            raise RuntimeError("BulkWriter已关闭")
+        self._raise_error()
+        with self._lock:
+            self._ops.append(op)
+            full = len(self._ops) >= self.batch_size
+        if full or self._interval_elapsed():
+            self._flush()
+            self._raise_error()
+
+    def _interval_elapsed(self):
+        return self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _run_timer(self):
+        while not self._stop.wait(self.flush_interval / 2.0):
+            # 上次写入失败且异常尚未抛给调用方时不自动重试
+            if self._ops and self._error is None and self._interval_elapsed():
+                self._flush()
+
+    def _flush(self):
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    ops = self._ops[:self.batch_size]
+                    del self._ops[:self.batch_size]
+                    offset = self._offset
+                    self._offset += len(ops)
+                if not ops:
+                    break
+                done = self._write(ops, offset)
+                if done < len(ops) or self._error is not None:
+                    # 停止写入后续批次，未执行的操作和剩余操作放回缓冲区，保持顺序以便重试
+                    with self._lock:
+                        self._ops[:0] = ops[done:]
+                        self._offset = offset + done
+                    break
+            self._last_flush = time.monotonic()
+
+    def _write(self, ops, offset):
+        """
+        写入一批操作。
+
+        :return: 已由服务器处理的操作数（单条操作错误也算已处理）。按顺序执行时服务器在第一个错误处停止，
+                 之后的操作未执行；其他异常时该批的执行情况未知，返回0。
+        """
+        try:
+            result = self.collection.bulk_write(ops, ordered=self.ordered).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+            self.summary.add(result, ops, offset)
+            if not self.ordered:
+                return len(ops)
+            if not result.get('writeErrors'):
+                return len(ops)
+            if self._error is None:
+                # 通知调用方：后续操作没有执行，保留在缓冲区中
+                self._error = e
+            return max(error['index'] for error in result['writeErrors']) + 1
+        except Exception as e:
+            # 该批操作的执行情况未知，保留异常在调用方线程中抛出
+            if self._error is None:
+                self._error = e
+            return 0
+        self.summary.add(result, ops, offset)
+        return len(ops)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            if isinstance(error, OperationFailure):
+                raise OperationFailure(f"An error occurred: {error}")
+            raise error
+
 
 # 使用示例
 if __name__ == '__main__':
@@ -134,4 +402,10 @@ if __name__ == '__main__':
     except Exception as e:
         print(e)
 
+    # 批量写入
+    with client.bulk_writer('your_collection', batch_size=1000) as writer:
+        for i in range(10000):
+            writer.update_one({'key': i}, {'$set': {'value': i}}, upsert=True)
+    print(writer.summary)
+
     # 更多操作...
\ No newline at end of file
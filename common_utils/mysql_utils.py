@@ -1,106 +1,1310 @@
 import asyncio
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
 import time
 import traceback
+import weakref
+from collections import OrderedDict, defaultdict
 
 import aiomysql
+import numpy as np
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+from pymysql.converters import escape_item
 
-# mysql_pool = None
-
-
-# async def create_pool():
-#     config = monitor_db
-#     loop = asyncio.get_event_loop()
-#     try:
-#         from sshtunnel import SSHTunnelForwarder
-#         # 本地ssh链接
-#         services = SSHTunnelForwarder(
-#             ('9.134.84.76', 36000),  # B机器的配置--跳板机
-#             ssh_password="Music@2017",  # B机器的配置--跳板机账号
-#             ssh_username="user_01",  # B机器的配置--跳板机账户密码
-#             remote_bind_address=(config["host"], config["port"]))  # A机器的配置-MySQL服务器
-#
-#         services.start()
-#
-#         pool = await aiomysql.create_pool(
-#             host="127.0.0.1",  # 指定数据库连接的主机地址
-#             port=services.local_bind_port,  # 指定数据库连接的端口号
-#             user=config["user"],  # 指定数据库连接的用户名
-#             password=config["password"],  # 指定数据库连接的密码
-#             db=config["database"],  # 指定要连接的数据库名称
-#             charset="utf8mb4",  # 指定字符集
-#             minsize=0,  # 指定连接池的最小连接数
-#             maxsize=20,  # 指定连接池的最大连接数
-#             loop=loop,
-#             autocommit=True,
-#             connect_timeout=120.0,
-#             echo=False
-#         )
-#
-#     except:
-#         pool = await aiomysql.create_pool(
-#             host=config["host"],  # 指定数据库连接的主机地址
-#             port=config["port"],  # 指定数据库连接的端口号
-#             user=config["user"],  # 指定数据库连接的用户名
-#             password=config["password"],  # 指定数据库连接的密码
-#             db=config["database"],  # 指定要连接的数据库名称
-#             charset="utf8mb4",  # 指定字符集
-#             minsize=0,  # 指定连接池的最小连接数
-#             maxsize=20,  # 指定连接池的最大连接数
-#             loop=loop,  # 指定事件循环
-#             autocommit=True,
-#             connect_timeout=120.0,
-#             echo=False
-#         )
-#     return pool
+logger = logging.getLogger(__name__)
+
+# 默认跳板机配置的环境变量，未设置MYSQL_SSH_HOST时默认直连
+SSH_CONFIG_ENV = {
+    'host': 'MYSQL_SSH_HOST',
+    'port': 'MYSQL_SSH_PORT',
+    'username': 'MYSQL_SSH_USERNAME',
+    'password': 'MYSQL_SSH_PASSWORD',
+    'pkey': 'MYSQL_SSH_PKEY',
+}
+# 也可以把跳板机配置写在JSON文件中，由该环境变量指定文件路径
+SSH_CONFIG_FILE_ENV = 'MYSQL_SSH_CONFIG_FILE'
+
+
+def load_ssh_config():
+    """
+    读取默认的跳板机配置，用于数据库配置中没有ssh项的情况。
+
+    先读取MYSQL_SSH_CONFIG_FILE指定的JSON文件（包含host、port、username、password或pkey），
+    再用SSH_CONFIG_ENV中的环境变量覆盖对应项。密码等凭据不应写在代码中。
+
+    :return: 跳板机配置字典，没有配置host时返回None，表示直连。
+    :raises ValueError: 配置文件不是合法的JSON。
+    """
+    ssh_config = {}
+    config_file = os.environ.get(SSH_CONFIG_FILE_ENV)
+    if config_file:
+        with open(config_file, encoding='utf-8') as f:
+            ssh_config.update(json.load(f))
+    for key, env_name in SSH_CONFIG_ENV.items():
+        if os.environ.get(env_name):
+            ssh_config[key] = os.environ[env_name]
+    if not ssh_config.get('host'):
+        return None
+    ssh_config['port'] = int(ssh_config.get('port', 22))
+    return ssh_config
+
+
+class _Tunnel(object):
+    """ 一条SSH隧道的状态，断开后重建时沿用原来的本地端口，已建立的连接池不需要修改地址 """
+
+    def __init__(self, ssh_config, remote_host, remote_port):
+        self.ssh_config = ssh_config
+        self.remote_address = (remote_host, remote_port)
+        self.lock = threading.Lock()
+        self.forwarder = None
+        self.local_port = None
+        self.failures = 0  # 连续失败次数
+        self.next_retry = 0.0
+        self.restarts = 0
+        self.last_error = None
+
+    def is_up(self):
+        return self.forwarder is not None and self.forwarder.is_active
+
+    def ensure(self, min_backoff, max_backoff):
+        with self.lock:
+            if self.is_up():
+                return self.local_port
+            now = time.monotonic()
+            if now < self.next_retry:
+                raise ConnectionError("SSH隧道不可用，%.1f秒后重试: %r" % (self.next_retry - now, self.last_error))
+            self.stop()
+            try:
+                from sshtunnel import SSHTunnelForwarder
+                forwarder = SSHTunnelForwarder(
+                    (self.ssh_config['host'], self.ssh_config.get('port', 22)),
+                    ssh_username=self.ssh_config.get('username'),
+                    ssh_password=self.ssh_config.get('password'),
+                    ssh_pkey=self.ssh_config.get('pkey'),
+                    remote_bind_address=self.remote_address,  # A机器的配置-MySQL服务器
+                    local_bind_address=('127.0.0.1', self.local_port or 0))
+                forwarder.start()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                self.next_retry = now + min(max_backoff, min_backoff * 2 ** (self.failures - 1))
+                raise
+            if self.local_port is not None:
+                self.restarts += 1
+            self.forwarder = forwarder
+            self.local_port = forwarder.local_bind_port
+            self.failures = 0
+            self.last_error = None
+            return self.local_port
+
+    def stop(self):
+        if self.forwarder is not None:
+            try:
+                self.forwarder.stop()
+            except Exception:
+                pass
+            self.forwarder = None
+
+
+class SSHTunnelManager(object):
+    """
+    SSH隧道管理器，每个(跳板机, 远程主机, 端口)只保持一条长期存在的隧道，由所有连接和连接池共享。
+
+    隧道在首次使用时建立，后台线程每隔check_interval秒检查一次，断开的隧道按指数退避
+    （min_backoff到max_backoff秒）重建；退避期间获取隧道会直接抛出ConnectionError。
+    """
+
+    def __init__(self, min_backoff=1.0, max_backoff=60.0, check_interval=30.0):
+        """
+        初始化SSHTunnelManager对象。
+
+        :param min_backoff: 第一次重建失败后的等待秒数，之后每次失败加倍。
+        :param max_backoff: 重建等待的最大秒数。
+        :param check_interval: 后台检查隧道的间隔秒数。
+        """
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.check_interval = check_interval
+        self._tunnels = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watchdog = None
+
+    def get_local_port(self, ssh_config, remote_host, remote_port):
+        """
+        获取隧道的本地端口，隧道不存在或已断开时（阻塞地）建立。
+
+        :param ssh_config: 跳板机配置，包含host、port、username，以及password或pkey。
+        :param remote_host: 经跳板机访问的远程主机。
+        :param remote_port: 远程端口。
+        :return: 本地端口，连接127.0.0.1的该端口即访问远程主机。
+        :raises ImportError: 未安装sshtunnel。
+        :raises ConnectionError: 隧道重建失败后的退避期间。
+        """
+        tunnel = self._get_tunnel(ssh_config, remote_host, remote_port)
+        if tunnel.is_up():
+            return tunnel.local_port
+        port = tunnel.ensure(self.min_backoff, self.max_backoff)
+        self._start_watchdog()
+        return port
+
+    async def get_local_port_async(self, ssh_config, remote_host, remote_port):
+        """ 同get_local_port，隧道已建立时直接返回，需要建立时在线程池中进行，不阻塞事件循环。 """
+        tunnel = self._get_tunnel(ssh_config, remote_host, remote_port)
+        if tunnel.is_up():
+            return tunnel.local_port
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get_local_port, ssh_config, remote_host, remote_port)
+
+    def stats(self):
+        """
+        :return: {(跳板机, 跳板机端口, 远程主机, 远程端口): {'up', 'local_port', 'restarts', 'failures', 'last_error'}}
+        """
+        with self._lock:
+            tunnels = list(self._tunnels.items())
+        return {key[:2] + key[3:]: {
+            'up': tunnel.is_up(),
+            'local_port': tunnel.local_port,
+            'restarts': tunnel.restarts,
+            'failures': tunnel.failures,
+            'last_error': repr(tunnel.last_error) if tunnel.last_error is not None else None,
+        } for key, tunnel in tunnels}
+
+    def close(self):
+        """ 停止后台检查线程和所有隧道 """
+        self._stopped.set()
+        with self._lock:
+            tunnels = list(self._tunnels.values())
+            self._tunnels.clear()
+        for tunnel in tunnels:
+            with tunnel.lock:
+                tunnel.stop()
+
+    def _get_tunnel(self, ssh_config, remote_host, remote_port):
+        key = (ssh_config['host'], ssh_config.get('port', 22), ssh_config.get('username'), remote_host, remote_port)
+        with self._lock:
+            tunnel = self._tunnels.get(key)
+            if tunnel is None:
+                tunnel = self._tunnels[key] = _Tunnel(ssh_config, remote_host, remote_port)
+            return tunnel
+
+    def _start_watchdog(self):
+        with self._lock:
+            if self._watchdog is not None or self._stopped.is_set():
+                return
+            self._watchdog = threading.Thread(target=self._watch, name='SSHTunnelManager', daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        while not self._stopped.wait(self.check_interval):
+            with self._lock:
+                tunnels = list(self._tunnels.values())
+            for tunnel in tunnels:
+                if tunnel.is_up():
+                    continue
+                try:
+                    tunnel.ensure(self.min_backoff, self.max_backoff)
+                except Exception:
+                    pass
+
+
+# 进程内共享的隧道管理器
+tunnel_manager = SSHTunnelManager()
+atexit.register(tunnel_manager.close)
+
+
+async def _resolve_address(config):
+    """
+    确定连接MySQL使用的地址，配置了跳板机时返回隧道的本地地址。
+
+    :return: [(host, port), ...]，依次尝试，隧道不可用时只有直连地址。
+    """
+    direct = (config["host"], config["port"])
+    ssh_config = config["ssh"] if "ssh" in config else load_ssh_config()
+    if not ssh_config:
+        return [direct]
+    try:
+        port = await tunnel_manager.get_local_port_async(ssh_config, config["host"], config["port"])
+    except Exception:
+        return [direct]
+    return [("127.0.0.1", port), direct]
 
 
 async def get_mysql_connection(config):
+    """
+    建立单个MySQL连接。配置了跳板机时经由共享的SSH隧道连接，隧道不可用时直连，参见SSHTunnelManager。
+
+    :param config: 数据库配置，包含host、port、user、password、database，可选ssh（跳板机配置，None表示直连，未指定时使用load_ssh_config()的结果）。
+    :return: aiomysql连接。
+    """
     loop = asyncio.get_event_loop()
+    addresses = await _resolve_address(config)
+    for i, (host, port) in enumerate(addresses):
+        try:
+            return await aiomysql.connect(
+                host=host,  # 指定数据库连接的主机地址
+                port=port,  # 指定数据库连接的端口号
+                user=config["user"],  # 指定数据库连接的用户名
+                password=config["password"],  # 指定数据库连接的密码
+                db=config["database"],  # 指定要连接的数据库名称
+                charset="utf8mb4",  # 指定字符集
+                loop=loop,
+                autocommit=True,
+            )
+        except Exception:
+            if i == len(addresses) - 1:
+                raise
+
+
+class PoolStats(object):
+    """ 连接池的统计信息，同一配置的连接池共享一个PoolStats """
+
+    def __init__(self):
+        self.acquire_count = 0  # 获取连接的次数
+        self.acquire_timeouts = 0  # 获取连接超时的次数
+        self.ping_failures = 0  # 健康检查失败的次数
+        self.wait_time_total = 0.0  # 等待连接的总耗时（秒）
+        self.wait_time_max = 0.0
+        self.in_use = 0  # 正在使用的连接数
+        self.max_in_use = 0
+
+    @property
+    def wait_time_avg(self):
+        return self.wait_time_total / self.acquire_count if self.acquire_count else 0.0
+
+    def as_dict(self):
+        return {
+            'acquire_count': self.acquire_count,
+            'acquire_timeouts': self.acquire_timeouts,
+            'ping_failures': self.ping_failures,
+            'wait_time_total': self.wait_time_total,
+            'wait_time_avg': self.wait_time_avg,
+            'wait_time_max': self.wait_time_max,
+            'in_use': self.in_use,
+            'max_in_use': self.max_in_use,
+        }
+
+    def __repr__(self):
+        return 'PoolStats(acquire=%d, timeouts=%d, in_use=%d/%d, wait_avg=%.4fs, wait_max=%.4fs)' % (
+            self.acquire_count, self.acquire_timeouts, self.in_use, self.max_in_use, self.wait_time_avg,
+            self.wait_time_max)
+
+
+class _PoolEntry(object):
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.stats = PoolStats()
+        self.max_allowed_packet = None  # 首次批量写入时查询
+
+
+# 每个事件循环中每个数据库配置一个连接池 {loop: {配置键: 创建连接池的Future}}
+_pools = weakref.WeakKeyDictionary()
+
+
+def _config_key(config):
+    return tuple(sorted((k, repr(v)) for k, v in config.items()))
+
+
+async def _create_pool(config, minsize, maxsize, pool_recycle):
+    pool_kwargs = dict(
+        user=config["user"],  # 指定数据库连接的用户名
+        password=config["password"],  # 指定数据库连接的密码
+        db=config["database"],  # 指定要连接的数据库名称
+        charset="utf8mb4",  # 指定字符集
+        minsize=minsize,  # 指定连接池的最小连接数
+        maxsize=maxsize,  # 指定连接池的最大连接数
+        pool_recycle=pool_recycle,  # 空闲超过该秒数的连接在下次获取时关闭重建
+        autocommit=True,
+        connect_timeout=120.0,
+        echo=False,
+    )
+    addresses = await _resolve_address(config)
+    for i, (host, port) in enumerate(addresses):
+        try:
+            pool = await aiomysql.create_pool(host=host, port=port, **pool_kwargs)
+            break
+        except Exception:
+            if i == len(addresses) - 1:
+                raise
+    return _PoolEntry(pool)
+
+
+async def get_mysql_pool(config, minsize=1, maxsize=20, pool_recycle=3600):
+    """
+    获取数据库配置对应的连接池，不存在时创建。同一事件循环中相同配置只创建一个连接池，并发调用会等待同一次创建。
+
+    :param config: 数据库配置，包含host、port、user、password、database。
+    :param minsize: 连接池的最小连接数。
+    :param maxsize: 连接池的最大连接数。
+    :param pool_recycle: 空闲超过该秒数的连接在下次获取时重建，-1表示不回收。
+    :return: _PoolEntry，包含aiomysql连接池pool和统计信息stats。
+    """
+    loop = asyncio.get_event_loop()
+    pools = _pools.setdefault(loop, {})
+    key = _config_key(config)
+    future = pools.get(key)
+    if future is None:
+        future = pools[key] = asyncio.ensure_future(_create_pool(config, minsize, maxsize, pool_recycle))
     try:
-        from sshtunnel import SSHTunnelForwarder
-        # 在单独的线程里建立SSH隧道
-        services = SSHTunnelForwarder(
-            ('9.134.84.76', 36000),  # B机器的配置--跳板机
-            ssh_password="Music@2017",  # B机器的配置--跳板机账号
-            ssh_username="user_01",  # B机器的配置--跳板机账户密码
-            remote_bind_address=(config["host"], config["port"]))  # A机器的配置-MySQL服务器
-
-        services.start()
-
-        # 用新的host和port参数建立异步MySQL连接
-        conn = await aiomysql.connect(
-            host="127.0.0.1",  # 指定数据库连接的主机地址
-            port=services.local_bind_port,  # 指定数据库连接的端口号
-            user=config["user"],  # 指定数据库连接的用户名
-            password=config["password"],  # 指定数据库连接的密码
-            db=config["database"],  # 指定要连接的数据库名称
-            charset="utf8mb4",  # 指定字符集
-            loop=loop,
-            autocommit=True,
-        )
-    except:
-        conn = await aiomysql.connect(
-            host=config["host"],  # 指定数据库连接的主机地址
-            port=config["port"],  # 指定数据库连接的端口号
-            user=config["user"],  # 指定数据库连接的用户名
-            password=config["password"],  # 指定数据库连接的密码
-            db=config["database"],  # 指定要连接的数据库名称
-            charset="utf8mb4",  # 指定字符集
-            loop=loop,
-            autocommit=True,
-        )
-
-    return conn
+        return await asyncio.shield(future)
+    except Exception:
+        # 创建失败时不缓存，下次重新创建
+        if pools.get(key) is future:
+            del pools[key]
+        raise
+
+
+async def close_mysql_pools():
+    """ 关闭当前事件循环中的所有连接池 """
+    pools = _pools.pop(asyncio.get_event_loop(), {})
+    for future in pools.values():
+        if future.done() and not future.cancelled() and future.exception() is None:
+            entry = future.result()
+            entry.pool.close()
+            await entry.pool.wait_closed()
+
+
+class _PooledConnection(object):
+    """ 从连接池获取连接的异步上下文管理器，退出时归还连接 """
+
+    def __init__(self, mysql_pool):
+        self.mysql_pool = mysql_pool
+        self.entry = None
+        self.conn = None
+        self.connect_time = 0.0  # 获取连接池（首次使用时建立隧道和连接池）和ping检查的耗时
+        self.wait_time = 0.0  # 等待连接池分配连接的耗时
+
+    async def __aenter__(self):
+        mysql_pool = self.mysql_pool
+        connect_start = time.perf_counter()
+        self.entry = entry = await get_mysql_pool(mysql_pool.config, mysql_pool.minsize, mysql_pool.maxsize,
+                                                  mysql_pool.pool_recycle)
+        stats = entry.stats
+        loop = asyncio.get_event_loop()
+        self.connect_time = time.perf_counter() - connect_start
+        timeout = mysql_pool.acquire_timeout
+        deadline = None if timeout is None else loop.time() + timeout
+        interval = mysql_pool.pre_ping_interval
+        while True:
+            conn = await self._acquire(entry, None if deadline is None else max(deadline - loop.time(), 0))
+            if interval is None or loop.time() - conn.last_usage < interval:
+                break
+            ping_start = time.perf_counter()
+            try:
+                # 空闲较久的连接先检查是否可用，断开时自动重连
+                await conn.ping()
+                break
+            except Exception:
+                # 重连也失败的连接关闭后丢弃，重新获取；新建的连接不需要再检查
+                stats.ping_failures += 1
+                conn.close()
+                entry.pool.release(conn)
+            finally:
+                self.connect_time += time.perf_counter() - ping_start
+        self.conn = conn
+        stats.in_use += 1
+        stats.max_in_use = max(stats.max_in_use, stats.in_use)
+        return conn
+
+    async def _acquire(self, entry, timeout):
+        stats = entry.stats
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(entry.pool.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            stats.acquire_timeouts += 1
+            raise
+        finally:
+            wait_time = time.perf_counter() - start
+            self.wait_time += wait_time
+            stats.acquire_count += 1
+            stats.wait_time_total += wait_time
+            stats.wait_time_max = max(stats.wait_time_max, wait_time)
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        if exc_type is not None and not isinstance(exc_value, aiomysql.Error):
+            # 连接上可能还有未读完的结果，直接关闭不再复用
+            self.conn.close()
+        self.entry.stats.in_use -= 1
+        self.entry.pool.release(self.conn)
+        self.conn = None
+
+
+class BulkResult(object):
+    """ 批量写入的结果 """
+
+    def __init__(self):
+        self.rows = 0  # 提交的行数
+        self.rowcount = 0  # 服务器返回的影响行数之和
+        self.batches = []  # [(批次序号, 行数, 影响行数), ...]，按完成顺序排列
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return 'BulkResult(rows=%d, rowcount=%d, batches=%d, elapsed=%.3fs, rows/s=%.0f)' % (
+            self.rows, self.rowcount, len(self.batches), self.elapsed, self.rows_per_sec)
+
+
+def _quote_name(name):
+    return '`%s`' % str(name).replace('`', '``')
+
+
+def _escape_value(value, charset='utf8mb4'):
+    # None、NaN、NaT、pd.NA（如DataFrame中的空值）写入NULL
+    if value is None or (not isinstance(value, (str, bytes, bytearray, list, tuple, set, dict)) and pd.isna(value)):
+        return 'NULL'
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value).to_pydatetime()
+    elif isinstance(value, np.timedelta64):
+        value = pd.Timedelta(value).to_pytimedelta()
+    elif isinstance(value, np.generic):
+        # numpy标量（如np.int64、np.bool_）转换为对应的Python类型
+        value = value.item()
+    elif isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif isinstance(value, pd.Timedelta):
+        value = value.to_pytimedelta()
+    return escape_item(value, charset)
+
+
+def _escape_row(row, charset='utf8mb4'):
+    return '(%s)' % ','.join(_escape_value(value, charset) for value in row)
+
+
+def _iter_insert_batches(prefix, suffix, rows, max_bytes, max_rows):
+    """
+    把行拼接成多行INSERT语句，每条语句不超过max_bytes字节和max_rows行。
+
+    :yield: (sql, 行数)
+    """
+    fixed_bytes = len(prefix.encode('utf-8')) + len(suffix.encode('utf-8'))
+    values = []
+    size = fixed_bytes
+    for row in rows:
+        value = _escape_row(row)
+        value_bytes = len(value.encode('utf-8')) + 1
+        if values and (size + value_bytes > max_bytes or len(values) >= max_rows):
+            yield prefix + ','.join(values) + suffix, len(values)
+            values = []
+            size = fixed_bytes
+        if fixed_bytes + value_bytes > max_bytes:
+            raise ValueError("单行数据超过每批的字节上限: %d字节" % value_bytes)
+        values.append(value)
+        size += value_bytes
+    if values:
+        yield prefix + ','.join(values) + suffix, len(values)
+
+
+class MysqlStream(object):
+    """
+    使用服务器端（SS）游标的流式查询结果，按批读取，客户端内存只保存当前一批数据。
+
+    用法::
+
+        async with pool.select_mysql_stream(sql) as batches:
+            async for batch in batches:
+                ...
+
+    读完后连接归还连接池；提前结束（break、异常、aclose）时服务器仍在发送剩余结果，连接无法复用，直接关闭。
+    消费过慢时可能触发服务器的net_write_timeout。
+    """
+
+    def __init__(self, mysql_pool, sql, args, batch_size, cursorclass=None):
+        self.mysql_pool = mysql_pool
+        self.sql = sql
+        self.args = args
+        self.batch_size = batch_size
+        self.cursorclass = cursorclass or mysql_pool.ss_cursorclass
+        self.rows = 0  # 已读取的行数
+        self.description = None  # 执行查询后为游标的description
+        self._phases = {'connect': 0.0, 'pool_wait': 0.0, 'execute': 0.0, 'fetch': 0.0}
+        self._start = None
+        self._acquire = None
+        self._conn = None
+        self._cursor = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            if self._cursor is None:
+                await self._open()
+            fetch_start = time.perf_counter()
+            rows = await self._cursor.fetchmany(self.batch_size)
+            self._phases['fetch'] += time.perf_counter() - fetch_start
+        except BaseException as e:
+            await self.aclose(e)
+            raise
+        if not rows:
+            await self._finish()
+            raise StopAsyncIteration
+        self.rows += len(rows)
+        return rows
+
+    async def aclose(self, error=None):
+        """ 提前结束读取，关闭连接。已读完时不做任何操作。 """
+        if self._closed:
+            return
+        self._closed = True
+        if self._conn is not None:
+            self._conn.close()
+            await self._acquire.__aexit__(None, None, None)
+        self._record(error)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def _open(self):
+        self._start = time.perf_counter()
+        self._acquire = self.mysql_pool.acquire()
+        self._conn = await self._acquire.__aenter__()
+        self._phases['connect'] = self._acquire.connect_time
+        self._phases['pool_wait'] = self._acquire.wait_time
+        self._cursor = await self._conn.cursor(self.cursorclass)
+        execute_start = time.perf_counter()
+        timeout = self.mysql_pool.query_timeout
+        if len(self.args) > 0:
+            await asyncio.wait_for(self._cursor.execute(self.sql, self.args), timeout=timeout)
+        else:
+            await asyncio.wait_for(self._cursor.execute(self.sql), timeout=timeout)
+        self._phases['execute'] = time.perf_counter() - execute_start
+        self.description = self._cursor.description
+
+    async def _finish(self):
+        self._closed = True
+        await self._cursor.close()
+        await self._acquire.__aexit__(None, None, None)
+        self._record(None)
+
+    def _record(self, error):
+        # 总耗时包含调用方处理数据的时间
+        metrics = self.mysql_pool.metrics
+        if metrics is not None and self._start is not None:
+            phases = dict(self._phases, total=time.perf_counter() - self._start)
+            metrics.record(self.sql, self.args, phases, self.rows, error)
+
+
+async def _cancel_tasks(tasks):
+    """ 取消任务并等待全部结束 """
+    pending = [task for task in tasks if not task.done()]
+    while pending:
+        for task in pending:
+            task.cancel()
+        # 内层协程恰好完成时asyncio.wait_for会吞掉取消（Python 3.12之前），仍未结束的任务再次取消
+        _, pending = await asyncio.wait(pending, timeout=0.1)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class KeysetScanner(object):
+    """
+    按主键把表切分成多个区间并行读取的扫描器。
+
+    每个区间用键集分页（WHERE key > 上一批最后的键 ORDER BY key LIMIT batch_size）读取，不使用OFFSET；
+    最多concurrency个区间同时读取，每页查询从连接池获取一个连接。
+    ordered为True时按键的顺序产出各批数据，否则按读取完成的顺序产出。
+    checkpoint()返回每个区间已产出到的键，传给新的扫描器即可从断点继续（已产出但未处理完的一批会重新读取）。
+    只支持单列主键（或唯一索引列）。
+    """
+
+    SPLIT_METHODS = ('minmax', 'sample')
+
+    def __init__(self, mysql_pool, table, key, columns=None, where=None, args=[], batch_size=5000, ranges=None,
+                 concurrency=4, ordered=True, split='minmax', sample_size=10000, checkpoint=None):
+        """
+        初始化KeysetScanner对象。
+
+        :param mysql_pool: MysqlPool对象。
+        :param table: 表名。
+        :param key: 主键列名，用于切分区间和分页。
+        :param columns: 读取的列名列表，默认为全部列；不包含key时自动加入。
+        :param where: 附加的过滤条件（SQL片段），如 'status = %s'。
+        :param args: where中的参数。
+        :param batch_size: 每批的行数。
+        :param ranges: 区间数，默认为concurrency的4倍。
+        :param concurrency: 同时读取的区间数。
+        :param ordered: 是否按键的顺序产出。
+        :param split: 'minmax'按MIN/MAX均匀切分整数键；'sample'随机抽样键值后按分位数切分，适合分布不均或非整数的键。
+        :param sample_size: split为'sample'时的大致抽样行数。
+        :param checkpoint: checkpoint()返回的断点，指定时不再重新切分区间。
+        :raises ValueError: split不是SPLIT_METHODS之一。
+        """
+        if split not in self.SPLIT_METHODS:
+            raise ValueError("split必须是%s之一" % (self.SPLIT_METHODS,))
+        self.mysql_pool = mysql_pool
+        self.table = table
+        self.key = key
+        if columns is None:
+            self.columns = '*'
+        else:
+            self.columns = ','.join(_quote_name(c) for c in (columns if key in columns else [key] + list(columns)))
+        self.where = where
+        self.args = list(args)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.ranges = ranges or concurrency * 4
+        self.ordered = ordered
+        self.split = split
+        self.sample_size = sample_size
+        self.rows = 0  # 已产出的行数
+        self._states = [dict(state) for state in checkpoint['ranges']] if checkpoint is not None else None
+
+    def checkpoint(self):
+        """
+        :return: 断点，{'ranges': [{'after': 已产出的最后一个键, 'upto': 区间上界, 'done': 是否读完}, ...]}，
+                 键值为JSON支持的类型时可以直接json保存。
+        """
+        return {'ranges': [dict(state) for state in self._states or []]}
+
+    async def scan(self):
+        """
+        异步生成器扫描全表。
+
+        :yield: 行列表，行的类型由MysqlPool的cursorclass决定。
+        """
+        if self._states is None:
+            self._states = await self._plan()
+        pending = [i for i, state in enumerate(self._states) if not state['done']]
+        shared_queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        queues = {}
+        tasks = []
+
+        def launch():
+            # 按区间顺序启动，最早未读完的区间总在运行，有序模式下不会因等待后面的区间而阻塞
+            while pending and len(queues) < self.concurrency:
+                index = pending.pop(0)
+                queues[index] = asyncio.Queue(maxsize=2) if self.ordered else shared_queue
+                tasks.append(asyncio.ensure_future(self._scan_range(index, queues[index])))
+
+        try:
+            launch()
+            while queues:
+                queue = queues[min(queues)] if self.ordered else shared_queue
+                index, rows, last_key, error = await queue.get()
+                if error is not None:
+                    raise error
+                state = self._states[index]
+                if rows is None:
+                    state['done'] = True
+                    del queues[index]
+                    launch()
+                    continue
+                self.rows += len(rows)
+                yield rows
+                state['after'] = last_key
+        finally:
+            await _cancel_tasks(tasks)
+
+    async def _scan_range(self, index, queue):
+        state = self._states[index]
+        after = state['after']
+        try:
+            while True:
+                rows, last_key = await self._fetch_page(after, state['upto'])
+                if rows:
+                    after = last_key
+                    await queue.put((index, rows, last_key, None))
+                if len(rows) < self.batch_size:
+                    await queue.put((index, None, None, None))
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put((index, None, None, e))
+
+    async def _fetch_page(self, after, upto):
+        key = _quote_name(self.key)
+        conditions = []
+        params = []
+        if after is not None:
+            conditions.append('%s > %%s' % key)
+            params.append(after)
+        if upto is not None:
+            conditions.append('%s <= %%s' % key)
+            params.append(upto)
+        if self.where:
+            conditions.append('(%s)' % self.where)
+            params.extend(self.args)
+        sql = 'SELECT %s FROM %s%s ORDER BY %s LIMIT %d' % (
+            self.columns, _quote_name(self.table), ' WHERE ' + ' AND '.join(conditions) if conditions else '', key,
+            self.batch_size)
+
+        async def fetch(cursor):
+            rows = await cursor.fetchall()
+            if not rows:
+                return (rows, None), 0
+            last = rows[-1]
+            if isinstance(last, dict):
+                return (rows, last[self.key]), len(rows)
+            names = [column[0] for column in cursor.description]
+            return (rows, last[names.index(self.key)]), len(rows)
+
+        return await self.mysql_pool._execute(sql, params, fetch)
+
+    async def _plan(self):
+        key = _quote_name(self.key)
+        table = _quote_name(self.table)
+        where = ' WHERE (%s)' % self.where if self.where else ''
+        async with self.mysql_pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                if self.split == 'minmax':
+                    await cursor.execute('SELECT MIN(%s), MAX(%s) FROM %s%s' % (key, key, table, where), self.args)
+                    low, high = await cursor.fetchone()
+                    if low is None:
+                        return []
+                    if not isinstance(low, int) or not isinstance(high, int):
+                        raise ValueError("minmax只能切分整数键，请使用split='sample'")
+                    step = (high - low + 1) / float(self.ranges)
+                    bounds = [low - 1 + int(math.ceil(step * i)) for i in range(1, self.ranges)]
+                else:
+                    await cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                                         'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [self.table])
+                    row = await cursor.fetchone()
+                    estimated = max(int(row[0] or 0), 1) if row else 1
+                    fraction = min(1.0, float(self.sample_size) / estimated)
+                    await cursor.execute('SELECT %s FROM %s WHERE RAND() < %%s%s' % (
+                        key, table, ' AND (%s)' % self.where if self.where else ''), [fraction] + self.args)
+                    keys = sorted(row[0] for row in await cursor.fetchall())
+                    if not keys:
+                        return []
+                    bounds = [keys[len(keys) * i // self.ranges] for i in range(1, self.ranges)]
+        bounds = sorted(set(bounds))
+        # 第一个区间没有下界，最后一个区间没有上界，扫描期间新增的键也能读到
+        return [{'after': after, 'upto': upto, 'done': False} for after, upto in zip([None] + bounds, bounds + [None])]
+
+
+_FROM_RE = re.compile(r'\b(?:from|join)\s+(?!\()(.+?)(?=\bwhere\b|\bgroup\b|\border\b|\bhaving\b|\blimit\b|\bunion\b|'
+                      r'\b(?:left|right|inner|outer|cross|natural|straight_join|join|on|using)\b|[();]|$)',
+                      re.IGNORECASE | re.DOTALL)
+_WRITE_RE = re.compile(r'^\s*(?:insert(?:\s+(?:low_priority|delayed|high_priority|ignore))*\s+(?:into\s+)?|'
+                       r'replace(?:\s+(?:low_priority|delayed))*\s+(?:into\s+)?|'
+                       r'update(?:\s+(?:low_priority|ignore))*\s+|'
+                       r'delete(?:\s+(?:low_priority|quick|ignore))*\s+from\s+|truncate\s+(?:table\s+)?|'
+                       r'(?:alter|drop)\s+table\s+(?:if\s+exists\s+)?)([`\w$.]+)', re.IGNORECASE)
+# 结果随时间或会话变化、或带锁的查询不缓存
+_UNCACHEABLE_RE = re.compile(r'\b(?:now|sysdate|curdate|curtime|current_date|current_time|current_timestamp|'
+                             r'unix_timestamp|utc_timestamp|rand|uuid|uuid_short|connection_id|last_insert_id|'
+                             r'found_rows|row_count|user|database)\s*\(|\bfor\s+update\b|\block\s+in\s+share\s+mode\b|'
+                             r'\bfor\s+share\b|@', re.IGNORECASE)
+
+
+def _normalize_table(name):
+    # 去掉反引号和库名前缀，db.t与t视为同一张表
+    return name.replace('`', '').split('.')[-1].lower()
+
+
+def _normalize_sql(sql):
+    return ' '.join(sql.split()).rstrip(';')
+
+
+def _read_tables(sql):
+    """
+    解析查询语句读取的表。
+
+    :return: 表名集合；不是可缓存的查询或无法解析时返回None。
+    """
+    if not re.match(r'\s*(?:select|with)\b', sql, re.IGNORECASE) or _UNCACHEABLE_RE.search(sql):
+        return None
+    tables = set()
+    for match in _FROM_RE.finditer(sql):
+        for item in match.group(1).split(','):
+            words = item.split()
+            if words and words[0][0] not in '(\'"':
+                tables.add(_normalize_table(words[0]))
+    return tables or None
+
+
+def _write_tables(sql):
+    """
+    解析写入语句修改的表。
+
+    :return: 表名集合；无法解析时返回None，表示需要使全部缓存失效。
+    """
+    match = _WRITE_RE.match(sql)
+    return {_normalize_table(match.group(1))} if match else None
+
+
+def _estimate_size(value):
+    """ 粗略估计查询结果占用的内存字节数 """
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class QueryCache(object):
+    """
+    查询结果的读穿缓存。
+
+    - 缓存键为规范化的SQL（合并空白）、参数、数据库配置和结果类型；
+    - 条目在ttl秒后过期，条目数或估计的内存占用超出上限时按LRU淘汰；
+    - 并发的相同查询只执行一次，其他请求等待同一个结果（single-flight）；
+    - 写入某张表后，读取过该表的条目全部失效；查询执行期间表被写入时，结果不会写入缓存。
+
+    返回的结果在多个调用方之间共享，不应修改。包含NOW()、RAND()等函数或加锁的查询不缓存。
+    """
+
+    def __init__(self, ttl=60.0, max_entries=10000, max_bytes=256 * 1024 * 1024):
+        """
+        初始化QueryCache对象。
+
+        :param ttl: 条目的有效秒数。
+        :param max_entries: 最大条目数。
+        :param max_bytes: 条目估计占用内存的上限。
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # 等待其他请求结果的次数
+        self.evictions = 0
+        self.invalidations = 0  # 因写入而失效的条目数
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # 键 -> (过期时间, 字节数, 表名集合, 结果)
+        self._table_keys = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._global_generation = 0
+        self._inflight = {}
+
+    async def get_or_load(self, key, tables, loader):
+        """
+        读取缓存，未命中时调用loader执行查询并写入缓存。
+
+        :param key: 缓存键。
+        :param tables: 查询读取的表名集合。
+        :param loader: 无参协程函数，返回查询结果。
+        :return: 查询结果。
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+            self._remove(key)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 执行查询的请求被取消，由当前请求重新执行
+                return await self.get_or_load(key, tables, loader)
+        self.misses += 1
+        generation = self._generation(tables)
+        future = self._inflight[key] = asyncio.get_event_loop().create_future()
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有其他等待者时避免“exception was never retrieved”警告
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(value)
+        if self._generation(tables) == generation:
+            self._store(key, tables, value)
+        return value
+
+    def invalidate(self, tables=None):
+        """
+        使读取过指定表的条目失效。
+
+        :param tables: 表名集合，None表示使全部条目失效。
+        """
+        if tables is None:
+            self._global_generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._table_keys.clear()
+            self.total_bytes = 0
+            return
+        for table in tables:
+            table = _normalize_table(table)
+            self._generations[table] += 1
+            for key in self._table_keys.pop(table, ()):
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def stats(self):
+        """ :return: 命中、未命中、合并、淘汰、失效次数，以及条目数和估计的内存占用 """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+        }
+
+    def _generation(self, tables):
+        return self._global_generation, tuple(self._generations[table] for table in sorted(tables))
+
+    def _store(self, key, tables, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, tables, value)
+        self.total_bytes += size
+        for table in tables:
+            self._table_keys[table].add(key)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, tables, _ = self._entries.pop(key)
+        self.total_bytes -= size
+        for table in tables:
+            keys = self._table_keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._table_keys[table]
+
+
+_INT_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.INT24, FIELD_TYPE.LONG, FIELD_TYPE.LONGLONG,
+              FIELD_TYPE.YEAR}
+_FLOAT_TYPES = {FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE}
+_DECIMAL_TYPES = {FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL}
+_DATETIME_TYPES = {FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP, FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE}
+
+
+def _column_dtype(type_code, decimal_as_float):
+    """
+    根据游标description中的类型确定列的numpy类型。
+
+    :return: numpy类型，字符串等其他类型返回object。
+    """
+    if type_code in _INT_TYPES:
+        # 实际出现NULL的整数块由_rows_to_arrays转换为pandas的Int64，不会转成float64丢失精度
+        return np.dtype(np.int64)
+    if type_code in _FLOAT_TYPES or (decimal_as_float and type_code in _DECIMAL_TYPES):
+        return np.dtype(np.float64)
+    if type_code in _DATETIME_TYPES:
+        return np.dtype('datetime64[us]')
+    if type_code == FIELD_TYPE.TIME:
+        return np.dtype('timedelta64[us]')
+    return np.dtype(object)
+
+
+def _rows_to_arrays(rows, dtypes):
+    """
+    把元组行转换为列数组。
+
+    :param rows: 元组行的列表。
+    :param dtypes: 每列的numpy类型。
+    :return: 列数组的列表，含NULL的整数列为pandas的Int64数组。
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(dtypes)
+    arrays = []
+    for values, dtype in zip(columns, dtypes):
+        if dtype.kind == 'f':
+            values = [np.nan if value is None else value for value in values]
+        try:
+            if dtype.kind == 'i' and None in values:
+                arrays.append(pd.array(values, dtype='Int64'))
+                continue
+            arrays.append(np.array(values, dtype=dtype))
+        except (TypeError, ValueError, OverflowError):
+            # 超出int64的无符号整数、零值日期('0000-00-00'返回为字符串)等，保留原始值
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            arrays.append(array)
+    return arrays
+
+
+def _concat_arrays(arrays):
+    """ 拼接各块的列数组，各块类型不同（如部分块含NULL而成为Int64）时由pandas统一类型 """
+    if all(isinstance(array, np.ndarray) for array in arrays):
+        return np.concatenate(arrays)
+    return pd.concat([pd.Series(array, copy=False) for array in arrays], ignore_index=True).array
+
+
+_FINGERPRINT_RES = [
+    (re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""), '?'),  # 字符串
+    (re.compile(r"\b0x[0-9a-f]+\b|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE), '?'),  # 数字
+    (re.compile(r'%s'), '?'),  # 参数占位符
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),  # IN列表和单行VALUES
+    (re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+'), '(?+)+'),  # 多行VALUES
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def sql_fingerprint(sql):
+    """
+    语句指纹：字面量和参数替换为?，IN列表和多行VALUES合并，空白合并，转为小写。
+
+    :param sql: sql语句
+    :return: 指纹字符串，不包含任何参数值。
+    """
+    for pattern, replacement in _FINGERPRINT_RES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip().rstrip(';').lower()
+
+
+def _redact_args(args):
+    # 只记录参数的类型，不记录值
+    if isinstance(args, dict):
+        return '{%s}' % ', '.join('%s: <%s>' % (key, type(value).__name__) for key, value in args.items())
+    if isinstance(args, (list, tuple)):
+        if len(args) > 10:
+            return '[%d个参数]' % len(args)
+        return '[%s]' % ', '.join(_redact_args(value) if isinstance(value, (list, tuple)) else
+                                  '<%s>' % type(value).__name__ for value in args)
+    return '<%s>' % type(args).__name__
+
+
+class LatencyHistogram(object):
+    """ 固定分桶的耗时直方图（秒），分位数在桶内线性插值近似 """
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+               float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            if count and cumulative + count >= target:
+                # 在桶内线性插值
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count, 'total': self.total, 'avg': self.avg, 'p50': self.quantile(0.5),
+                'p95': self.quantile(0.95), 'p99': self.quantile(0.99), 'max': self.max}
+
+
+class _FingerprintStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.slow = 0
+        self.phases = defaultdict(LatencyHistogram)
+
+
+class QueryMetrics(object):
+    """
+    按语句指纹统计查询耗时。
+
+    每次查询记录各阶段的耗时：connect（获取连接池、首次使用时建立隧道和连接池、ping检查）、pool_wait（等待连接池分配连接）、
+    execute（执行语句）、fetch（读取结果）和total，以及返回的行数。
+    总耗时超过slow_query_threshold的语句以WARNING级别记录到日志，只记录指纹和参数类型，不记录参数值。
+    hook在每次查询后被调用，可以把数据转发到其他监控系统。
+    """
+
+    PHASES = ('connect', 'pool_wait', 'execute', 'fetch', 'total')
+    OTHER = '<other>'
+
+    def __init__(self, slow_query_threshold=1.0, hook=None, slow_query_logger=None, max_fingerprints=1000):
+        """
+        初始化QueryMetrics对象。
+
+        :param slow_query_threshold: 慢查询阈值（秒），None表示不记录慢查询。
+        :param hook: 可选的回调 hook(event)，event为字典，包含fingerprint、phases（{阶段: 秒}）、rows、error、slow。
+        :param slow_query_logger: 记录慢查询的logger，默认为本模块的logger。
+        :param max_fingerprints: 最多分别统计的指纹数，超出后新的指纹合并统计为'<other>'。
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self.hook = hook
+        self.slow_query_logger = slow_query_logger or logger
+        self.max_fingerprints = max_fingerprints
+        self._stats = {}
+
+    def record(self, sql, args, phases, rows, error=None):
+        """
+        记录一次查询。
+
+        :param sql: sql语句
+        :param args: sql语句的参数
+        :param phases: {阶段: 耗时秒数}
+        :param rows: 返回或影响的行数
+        :param error: 查询出错时的异常
+        """
+        fingerprint = sql_fingerprint(sql)
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                fingerprint = self.OTHER
+            stats = self._stats.setdefault(fingerprint, _FingerprintStats())
+        stats.count += 1
+        stats.rows += rows or 0
+        if error is not None:
+            stats.errors += 1
+        for phase, value in phases.items():
+            stats.phases[phase].observe(value)
+        total = phases.get('total', 0.0)
+        slow = self.slow_query_threshold is not None and total >= self.slow_query_threshold
+        if slow:
+            stats.slow += 1
+            self.slow_query_logger.warning(
+                '慢查询 %.3fs (%s) rows=%s error=%r sql=%s args=%s', total,
+                ' '.join('%s=%.3f' % (phase, phases[phase]) for phase in self.PHASES if phase in phases),
+                rows, error, fingerprint, _redact_args(args))
+        if self.hook is not None:
+            try:
+                self.hook({'fingerprint': fingerprint, 'phases': phases, 'rows': rows, 'error': error, 'slow': slow})
+            except Exception:
+                logger.exception('QueryMetrics hook出错')
+
+    def snapshot(self):
+        """
+        :return: {指纹: {'count', 'errors', 'slow', 'rows', 'phases': {阶段: {count, total, avg, p50, p95, p99, max}}}}
+        """
+        return {fingerprint: {
+            'count': stats.count,
+            'errors': stats.errors,
+            'slow': stats.slow,
+            'rows': stats.rows,
+            'phases': {phase: histogram.as_dict() for phase, histogram in stats.phases.items()},
+        } for fingerprint, stats in self._stats.items()}
+
+    def format_snapshot(self, top=20):
+        """
+        文本格式的统计快照，按总耗时从高到低排列。
+
+        :param top: 最多显示的指纹数。
+        :return: 多行文本。
+        """
+        items = sorted(self._stats.items(), key=lambda item: item[1].phases['total'].total if 'total' in
+                       item[1].phases else 0.0, reverse=True)[:top]
+        lines = ['%8s %6s %5s %10s %9s %9s %9s %9s %9s %9s  %s' % (
+            'count', 'errors', 'slow', 'rows', 'total(s)', 'avg(ms)', 'p95(ms)', 'max(ms)', 'wait(ms)', 'exec(ms)',
+            'fingerprint')]
+        for fingerprint, stats in items:
+            total = stats.phases.get('total') or LatencyHistogram()
+            wait = stats.phases.get('pool_wait') or LatencyHistogram()
+            execute = stats.phases.get('execute') or LatencyHistogram()
+            lines.append('%8d %6d %5d %10d %9.3f %9.2f %9.2f %9.2f %9.2f %9.2f  %s' % (
+                stats.count, stats.errors, stats.slow, stats.rows, total.total, total.avg * 1000,
+                total.quantile(0.95) * 1000, total.max * 1000, wait.avg * 1000, execute.avg * 1000,
+                fingerprint[:200]))
+        return '\n'.join(lines)
+
+    def reset(self):
+        self._stats.clear()
 
 
 class MysqlPool(object):
-    def __init__(self, cursorclass="dict"):
-        self.config = monitor_db
+    def __init__(self, cursorclass="dict", config=None, minsize=1, maxsize=20, pool_recycle=3600,
+                 acquire_timeout=30.0, pre_ping_interval=5.0, cache=None, query_timeout=3600.0, metrics=None):
+        """
+        初始化MysqlPool对象。相同配置的MysqlPool共享同一个连接池，连接池大小以第一个创建连接池的对象为准。
+
+        :param cursorclass: "dict"返回字典，"tuple"返回元组。
+        :param config: 数据库配置，包含host、port、user、password、database，可选ssh（跳板机配置，None表示直连，未指定时使用load_ssh_config()的结果）。
+        :param minsize: 连接池的最小连接数。
+        :param maxsize: 连接池的最大连接数。
+        :param pool_recycle: 空闲超过该秒数的连接在下次获取时重建，-1表示不回收。
+        :param acquire_timeout: 获取连接的超时秒数，超时抛出asyncio.TimeoutError。
+        :param pre_ping_interval: 连接空闲超过该秒数时，使用前先ping检查，断开则重连，重连失败时丢弃该连接重新获取；
+                                  None表示不检查。
+        :param cache: 可选的QueryCache对象，select_mysql和select_mysql_all的结果读穿缓存，save_mysql和批量写入
+                      会使读取过被写入表的条目失效。多个MysqlPool可以共享同一个QueryCache。
+        :param query_timeout: 执行语句的超时秒数，None表示不限制。
+        :param metrics: 可选的QueryMetrics对象，记录每条语句各阶段的耗时和慢查询，多个MysqlPool可以共享。
+        :raises ValueError: 没有指定config。
+        """
+        if config is None:
+            raise ValueError("需要指定数据库配置config")
+        self.config = config
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.pool_recycle = pool_recycle
+        self.acquire_timeout = acquire_timeout
+        self.pre_ping_interval = pre_ping_interval
+        self.cache = cache
+        self.query_timeout = query_timeout
+        self.metrics = metrics
         if cursorclass == "dict":
             self.cursorclass = aiomysql.DictCursor
+            self.ss_cursorclass = aiomysql.SSDictCursor
         elif cursorclass == "tuple":
             self.cursorclass = aiomysql.Cursor
-        # asyncio.ensure_future(self.create_mysql_pool())
+            self.ss_cursorclass = aiomysql.SSCursor
+
+    def acquire(self):
+        """
+        从连接池获取连接，用于async with语句，退出时归还连接。
+
+        :return: 异步上下文管理器，进入时返回aiomysql连接。
+        :raises asyncio.TimeoutError: 获取连接超时。
+        """
+        return _PooledConnection(self)
+
+    async def pool_stats(self):
+        """
+        连接池的统计信息。
+
+        :return: 字典，包含获取次数、超时次数、等待耗时、正在使用的连接数，以及连接池当前大小size和空闲连接数free。
+        """
+        entry = await get_mysql_pool(self.config, self.minsize, self.maxsize, self.pool_recycle)
+        result = entry.stats.as_dict()
+        result['size'] = entry.pool.size
+        result['free'] = entry.pool.freesize
+        return result
+
+    async def close(self):
+        """ 关闭当前事件循环中该配置的连接池 """
+        pools = _pools.get(asyncio.get_event_loop(), {})
+        future = pools.pop(_config_key(self.config), None)
+        if future is not None and future.done() and not future.cancelled() and future.exception() is None:
+            pool = future.result().pool
+            pool.close()
+            await pool.wait_closed()
 
     async def save_mysql(self, sql, args=[], is_get_rowcount=False):
         """
@@ -108,53 +1312,315 @@ class MysqlPool(object):
         :param sql: 执行sql语句
         :param args: 添加的sql语句的参数 list[tuple]
         """
-        conn = await get_mysql_connection()
-        async with conn.cursor(self.cursorclass) as cursor:  # 指定游标类为aiomysql.DictCursor
-            new_id = None
-            if len(args) > 0:
-                await asyncio.wait_for(cursor.execute(sql, args), timeout=3600.0)  # 设置SQL执行超时为5秒
-            else:
-                await asyncio.wait_for(cursor.execute(sql), timeout=3600.0)  # 设置SQL执行超时为5秒
+        async def fetch(cursor):
             rowcount = cursor.rowcount
-            if rowcount > 0:
-                new_id = cursor.lastrowid  # 获取新插入行的ID
             if is_get_rowcount:
-                return rowcount
-            conn.close()
-            return new_id
+                return rowcount, rowcount
+            # 获取新插入行的ID
+            return (cursor.lastrowid if rowcount > 0 else None), rowcount
+
+        try:
+            return await self._execute(sql, args, fetch)
+        finally:
+            # 执行出错时也可能已经部分写入
+            if self.cache is not None:
+                self.cache.invalidate(_write_tables(sql))
 
     async def select_mysql(self, sql, args=[]):
-        conn = await get_mysql_connection()
-        async with conn.cursor(self.cursorclass) as cursor:  # 指定游标类为aiomysql.DictCursor
-            if len(args) > 0:
-                await asyncio.wait_for(cursor.execute(sql, args), timeout=3600.0)  # 设置SQL执行超时为5秒
-            else:
-                await asyncio.wait_for(cursor.execute(sql), timeout=3600.0)  # 设置SQL执行超时为5秒
-            result = await cursor.fetchone()
-            conn.close()
-            return result
+        return await self._cached_select('one', sql, args, self._select_mysql)
 
     async def select_mysql_all(self, sql, args=[]):
-        conn = await get_mysql_connection()
-        async with conn.cursor(self.cursorclass) as cursor:  # 指定游标类为aiomysql.DictCursor
-            if len(args) > 0:
-                await asyncio.wait_for(cursor.execute(sql, args), timeout=3600.0)  # 设置SQL执行超时为5秒
-            else:
-                await asyncio.wait_for(cursor.execute(sql), timeout=3600.0)  # 设置SQL执行超时为5秒
+        return await self._cached_select('all', sql, args, self._select_mysql_all)
+
+    async def cache_stats(self):
+        """ :return: 查询缓存的统计信息，未启用缓存时返回None，参见QueryCache.stats """
+        return self.cache.stats() if self.cache is not None else None
+
+    async def _cached_select(self, kind, sql, args, select):
+        tables = _read_tables(sql) if self.cache is not None else None
+        if tables is None:
+            return await select(sql, args)
+        key = (_config_key(self.config), kind, self.cursorclass.__name__, _normalize_sql(sql), repr(args))
+        return await self.cache.get_or_load(key, tables, lambda: select(sql, args))
+
+    async def _select_mysql(self, sql, args):
+        async def fetch(cursor):
+            result = await cursor.fetchone()
+            return result, 0 if result is None else 1
+
+        return await self._execute(sql, args, fetch)
+
+    async def _select_mysql_all(self, sql, args):
+        async def fetch(cursor):
             result = await cursor.fetchall()
-            conn.close()
-            return result
-
-    async def select_mysql_all_yield(self, sql, args=[], batch_size=10):
-        conn = await get_mysql_connection()
-        async with conn.cursor(self.cursorclass) as cursor:  # 指定游标类为aiomysql.DictCursor
-            if len(args) > 0:
-                await asyncio.wait_for(cursor.execute(sql, args), timeout=3600.0)  # 设置SQL执行超时为5秒
-            else:
-                await asyncio.wait_for(cursor.execute(sql), timeout=3600.0)  # 设置SQL执行超时为5秒
-            while True:
-                result = await cursor.fetchmany(batch_size)
-                if not result or len(result) < 1:
-                    conn.close()
-                    raise StopAsyncIteration
-                yield result
+            return result, len(result)
+
+        return await self._execute(sql, args, fetch)
+
+    async def _execute(self, sql, args, fetch, cursorclass=None):
+        """
+        从连接池获取连接执行语句，记录各阶段耗时。
+
+        :param fetch: 协程函数 fetch(cursor)，返回(结果, 行数)。
+        :return: fetch返回的结果。
+        """
+        start = time.perf_counter()
+        phases = {}
+        rows = 0
+        error = None
+        acquire = self.acquire()
+        try:
+            async with acquire as conn:
+                phases['connect'] = acquire.connect_time
+                phases['pool_wait'] = acquire.wait_time
+                async with conn.cursor(cursorclass or self.cursorclass) as cursor:
+                    execute_start = time.perf_counter()
+                    if len(args) > 0:
+                        await asyncio.wait_for(cursor.execute(sql, args), timeout=self.query_timeout)
+                    else:
+                        await asyncio.wait_for(cursor.execute(sql), timeout=self.query_timeout)
+                    fetch_start = time.perf_counter()
+                    phases['execute'] = fetch_start - execute_start
+                    result, rows = await fetch(cursor)
+                    phases['fetch'] = time.perf_counter() - fetch_start
+                    return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if self.metrics is not None:
+                phases['total'] = time.perf_counter() - start
+                self.metrics.record(sql, args, phases, rows, error)
+
+    def metrics_text(self, top=20):
+        """ :return: 文本格式的查询耗时统计，未启用metrics时返回空字符串，参见QueryMetrics.format_snapshot """
+        return self.metrics.format_snapshot(top) if self.metrics is not None else ''
+
+    async def select_mysql_all_yield(self, sql, args=[], batch_size=1000, stream=False):
+        """
+        分批读取查询结果。
+
+        :param sql: 查询语句
+        :param args: sql语句的参数
+        :param batch_size: 每批的行数
+        :param stream: 为False时使用普通游标，整个结果集先读入客户端内存再分批返回；
+                       为True时使用服务器端游标边读边返回，内存占用与结果集大小无关，参见select_mysql_stream
+        :yield: 行列表
+        """
+        if stream:
+            async with self.select_mysql_stream(sql, args, batch_size) as batches:
+                async for batch in batches:
+                    yield batch
+            return
+        # 普通游标执行后整个结果集已在客户端内存中，直接分批返回
+        result = await self._select_mysql_all(sql, args)
+        for i in range(0, len(result), batch_size):
+            yield result[i:i + batch_size]
+
+    def select_mysql_stream(self, sql, args=[], batch_size=1000):
+        """
+        使用服务器端游标流式读取查询结果，适合读取上亿行的大表。
+
+        :param sql: 查询语句
+        :param args: sql语句的参数
+        :param batch_size: 每批的行数
+        :return: MysqlStream对象，用于async with和async for，每次迭代返回一批行。
+        """
+        return MysqlStream(self, sql, args, batch_size)
+
+    async def bulk_insert(self, table, columns, rows, max_batch_rows=5000, max_batch_bytes=4 * 1024 * 1024,
+                          concurrency=4, ignore=False):
+        """
+        批量插入。行被拼接成多行INSERT语句，每批不超过max_batch_rows行、max_batch_bytes字节和服务器的max_allowed_packet，
+        多个批次在concurrency个连接上并行执行。每批单独提交，出错时已执行的批次不会回滚。
+
+        :param table: 表名。
+        :param columns: 列名列表。
+        :param rows: 行的可迭代对象，每行是与columns对应的序列，可以是生成器。
+        :param max_batch_rows: 每批的最大行数。
+        :param max_batch_bytes: 每批SQL语句的最大字节数。
+        :param concurrency: 并行执行的连接数。
+        :param ignore: 为True时使用INSERT IGNORE，忽略主键冲突的行。
+        :return: BulkResult对象，包含每批的影响行数。
+        :raises ValueError: 单行数据超过每批的字节上限。
+        """
+        prefix = 'INSERT %sINTO %s (%s) VALUES ' % ('IGNORE ' if ignore else '', _quote_name(table),
+                                                    ','.join(_quote_name(c) for c in columns))
+        return await self._bulk_execute(prefix, '', rows, max_batch_rows, max_batch_bytes, concurrency)
+
+    async def bulk_upsert(self, table, columns, rows, update_columns=None, max_batch_rows=5000,
+                          max_batch_bytes=4 * 1024 * 1024, concurrency=4):
+        """
+        批量插入或更新（INSERT ... ON DUPLICATE KEY UPDATE），分批方式同bulk_insert。
+        影响行数按MySQL的规则计算：新插入的行计1，被更新的行计2，值未变化的行计0。
+
+        :param table: 表名。
+        :param columns: 列名列表。
+        :param rows: 行的可迭代对象，每行是与columns对应的序列，可以是生成器。
+        :param update_columns: 主键冲突时更新的列，默认为columns中的全部列。
+        :param max_batch_rows: 每批的最大行数。
+        :param max_batch_bytes: 每批SQL语句的最大字节数。
+        :param concurrency: 并行执行的连接数。
+        :return: BulkResult对象，包含每批的影响行数。
+        :raises ValueError: 单行数据超过每批的字节上限。
+        """
+        update_columns = columns if update_columns is None else update_columns
+        prefix = 'INSERT INTO %s (%s) VALUES ' % (_quote_name(table), ','.join(_quote_name(c) for c in columns))
+        suffix = ' ON DUPLICATE KEY UPDATE ' + ','.join(
+            '%s=VALUES(%s)' % (_quote_name(c), _quote_name(c)) for c in update_columns)
+        return await self._bulk_execute(prefix, suffix, rows, max_batch_rows, max_batch_bytes, concurrency)
+
+    async def _get_max_allowed_packet(self):
+        entry = await get_mysql_pool(self.config, self.minsize, self.maxsize, self.pool_recycle)
+        if entry.max_allowed_packet is None:
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute('SELECT @@max_allowed_packet')
+                    entry.max_allowed_packet = int((await cursor.fetchone())[0])
+        return entry.max_allowed_packet
+
+    async def _bulk_execute(self, prefix, suffix, rows, max_batch_rows, max_batch_bytes, concurrency):
+        try:
+            return await self._bulk_execute_batches(prefix, suffix, rows, max_batch_rows, max_batch_bytes,
+                                                    concurrency)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(_write_tables(prefix))
+
+    async def _bulk_execute_batches(self, prefix, suffix, rows, max_batch_rows, max_batch_bytes, concurrency):
+        result = BulkResult()
+        start = time.perf_counter()
+        # 留出协议包头等开销
+        max_bytes = min(max_batch_bytes, await self._get_max_allowed_packet() - 1024)
+        queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def worker():
+            async with self.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    while True:
+                        item = await queue.get()
+                        if item is None:
+                            return
+                        index, sql, count = item
+                        execute_start = time.perf_counter()
+                        error = None
+                        try:
+                            await asyncio.wait_for(cursor.execute(sql), timeout=self.query_timeout)
+                        except BaseException as e:
+                            error = e
+                            raise
+                        finally:
+                            if self.metrics is not None:
+                                elapsed = time.perf_counter() - execute_start
+                                # 不把整条多行语句传给指纹计算
+                                self.metrics.record(prefix + '(%s)' + suffix, [],
+                                                    {'execute': elapsed, 'total': elapsed}, count, error)
+                        rowcount = cursor.rowcount
+                        result.rowcount += rowcount
+                        result.rows += count
+                        result.batches.append((index, count, rowcount))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            for index, (sql, count) in enumerate(_iter_insert_batches(prefix, suffix, rows, max_bytes,
+                                                                      max_batch_rows)):
+                # 队列满时等待，同时检查是否有连接出错
+                put = asyncio.ensure_future(queue.put((index, sql, count)))
+                await asyncio.wait([put] + workers, return_when=asyncio.FIRST_COMPLETED)
+                # 发送结束标记前worker只会因出错而结束
+                failed = [future for future in workers if future.done()]
+                if failed:
+                    put.cancel()
+                    failed[0].result()
+                    raise RuntimeError("批量写入的连接意外退出")
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except BaseException:
+            await _cancel_tasks(workers)
+            raise
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def select_arrays(self, sql, args=[], chunk_size=100000, decimal_as_float=True):
+        """
+        按列读取查询结果，不为每行创建字典。使用服务器端游标分块读取元组行，每块直接转换为列数组后丢弃，
+        列的类型由游标description决定：整数为int64（实际含NULL时为pandas的Int64，NULL为pd.NA），浮点数为float64，
+        日期时间为datetime64[us]，时间为timedelta64[us]，其他为object。
+
+        :param sql: 查询语句
+        :param args: sql语句的参数
+        :param chunk_size: 每次读取的行数
+        :param decimal_as_float: 为True时DECIMAL列转换为float64，否则保留Decimal对象
+        :return: 有序字典 {列名: numpy数组}
+        """
+        names = None
+        chunks = []
+        async for names, arrays in self._iter_column_chunks(sql, args, chunk_size, decimal_as_float):
+            chunks.append(arrays)
+        if len(chunks) == 1:
+            return OrderedDict(zip(names, chunks[0]))
+        return OrderedDict((name, _concat_arrays([chunk[i] for chunk in chunks]))
+                           for i, name in enumerate(names or []))
+
+    async def select_frame(self, sql, args=[], chunk_size=100000, decimal_as_float=True):
+        """
+        读取查询结果为DataFrame，列的类型同select_arrays。
+
+        :param sql: 查询语句
+        :param args: sql语句的参数
+        :param chunk_size: 每次读取的行数
+        :param decimal_as_float: 为True时DECIMAL列转换为float64，否则保留Decimal对象
+        :return: DataFrame
+        """
+        return pd.DataFrame(await self.select_arrays(sql, args, chunk_size, decimal_as_float), copy=False)
+
+    async def select_frame_chunks(self, sql, args=[], chunk_size=100000, decimal_as_float=True):
+        """
+        流式读取查询结果，每块产出一个DataFrame，内存占用与结果集大小无关，列的类型同select_arrays。
+        提前结束时连接被关闭，参见MysqlStream。
+
+        :param sql: 查询语句
+        :param args: sql语句的参数
+        :param chunk_size: 每块的行数
+        :param decimal_as_float: 为True时DECIMAL列转换为float64，否则保留Decimal对象
+        :yield: DataFrame
+        """
+        async for names, arrays in self._iter_column_chunks(sql, args, chunk_size, decimal_as_float):
+            yield pd.DataFrame(OrderedDict(zip(names, arrays)), copy=False)
+
+    async def _iter_column_chunks(self, sql, args, chunk_size, decimal_as_float):
+        async with MysqlStream(self, sql, args, chunk_size, aiomysql.SSCursor) as stream:
+            empty = True
+            async for rows in stream:
+                empty = False
+                names, dtypes = self._column_types(stream.description, decimal_as_float)
+                yield names, _rows_to_arrays(rows, dtypes)
+            if empty and stream.description is not None:
+                # 空结果也返回带类型的列
+                names, dtypes = self._column_types(stream.description, decimal_as_float)
+                yield names, _rows_to_arrays([], dtypes)
+
+    @staticmethod
+    def _column_types(description, decimal_as_float):
+        names = [column[0] for column in description]
+        dtypes = [_column_dtype(column[1], decimal_as_float) for column in description]
+        return names, dtypes
+
+    def scan_table(self, table, key, **kwargs):
+        """
+        按主键区间并行扫描整张表，参见KeysetScanner。
+
+        用法::
+
+            scanner = pool.scan_table('orders', 'id', batch_size=5000, concurrency=4)
+            async for batch in scanner.scan():
+                ...
+            save(scanner.checkpoint())
+
+        :param table: 表名。
+        :param key: 主键列名。
+        :param kwargs: 传给KeysetScanner的参数，如columns、where、args、batch_size、concurrency、ordered、split、checkpoint。
+        :return: KeysetScanner对象。
+        """
+        return KeysetScanner(self, table, key, **kwargs)
@@ -0,0 +1,195 @@
+import fnmatch
+import os
+import re
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+# 扫描结果每条记录的字段，与FileUtils.get_file_info的字段一致，另外附带inode和权限位
+RECORD_FIELDS = ('name', 'path', 'size', 'created_time', 'modified_time', 'inode', 'mode')
+
+RECORD_DTYPE = np.dtype([
+    ('name', object),
+    ('path', object),
+    ('size', np.int64),
+    ('created_time', np.float64),
+    ('modified_time', np.float64),
+    ('inode', np.uint64),
+    ('mode', np.uint32),
+])
+
+
+def _translate_path_glob(pattern):
+    """ 把路径glob转换为正则，'*'和'?'不跨越'/'，'**/'匹配任意层目录。 """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        else:
+            end = pattern.find(']', i + 1) if pattern[i] == '[' else -1
+            if end > 0:
+                # 字符集沿用fnmatch的转换规则
+                parts.append(fnmatch.translate(pattern[i:end + 1])[4:-3])
+                i = end + 1
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+    return '(?:%s)' % ''.join(parts)
+
+
+def _compile_patterns(patterns):
+    """
+    编译glob模式。不含'/'的模式匹配文件名，含'/'的模式匹配相对根目录的路径。
+
+    :return: (文件名正则, 相对路径正则)，没有对应模式时为None。
+    """
+    if not patterns:
+        return None, None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    name_patterns = [fnmatch.translate(p) for p in patterns if '/' not in p]
+    path_patterns = [_translate_path_glob(p) for p in patterns if '/' in p]
+    name_re = re.compile('|'.join(name_patterns)) if name_patterns else None
+    path_re = re.compile('(?s:%s)\\Z' % '|'.join(path_patterns)) if path_patterns else None
+    return name_re, path_re
+
+
+def _matches(patterns, name, rel_path):
+    name_re, path_re = patterns
+    return (name_re is not None and name_re.match(name) is not None) or \
+           (path_re is not None and path_re.match(rel_path) is not None)
+
+
+class _ScanFilter(object):
+
+    def __init__(self, include, exclude):
+        self.include = _compile_patterns(include)
+        self.exclude = _compile_patterns(exclude)
+        self.has_include = self.include != (None, None)
+        self.has_exclude = self.exclude != (None, None)
+
+    def accept_dir(self, name, rel_path):
+        # 被排除的目录整棵子树都不再扫描
+        return not (self.has_exclude and _matches(self.exclude, name, rel_path))
+
+    def accept_file(self, name, rel_path):
+        if self.has_exclude and _matches(self.exclude, name, rel_path):
+            return False
+        return not self.has_include or _matches(self.include, name, rel_path)
+
+
+def _scan_dir(directory, rel_dir, scan_filter, follow_symlinks, onerror):
+    """
+    扫描单个目录（不递归）。
+
+    :return: (文件记录列表, [(子目录路径, 子目录相对路径), ...])
+    """
+    records = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                name = entry.name
+                rel_path = rel_dir + name if rel_dir else name
+                try:
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        if scan_filter.accept_dir(name, rel_path):
+                            subdirs.append((entry.path, rel_path + '/'))
+                        continue
+                    if not entry.is_file(follow_symlinks=follow_symlinks) or \
+                            not scan_filter.accept_file(name, rel_path):
+                        continue
+                    # Linux上scandir不返回完整stat，这里每个文件只调用一次stat
+                    st = entry.stat(follow_symlinks=follow_symlinks)
+                except OSError as e:
+                    if onerror is not None:
+                        onerror(e)
+                    continue
+                records.append((name, entry.path, st.st_size, st.st_ctime, st.st_mtime, st.st_ino, st.st_mode))
+    except OSError as e:
+        if onerror is not None:
+            onerror(e)
+    return records, subdirs
+
+
+def scan_tree(root, include=None, exclude=None, max_workers=8, batch_size=10000, follow_symlinks=False,
+              onerror=None):
+    """
+    并行扫描目录树，按批返回文件的元数据。
+
+    每个目录由线程池中的一个任务用os.scandir扫描，子目录作为新任务提交，多个子树同时扫描；
+    文件信息直接取自scandir的目录项，每个文件只有一次stat调用，不再单独调用isfile、abspath。
+
+    :param root: 根目录。
+    :param include: 包含的glob模式或模式列表，如 ['*.csv', 'data/**/2024-*']；不含'/'的模式匹配文件名，
+                    含'/'的模式匹配相对根目录的路径（以'/'分隔，'*'不跨越目录，'**/'匹配任意层目录）。
+                    默认包含全部文件。
+    :param exclude: 排除的glob模式或模式列表，匹配的文件和目录（含整棵子树）都会被跳过。
+    :param max_workers: 扫描目录的线程数。
+    :param batch_size: 每批记录的最大条数。
+    :param follow_symlinks: 是否跟随符号链接。
+    :param onerror: 可选的错误回调 onerror(OSError)，默认忽略无法访问的目录和文件（同os.walk）。
+    :yield: 记录列表，每条记录是按RECORD_FIELDS顺序排列的元组，path为绝对路径。
+    :raises FileNotFoundError: 根目录不存在。
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError("目录不存在")
+    root = os.path.abspath(root)
+    scan_filter = _ScanFilter(include, exclude)
+    batch = []
+    pending_dirs = deque([(root, '')])
+    running = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending_dirs or running:
+            # 限制在途任务数量，目录很多时不会堆积大量future
+            while pending_dirs and len(running) < max_workers * 4:
+                directory, rel_dir = pending_dirs.popleft()
+                running.add(executor.submit(_scan_dir, directory, rel_dir, scan_filter, follow_symlinks, onerror))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                records, subdirs = future.result()
+                pending_dirs.extend(subdirs)
+                batch.extend(records)
+                while len(batch) >= batch_size:
+                    yield batch[:batch_size]
+                    batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def scan_to_frame(root, **kwargs):
+    """
+    扫描目录树并返回DataFrame，列为RECORD_FIELDS。
+
+    :param root: 根目录。
+    :param kwargs: 传给scan_tree的参数。
+    :return: DataFrame，每行一个文件。
+    """
+    return pd.DataFrame.from_records(scan_to_array(root, **kwargs))
+
+
+def scan_to_array(root, **kwargs):
+    """
+    扫描目录树并返回NumPy结构化数组，dtype为RECORD_DTYPE。
+
+    :param root: 根目录。
+    :param kwargs: 传给scan_tree的参数。
+    :return: 结构化数组，每个元素一个文件。
+    """
+    chunks = [np.array(batch, dtype=RECORD_DTYPE) for batch in scan_tree(root, **kwargs)]
+    if not chunks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.concatenate(chunks)
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import threading
+import time
+
+import pandas as pd
+
+from common_utils.async_file_utils import AsyncCsvFileUtils, AsyncExcelUtils, AsyncFileFollower
+from common_utils.file_utils import CsvFileUtils
+
+
+def test_async_excel_read_sheet_by_chunk(tmp_path):
+    file_path = str(tmp_path / 'chunk.xlsx')
+    df = pd.DataFrame({'id': range(1200), 'value': [i * 0.5 for i in range(1200)]})
+    df.to_excel(file_path, index=False)
+
+    async def read_chunks():
+        excel = AsyncExcelUtils(file_path)
+        return [chunk async for chunk in excel.read_sheet_by_chunk(chunk_size=500)]
+
+    chunks = asyncio.run(read_chunks())
+    assert [len(chunk) for chunk in chunks] == [500, 500, 200]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+
+
+def test_async_file_follower(tmp_path):
+    file_path = str(tmp_path / 'app.log')
+    with open(file_path, 'w') as f:
+        f.write('1\n2\n')
+
+    async def follow():
+        batches = []
+        follower = AsyncFileFollower(file_path, batch_size=10, min_interval=0.01, max_interval=0.05)
+        async for batch in follower.follow(timeout=0.5):
+            batches.append(batch)
+            if len(batches) == 1:
+                # 读取过程中文件继续增长
+                with open(file_path, 'a') as f:
+                    f.write('3\n')
+        return batches
+
+    assert asyncio.run(follow()) == [['1', '2'], ['3']]
+    assert os.path.exists(file_path + '.offset')
+    assert asyncio.run(follow()) == []
+
+
+def test_async_csv_read_batches(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    rows = [['id', 'comment']] + [[str(i), 'a,"b"\nc' if i % 3 == 0 else 'plain'] for i in range(25)]
+    CsvFileUtils(file_path).write_csv(rows[1:], header=rows[0])
+
+    async def read():
+        csv_utils = AsyncCsvFileUtils(file_path, block_size=64, batch_size=10)
+        batches = [batch async for batch in csv_utils.read_csv_batches()]
+        no_header = [row async for row in csv_utils.read_csv_generator(header=False)]
+        return batches, no_header, await csv_utils.read_csv(header=True)
+
+    batches, no_header, data = asyncio.run(read())
+    assert [len(batch) for batch in batches] == [10, 10, 6]
+    assert [row for batch in batches for row in batch] == rows
+    assert no_header == rows
+    assert data == rows[1:]
+
+
+def test_async_csv_generator_header_false(tmp_path):
+    file_path = str(tmp_path / 'data.csv')
+    with open(file_path, 'w') as f:
+        f.write('a,b\n1,2\n3,4')
+
+    async def read():
+        csv_utils = AsyncCsvFileUtils(file_path)
+        return [row async for row in csv_utils.read_csv_generator(header=False)]
+
+    expected = [['a', 'b'], ['1', '2'], ['3', '4']]
+    assert asyncio.run(read()) == expected
+    assert list(CsvFileUtils(file_path).read_csv_generator(header=False)) == expected
+
+
+def test_async_csv_append_queue(tmp_path):
+    file_path = str(tmp_path / 'append.csv')
+
+    async def append():
+        async with AsyncCsvFileUtils(file_path, queue_size=50, max_batch_rows=200) as csv_utils:
+            await csv_utils.write_csv([], header=['worker', 'seq'])
+
+            async def worker(n):
+                for i in range(100):
+                    await csv_utils.append_to_csv([n, 'a,"b"' if i % 10 == 0 else i])
+
+            await asyncio.gather(*[worker(n) for n in range(20)])
+            await csv_utils.flush()
+            metrics = csv_utils.append_metrics()
+            rows = await csv_utils.read_csv(header=True)
+        return metrics, rows, csv_utils.append_metrics()
+
+    metrics, rows, closed_metrics = asyncio.run(append())
+    assert len(rows) == 2000 and rows.count(['3', 'a,"b"']) == 10
+    assert metrics['rows_written'] == 2000 and metrics['queue_depth'] == 0
+    assert metrics['max_queue_depth'] <= 50
+    # 并发追加的行被合并成批写入
+    assert metrics['flush_count'] < 2000 and metrics['max_batch_size'] > 1
+    assert closed_metrics is None
+
+
+def test_async_csv_append_durable_and_per_format(tmp_path):
+    file_path = str(tmp_path / 'append.csv')
+
+    async def append():
+        comma = AsyncCsvFileUtils(file_path)
+        semicolon = AsyncCsvFileUtils(file_path, delimiter=';')
+        # 默认等到写入文件后才返回，不调用flush也能读到
+        await comma.append_to_csv(['a', 1])
+        with open(file_path) as f:
+            written = f.read()
+        await semicolon.append_to_csv(['b', 2])
+        await semicolon.append_to_csv(['c', 3], wait=False)
+        await comma.aclose()
+        await semicolon.aclose()
+        return written
+
+    assert asyncio.run(append()) == 'a,1\n'
+    with open(file_path) as f:
+        assert f.read() == 'a,1\nb;2\nc;3\n'
+
+
+def test_async_excel_process_mode(tmp_path):
+    file_path = str(tmp_path / 'process.xlsx')
+    df = pd.DataFrame({'id': range(100), 'name': ['n%d' % i for i in range(100)]})
+
+    async def run():
+        async with AsyncExcelUtils(file_path, mode='process') as excel:
+            await excel.write_sheet(df, sheet_name='data')
+            await excel.append_data(pd.DataFrame({'id': [100], 'name': ['n100']}), sheet_name='data')
+            return await excel.get_sheet_names(), await excel.read_sheet('data')
+
+    try:
+        names, result = asyncio.run(run())
+    finally:
+        AsyncExcelUtils.shutdown()
+    assert names == ['data']
+    assert len(result) == 101 and result['name'].iloc[-1] == 'n100'
+
+
+def test_async_excel_concurrency_limit():
+    state = {'running': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.02)
+        with lock:
+            state['running'] -= 1
+
+    async def run():
+        excels = [AsyncExcelUtils('unused.xlsx') for _ in range(4)]
+        await asyncio.gather(*[excel.run_in_executor(work) for excel in excels for _ in range(3)])
+        await excels[0].aclose()
+        try:
+            await excels[0].run_in_executor(work)
+        except ValueError:
+            return True
+        return False
+
+    max_concurrency = AsyncExcelUtils.max_concurrency
+    AsyncExcelUtils.configure(max_concurrency=2)
+    try:
+        assert asyncio.run(run())
+    finally:
+        AsyncExcelUtils.configure(max_concurrency=max_concurrency)
+    assert state['peak'] == 2
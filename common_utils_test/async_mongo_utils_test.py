@@ -0,0 +1,159 @@
+import asyncio
+
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from common_utils.async_mongo_utils import AsyncProductionMongoClient
+
+
+class _Stats(object):
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.max_tasks = 0  # 写入时事件循环中的最大任务数
+        self.fetches = []
+        self.closed = 0
+
+
+class _FakeCursor(object):
+
+    def __init__(self, documents, stats):
+        self.documents = list(documents)
+        self.stats = stats
+        self.size = None
+
+    def batch_size(self, size):
+        self.size = size
+
+    async def to_list(self, length=None):
+        self.stats.fetches.append(length)
+        batch, self.documents = self.documents[:length], self.documents[length:]
+        return batch
+
+    async def close(self):
+        self.stats.closed += 1
+
+
+class _InsertResult(object):
+
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _BulkResult(object):
+
+    def __init__(self, bulk_api_result):
+        self.bulk_api_result = bulk_api_result
+
+
+class _FakeCollection(object):
+    """ 进程内的异步集合替身，只实现测试用到的方法 """
+
+    def __init__(self, stats):
+        self.documents = []
+        self.stats = stats
+
+    async def insert_one(self, document):
+        self.stats.active += 1
+        self.stats.max_active = max(self.stats.max_active, self.stats.active)
+        await asyncio.sleep(0.001)
+        self.stats.active -= 1
+        self.documents.append(document)
+        return _InsertResult(document['_id'])
+
+    def find(self, query):
+        return _FakeCursor([d for d in self.documents if all(d.get(k) == v for k, v in query.items())], self.stats)
+
+    async def bulk_write(self, ops, ordered=True):
+        self.stats.active += 1
+        self.stats.max_active = max(self.stats.max_active, self.stats.active)
+        self.stats.max_tasks = max(self.stats.max_tasks, len(asyncio.all_tasks()))
+        await asyncio.sleep(0.001)
+        self.stats.active -= 1
+        if any(op._doc.get('fail') for op in ops):
+            raise AutoReconnect('connection closed')
+        result = {'nInserted': 0, 'writeErrors': []}
+        for i, op in enumerate(ops):
+            if any(d['_id'] == op._doc['_id'] for d in self.documents):
+                result['writeErrors'].append({'index': i, 'code': 11000, 'errmsg': 'duplicate key'})
+            else:
+                self.documents.append(op._doc)
+                result['nInserted'] += 1
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return _BulkResult(result)
+
+
+class _FakeClient(object):
+
+    def __init__(self):
+        self.stats = _Stats()
+        self.collections = {}
+
+    def __getitem__(self, name):
+        # 数据库和集合都通过下标访问
+        if name == 'db':
+            return self
+        if name not in self.collections:
+            self.collections[name] = _FakeCollection(self.stats)
+        return self.collections[name]
+
+
+def test_concurrency_and_batched_cursor():
+    fake = _FakeClient()
+
+    async def run():
+        client = AsyncProductionMongoClient('db', client=fake, max_concurrency=3, batch_size=4)
+        ids = await asyncio.gather(*[client.insert_one('users', {'_id': i, 'even': i % 2 == 0}) for i in range(20)])
+        assert ids == list(range(20))
+
+        batches = [batch async for batch in client.find('users', {'even': True}).batches()]
+        documents = [doc async for doc in client.find('users', {})]
+        cursor = client.find('users', {}, batch_size=6)
+        first = await cursor.to_list(5)
+        rest = await cursor.to_list()
+        await cursor.close()
+        return batches, documents, first, rest
+
+    batches, documents, first, rest = asyncio.run(run())
+    assert fake.stats.max_active == 3
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [doc['_id'] for doc in documents] == list(range(20))
+    assert [doc['_id'] for doc in first] == list(range(5)) and len(rest) == 15
+    assert fake.stats.closed == 3
+
+
+def test_bulk_write_summary():
+    fake = _FakeClient()
+
+    async def run():
+        client = AsyncProductionMongoClient('db', client=fake)
+        await client.insert_one('users', {'_id': 7})
+        return await client.bulk_write('users', [InsertOne({'_id': i}) for i in range(10)], batch_size=3)
+
+    summary = asyncio.run(run())
+    assert summary.inserted_count == 9 and summary.batches == 4
+    assert [(error['index'], error['code']) for error in summary.errors] == [(7, 11000)]
+    # 批数少于max_concurrency时只启动与批数相同的任务
+    assert fake.stats.max_tasks <= 1 + 4
+
+
+def test_bulk_write_failed_batches():
+    fake = _FakeClient()
+
+    async def run(ordered):
+        client = AsyncProductionMongoClient('db', client=fake, max_concurrency=2)
+        operations = (InsertOne({'_id': (ordered, i), 'fail': i == 4}) for i in range(10))
+        return await client.bulk_write('users', operations, ordered=ordered, batch_size=3)
+
+    summary = asyncio.run(run(False))
+    # 整批失败的批记录在failed_batches中，其他批照常写入，同时写入的批数不超过max_concurrency
+    assert summary.inserted_count == 7 and summary.batches == 3
+    assert [(batch['index'], len(batch['ops']), type(batch['error'])) for batch in summary.failed_batches] == \
+        [(3, 3, AutoReconnect)]
+    assert fake.stats.max_active == 2
+
+    # 按顺序执行时失败后不再写入后续批次
+    summary = asyncio.run(run(True))
+    assert summary.inserted_count == 3 and [batch['index'] for batch in summary.failed_batches] == [3]
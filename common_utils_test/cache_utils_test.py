@@ -0,0 +1,66 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from common_utils.cache_utils import ColumnarCache
+from common_utils.file_utils import CsvFileUtils, ExcelUtils
+
+
+def test_cache_roundtrip(tmp_path):
+    cache = ColumnarCache(str(tmp_path / 'cache'))
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['a', None, 'c'],
+        'time': pd.to_datetime(['2024-01-01', None, '2024-03-01']),
+        'kind': pd.Categorical(['x', 'y', 'x']),
+        0: [1.5, np.nan, 3.5],
+    }, index=[10, 20, 30])
+    cache.put('key', df)
+    cached = cache.get('key')
+    pd.testing.assert_frame_equal(cached, df)
+    # 修改读取结果不影响缓存
+    cached.loc[10, 'id'] = 100
+    assert cache.get('key').loc[10, 'id'] == 1
+    assert cache.get('missing') is None
+    assert cache.hits == 2 and cache.misses == 1
+
+
+def test_cache_excel_and_csv(tmp_path):
+    cache = ColumnarCache(str(tmp_path / 'cache'))
+    file_path = str(tmp_path / 'data.xlsx')
+    pd.DataFrame({'id': range(100), 'value': [i * 0.5 for i in range(100)]}).to_excel(file_path, index=False)
+    excel = ExcelUtils(file_path)
+    first = excel.read_sheet(cache=cache)
+    pd.testing.assert_frame_equal(excel.read_sheet(cache=cache), first)
+    assert cache.misses == 1 and cache.hits == 1
+
+    # 源文件变化后重新解析
+    time.sleep(0.01)
+    pd.DataFrame({'id': [1], 'value': [2.0]}).to_excel(file_path, index=False)
+    assert len(excel.read_sheet(cache=cache)) == 1 and cache.misses == 2
+
+    csv_path = str(tmp_path / 'data.csv')
+    CsvFileUtils(csv_path).write_csv([[i, i * 2] for i in range(10)], header=['a', 'b'])
+    csv_utils = CsvFileUtils(csv_path)
+    assert csv_utils.read_csv_columns(usecols=['b'], cache=cache)['b'].sum() == 90
+    # 读取参数不同时使用不同的缓存项
+    assert list(csv_utils.read_csv_columns(usecols=['a'], cache=cache, as_frame=False)) == ['a']
+    assert csv_utils.read_csv_columns(usecols=['b'], cache=cache)['b'].sum() == 90
+    assert cache.misses == 4 and cache.hits == 2
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = ColumnarCache(str(tmp_path / 'cache'), max_bytes=0)
+    df = pd.DataFrame({'a': np.arange(1000)})
+    cache.put('old', df)
+    cache.max_bytes = int(cache.total_bytes() * 2.5)
+    time.sleep(0.01)
+    cache.put('middle', df)
+    time.sleep(0.01)
+    cache.get('old')  # 访问后'old'变为最近使用
+    time.sleep(0.01)
+    cache.put('new', df)
+    assert sorted(name for name in os.listdir(cache.cache_dir)) == ['new', 'old']
+    assert cache.evictions == 1
@@ -0,0 +1,61 @@
+import gzip
+import os
+
+import pytest
+
+from common_utils.compress_utils import open_file, resolve_codec
+from common_utils.file_utils import CsvFileUtils, FileUtils
+
+
+def test_resolve_codec():
+    assert resolve_codec('a/b.csv.gz') == 'gzip'
+    assert resolve_codec('b.ZST') == 'zstd'
+    assert resolve_codec('b.csv') is None
+    assert resolve_codec('b.csv', codec='xz') == 'xz'
+    assert resolve_codec('b.gz', codec=None) is None
+
+
+def test_file_utils_compressed(tmp_path):
+    for ext in ('gz', 'bz2', 'xz'):
+        file_path = str(tmp_path / ('text.txt.' + ext))
+        file_utils = FileUtils(file_path, compress_level=1)
+        file_utils.write_file('第一行\n第二行\n')
+        file_utils.append_to_file('第三行\n')
+        assert file_utils.read_file() == '第一行\n第二行\n第三行\n'
+        assert list(file_utils.read_file_line_by_line()) == ['第一行', '第二行', '第三行']
+
+    # 显式指定压缩格式，与扩展名无关
+    file_path = str(tmp_path / 'text.data')
+    FileUtils(file_path, codec='gzip').write_file('hello')
+    with gzip.open(file_path, 'rt') as f:
+        assert f.read() == 'hello'
+
+
+def test_csv_file_utils_compressed(tmp_path):
+    file_path = str(tmp_path / 'data.csv.gz')
+    csv_utils = CsvFileUtils(file_path)
+    data = [[str(i), 'name %d' % i, '带\n换行' if i % 3 == 0 else 'x'] for i in range(100)]
+    csv_utils.write_csv(data, header=['id', 'name', 'text'])
+    csv_utils.append_to_csv(['100', 'name 100', 'y'])
+    with csv_utils as writer:
+        writer.write_rows([['101', 'name 101', 'z']])
+
+    rows = csv_utils.read_csv(header=True)
+    assert rows == data + [['100', 'name 100', 'y'], ['101', 'name 101', 'z']]
+    assert list(csv_utils.read_csv_generator(header=True))[1:] == rows
+    assert csv_utils.read_csv_columns(usecols=['id'])['id'].tolist() == list(range(102))
+    # 文件确实是压缩格式
+    with open_file(file_path, 'rb', codec=None) as f:
+        assert f.read(2) == b'\x1f\x8b'
+    assert os.path.getsize(file_path) < sum(len(','.join(row)) for row in rows)
+
+
+def test_zstd_multi_frame(tmp_path):
+    pytest.importorskip('zstandard')
+    file_path = str(tmp_path / 'log.txt.zst')
+    file_utils = FileUtils(file_path)
+    file_utils.write_file('a\n')
+    # 每次追加写入一个新的zstd帧
+    file_utils.append_to_file('b\n')
+    file_utils.append_to_file('c\n')
+    assert list(file_utils.read_file_line_by_line()) == ['a', 'b', 'c']
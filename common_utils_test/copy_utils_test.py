@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from common_utils.copy_utils import FileCopier
+from common_utils.file_utils import FileUtils
+
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, 'sub', 'deep'))
+    for i in range(30):
+        with open(os.path.join(root, 'sub' if i % 2 else '', 'small_%d.txt' % i), 'w') as f:
+            f.write('内容%d\n' % i * (i + 1))
+    with open(os.path.join(root, 'sub', 'deep', 'large.bin'), 'wb') as f:
+        f.write(os.urandom(300 * 1024))
+
+
+def read_tree(root):
+    result = {}
+    for dir_path, _, files in os.walk(root):
+        for name in files:
+            with open(os.path.join(dir_path, name), 'rb') as f:
+                result[os.path.relpath(os.path.join(dir_path, name), root)] = f.read()
+    return result
+
+
+def test_copy_tree(tmp_path):
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    make_tree(src)
+
+    progress = []
+    copier = FileCopier(max_workers=4, large_file_threshold=100 * 1024, chunk_size=64 * 1024,
+                        progress_callback=lambda done, total: progress.append((done, total)))
+    stats = copier.copy_tree(src, dst)
+    assert read_tree(dst) == read_tree(src)
+    assert stats.files_copied == stats.files_total == 31
+    assert stats.bytes_copied == stats.bytes_total
+    assert progress[-1] == (stats.bytes_total, stats.bytes_total)
+    large_path = os.path.join('sub', 'deep', 'large.bin')
+    assert os.stat(os.path.join(dst, large_path)).st_mtime == os.stat(os.path.join(src, large_path)).st_mtime
+
+    # 再次复制时全部跳过
+    stats = FileCopier(resume=True).copy_tree(src, dst)
+    assert stats.files_skipped == 31 and stats.bytes_copied == 0
+
+
+def interrupt(src, dst, limit):
+    """ 复制到limit字节时中断，留下.part文件 """
+    def stop(bytes_done, bytes_total):
+        if bytes_done >= limit:
+            raise KeyboardInterrupt
+
+    try:
+        FileCopier(large_file_threshold=1024, chunk_size=32 * 1024, progress_callback=stop).copy_file(src, dst)
+        assert False
+    except KeyboardInterrupt:
+        pass
+    assert os.path.getsize(dst + FileCopier.PART_SUFFIX) == limit
+
+
+def test_copy_file_resume(tmp_path):
+    src = str(tmp_path / 'large.bin')
+    dst = str(tmp_path / 'copy.bin')
+    data = os.urandom(256 * 1024)
+    with open(src, 'wb') as f:
+        f.write(data)
+    interrupt(src, dst, 96 * 1024)
+
+    copier = FileCopier(large_file_threshold=1024, chunk_size=32 * 1024, resume=True)
+    stats = copier.copy_file(src, dst)
+    with open(dst, 'rb') as f:
+        assert f.read() == data
+    assert stats.bytes_copied == len(data) - 96 * 1024 and stats.bytes_done == len(data)
+    assert not os.path.exists(dst + FileCopier.PART_SUFFIX)
+    assert not os.path.exists(dst + FileCopier.PART_META_SUFFIX)
+
+    # FileUtils.copy_file 复制到目录下
+    os.makedirs(str(tmp_path / 'out'))
+    FileUtils(src).copy_file(str(tmp_path / 'out'))
+    with open(str(tmp_path / 'out' / 'large.bin'), 'rb') as f:
+        assert f.read() == data
+
+
+def test_copy_file_resume_stale_part(tmp_path):
+    src = str(tmp_path / 'large.bin')
+    dst = str(tmp_path / 'copy.bin')
+    with open(src, 'wb') as f:
+        f.write(os.urandom(256 * 1024))
+    interrupt(src, dst, 64 * 1024)
+
+    # 源文件在中断后被修改，.part不能续传
+    data = os.urandom(256 * 1024)
+    with open(src, 'wb') as f:
+        f.write(data)
+    copier = FileCopier(large_file_threshold=1024, chunk_size=32 * 1024, resume=True)
+    stats = copier.copy_file(src, dst)
+    with open(dst, 'rb') as f:
+        assert f.read() == data
+    assert stats.bytes_copied == len(data)
+
+    # 没有记录源文件信息的.part（如旧版本留下的）也从头复制
+    os.remove(dst)
+    with open(dst + FileCopier.PART_SUFFIX, 'wb') as f:
+        f.write(data[:100 * 1024])
+    assert copier.copy_file(src, dst).bytes_copied == len(data)
+    with open(dst, 'rb') as f:
+        assert f.read() == data
+
+
+def test_concurrent_copies_keep_separate_stats(tmp_path):
+    sizes = [1024 * (i + 1) * 37 for i in range(8)]
+    for i, size in enumerate(sizes):
+        with open(str(tmp_path / ('src_%d.bin' % i)), 'wb') as f:
+            f.write(os.urandom(size))
+
+    # 同一个FileCopier在多个线程中同时复制
+    copier = FileCopier(large_file_threshold=64 * 1024, chunk_size=16 * 1024)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: copier.copy_file(str(tmp_path / ('src_%d.bin' % i)),
+                                                               str(tmp_path / ('dst_%d.bin' % i))), range(8)))
+    for size, stats in zip(sizes, results):
+        assert stats.files_total == stats.files_copied == 1
+        assert stats.bytes_total == stats.bytes_done == stats.bytes_copied == size
+    assert all(open(str(tmp_path / ('src_%d.bin' % i)), 'rb').read() ==
+               open(str(tmp_path / ('dst_%d.bin' % i)), 'rb').read() for i in range(8))
@@ -1,8 +1,10 @@
 import os
 
+import openpyxl
 import pandas as pd
+from openpyxl.worksheet.pagebreak import Break
 
-from common_utils.file_utils import ExcelUtils, CsvFileUtils, FileUtils
+from common_utils.file_utils import ExcelUtils, CsvFileUtils, FileFollower, FileUtils
 
 
 def test_file_utils():
@@ -139,4 +141,225 @@ def test_excel_utils():
     sheet_names = excel.get_sheet_names()
     print(sheet_names)
 
-test_excel_utils()
\ No newline at end of file
+
+def test_line_index(tmp_path):
+    file_path = str(tmp_path / 'lines.txt')
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        f.write('第一行\r\n')
+        for i in range(1, 1000):
+            f.write('line %d\n' % i)
+        f.write('最后一行')  # 最后一行没有换行符
+
+    file_utils = FileUtils(file_path)
+    assert file_utils.line_count() == 1001
+    assert file_utils.read_lines(0, 2) == ['第一行', 'line 1']
+    assert file_utils.read_lines(999, 5) == ['line 999', '最后一行']
+    assert file_utils.read_lines(2000, 5) == []
+    assert os.path.exists(file_path + '.lidx')
+
+    # 旁路索引可以被新对象直接复用
+    assert FileUtils(file_path).read_lines(500) == ['line 500']
+
+    # 文件变化后索引自动失效并重建
+    file_utils.append_to_file('\n追加的行\n')
+    assert file_utils.line_count() == 1002
+    assert file_utils.read_lines(1001) == ['追加的行']
+    assert list(file_utils.read_file_line_by_line())[1001] == '追加的行'
+
+
+def test_csv_read_parallel(tmp_path):
+    file_path = str(tmp_path / 'parallel.csv')
+    header = ['id', 'text', 'value']
+    data = [[str(i), '第%d行\n带换行, 和"引号"' % i if i % 7 == 0 else 'row %d' % i, str(i * 1.5)]
+            for i in range(2000)]
+    csv_utils = CsvFileUtils(file_path)
+    csv_utils.write_csv(data, header=header)
+    expected = csv_utils.read_csv(header=True)
+
+    # 切分得足够小，保证切分点会落到带引号的换行附近
+    batches = list(csv_utils.read_csv_parallel(header=True, max_workers=2, chunk_bytes=1024))
+    assert len(batches) > 1
+    assert [row for batch in batches for row in batch] == expected
+    assert csv_utils.last_read_stats.rows == len(expected)
+    assert csv_utils.last_read_stats.bytes == os.path.getsize(file_path)
+
+    unordered = list(csv_utils.read_csv_parallel(header=True, ordered=False, max_workers=2, chunk_bytes=1024))
+    assert sorted(row for batch in unordered for row in batch) == sorted(expected)
+
+
+def test_csv_read_columns(tmp_path):
+    file_path = str(tmp_path / 'columns.csv')
+    header = ['id', 'name', 'price', 'qty', 'comment']
+    data = [[i, 'name_%d' % i, i * 0.25, i % 10, '备注, "%d"' % i] for i in range(1000)]
+    csv_utils = CsvFileUtils(file_path)
+    csv_utils.write_csv(data, header=header)
+
+    arrays = csv_utils.read_csv_columns(usecols=['price', 'qty'], dtypes={'qty': 'int32'}, as_frame=False)
+    assert sorted(arrays) == ['price', 'qty']
+    assert arrays['price'].dtype == 'float64' and arrays['price'].flags['C_CONTIGUOUS']
+    assert arrays['qty'].dtype == 'int32'
+    assert arrays['price'][4] == 1.0 and arrays['qty'].sum() == sum(row[3] for row in data)
+
+    frame = csv_utils.read_csv_columns(usecols=[0, 2], header=True)
+    assert list(frame.columns) == ['id', 'price']
+
+    chunks = list(csv_utils.iter_csv_columns(usecols=['id', 'qty'], dtypes={'id': 'int64'}, chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    assert pd.concat(chunks, ignore_index=True)['id'].tolist() == list(range(1000))
+
+
+def test_excel_append_streaming(tmp_path):
+    file_path = str(tmp_path / 'append.xlsx')
+    df = pd.DataFrame({'id': [1, 2, 3], 'name': ['A', 'B', 'C'], 'score': [1.5, 2.5, None]})
+    df.to_excel(file_path, sheet_name='Data', index=False)
+    excel = ExcelUtils(file_path)
+
+    # 列顺序不同也能按表头对齐；字符串含有XML特殊字符
+    df_append = pd.DataFrame({'name': ['<D&E>', ' 空格 '], 'score': [4.25, 5.0], 'id': [4, 5]})
+    excel.append_data(df_append, sheet_name='Data')
+    excel.append_data(pd.DataFrame({'id': [6], 'name': [True], 'score': [6]}), sheet_name='Data')
+
+    result = excel.read_sheet(sheet_name='Data')
+    assert result['id'].tolist() == [1, 2, 3, 4, 5, 6]
+    assert result['name'].tolist()[3:] == ['<D&E>', ' 空格 ', True]
+    assert result['score'].tolist()[3:] == [4.25, 5.0, 6]
+    assert pd.isna(result['score'][2])
+
+    # 含日期时间时退回为重写方式，结果一致
+    excel.append_data(pd.DataFrame({'id': [7], 'name': [pd.Timestamp('2024-01-01')], 'score': [7]}),
+                      sheet_name='Data')
+    assert excel.read_sheet(sheet_name='Data')['id'].tolist() == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_excel_append_streaming_fallbacks(tmp_path):
+    file_path = str(tmp_path / 'append.xlsx')
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Empty'
+    dup = workbook.create_sheet('Dup')
+    dup.append(['id', 'id', None])
+    dup.append([1, 2, 3])
+    breaks = workbook.create_sheet('Breaks')
+    breaks.append(['id'])
+    breaks.append([1])
+    breaks.row_breaks.append(Break(id=1))
+    workbook.save(file_path)
+    excel = ExcelUtils(file_path)
+
+    # 空sheet先写表头再写数据
+    excel.append_data(pd.DataFrame({'id': [1, 2]}), sheet_name='Empty')
+    assert excel.read_sheet(sheet_name='Empty')['id'].tolist() == [1, 2]
+
+    # 表头有重复或空白单元格时不走流式追加
+    assert not excel._append_rows_streaming(pd.DataFrame({'id': [4]}), 'Dup')
+
+    # <rowBreaks>不会被当作行
+    assert excel._append_rows_streaming(pd.DataFrame({'id': [2]}), 'Breaks')
+    assert excel.read_sheet(sheet_name='Breaks')['id'].tolist() == [1, 2]
+
+
+def test_excel_read_sheet_by_chunk(tmp_path):
+    file_path = str(tmp_path / 'chunk.xlsx')
+    df = pd.DataFrame({'id': range(2500), 'name': ['name_%d' % i for i in range(2500)]})
+    df.to_excel(file_path, sheet_name='Data', index=False)
+    excel = ExcelUtils(file_path)
+
+    chunks = list(excel.read_sheet_by_chunk(sheet_name='Data', chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert all(list(chunk.columns) == ['id', 'name'] for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), excel.read_sheet(sheet_name='Data'))
+
+    # 按索引读取，块大小大于行数
+    assert [len(chunk) for chunk in excel.read_sheet_by_chunk(sheet_name=0, chunk_size=5000)] == [2500]
+
+    try:
+        next(excel.read_sheet_by_chunk(sheet_name=0, chunk_size=0))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_excel_read_sheet_by_chunk_gaps(tmp_path):
+    file_path = str(tmp_path / 'gaps.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet['A1'], sheet['B1'] = 'id', 'name'
+    sheet['A2'] = 1
+    sheet['A5'], sheet['B5'] = 4, 'd'
+    sheet['B7'] = 'f'
+    workbook.save(file_path)
+    excel = ExcelUtils(file_path)
+
+    # 中间缺失的行为空行，与pd.read_excel的结果一致
+    chunks = list(excel.read_sheet_by_chunk(chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+    # 每块单独推断类型，全为空的块是object列，合并后重新推断
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True).infer_objects(), excel.read_sheet())
+
+
+def test_csv_buffered_writer(tmp_path):
+    file_path = str(tmp_path / 'buffered.csv')
+    csv_utils = CsvFileUtils(file_path, buffer_size=10, flush_interval=None, fsync='close')
+    with csv_utils as writer:
+        writer.write_rows([[i, 'row %d' % i] for i in range(25)])
+        # 满10行写入一次文件，剩余5行仍在缓冲区
+        assert writer.flush_count == 2 and writer.rows_written == 20 and writer.buffered_rows == 5
+        assert len(CsvFileUtils(file_path).read_csv()) == 20
+        writer.write_row([25, '带,逗号'])
+        writer.append_to_csv([26, '带"引号'])
+    assert csv_utils.rows_written == 27 and csv_utils.buffered_rows == 0 and csv_utils.fsync_count == 1
+
+    rows = CsvFileUtils(file_path).read_csv()
+    assert rows[0] == ['0', 'row 0'] and rows[-2:] == [['25', '带,逗号'], ['26', '带"引号']]
+
+    # 按时间间隔写入文件
+    with CsvFileUtils(file_path, buffer_size=1000, flush_interval=0) as writer:
+        writer.write_row(['27', 'x'])
+        assert writer.buffered_rows == 0 and writer.flush_count == 1
+
+    try:
+        csv_utils.write_row(['28', 'y'])
+        assert False, '不在with语句中时应当报错'
+    except ValueError:
+        pass
+
+
+def test_file_follower(tmp_path):
+    file_path = str(tmp_path / 'app.log')
+    with open(file_path, 'w') as f:
+        f.write('a\nb\nhalf')
+
+    follower = FileFollower(file_path, batch_size=2, min_interval=0.01)
+    assert follower.poll() == ['a', 'b'] and follower.poll() == []
+    # 半行写完后才产出
+    with open(file_path, 'a') as f:
+        f.write(' line\nc\n')
+    assert follower.poll() == ['half line', 'c']
+    follower.save_state()
+    follower.close()
+
+    # 从保存的偏移处继续
+    with open(file_path, 'a') as f:
+        f.write('d\n')
+    assert list(FileUtils(file_path).follow(timeout=0)) == [['d']]
+
+    # 文件被截断后从头读取
+    with open(file_path, 'w') as f:
+        f.write('new\n')
+    assert list(FileUtils(file_path).follow(timeout=0)) == [['new']]
+
+    # 轮转：读完旧文件剩余内容后读取新文件
+    follower = FileFollower(file_path, batch_size=10)
+    assert follower.poll() == []
+    with open(file_path, 'a') as f:
+        f.write('old tail\nno newline')
+    os.rename(file_path, file_path + '.1')
+    with open(file_path, 'w') as f:
+        f.write('rotated\n')
+    assert follower.poll() == ['old tail', 'no newline', 'rotated']
+    follower.save_state()
+    follower.close()
+    assert list(FileUtils(file_path).follow(timeout=0)) == []
+
+
+if __name__ == '__main__':
+    test_excel_utils()
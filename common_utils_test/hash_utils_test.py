@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from common_utils.file_utils import FileUtils
+from common_utils.hash_utils import HashCache, _hash_files, file_checksum, find_duplicates, hash_tree, iter_files
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_file_checksum(tmp_path):
+    file_path = str(tmp_path / 'data.bin')
+    data = os.urandom(100 * 1024 + 7)
+    write(file_path, data)
+    # 分块计算的结果与一次性计算一致
+    assert file_checksum(file_path, 'sha256', block_size=4096) == hashlib.sha256(data).hexdigest()
+    assert FileUtils(file_path).get_checksum() == hashlib.blake2b(data).hexdigest()
+    write(file_path, b'')
+    assert file_checksum(file_path, 'md5') == hashlib.md5(b'').hexdigest()
+
+
+def test_hash_tree_cache_and_duplicates(tmp_path):
+    root = str(tmp_path / 'tree')
+    write(os.path.join(root, 'a.txt'), b'same content')
+    write(os.path.join(root, 'sub', 'b.txt'), b'same content')
+    write(os.path.join(root, 'sub', 'deep', 'c.txt'), b'other content')
+    write(os.path.join(root, 'd.txt'), b'same size!!!')  # 大小相同但内容不同
+    write(os.path.join(root, 'empty1'), b'')
+    write(os.path.join(root, 'empty2'), b'')
+
+    with HashCache(str(tmp_path / 'hash.db')) as cache:
+        digests = hash_tree(root, algorithm='sha1', max_workers=2, cache=cache)
+        assert len(digests) == 6 and cache.misses == 6
+        assert digests[os.path.join(root, 'a.txt')] == hashlib.sha1(b'same content').hexdigest()
+
+    # 重新打开缓存，只有修改过的文件需要重新计算
+    write(os.path.join(root, 'sub', 'deep', 'c.txt'), b'changed content')
+    with HashCache(str(tmp_path / 'hash.db')) as cache:
+        digests = hash_tree(root, algorithm='sha1', cache=cache)
+        assert cache.hits == 5 and cache.misses == 1
+        assert digests[os.path.join(root, 'sub', 'deep', 'c.txt')] == hashlib.sha1(b'changed content').hexdigest()
+
+    assert find_duplicates(root) == [[os.path.join(root, 'a.txt'), os.path.join(root, 'sub', 'b.txt')]]
+    assert len(find_duplicates(root, min_size=0)) == 2
+
+
+def test_hash_files_skips_unreadable(tmp_path):
+    root = str(tmp_path / 'tree')
+    write(os.path.join(root, 'a.txt'), b'a')
+    write(os.path.join(root, 'b.txt'), b'b')
+    gone = os.path.join(root, 'gone.txt')
+    write(gone, b'x')
+    files = list(iter_files(root))
+    os.remove(gone)  # 遍历之后、计算哈希之前被删除
+
+    errors = []
+    with HashCache(str(tmp_path / 'hash.db')) as cache:
+        result = _hash_files(files, 'blake2b', 2, cache, onerror=errors.append)
+        assert sorted(os.path.basename(path) for path in result) == ['a.txt', 'b.txt']
+        assert [type(e) for e in errors] == [FileNotFoundError]
+        # 其他文件的哈希仍写入缓存
+        assert hash_tree(root, cache=cache) == result and cache.hits == 2
+
+    # 无法打开的目录通过onerror报告
+    errors = []
+    assert list(iter_files(os.path.join(root, 'a.txt'), onerror=errors.append)) == []
+    assert [type(e) for e in errors] == [NotADirectoryError]
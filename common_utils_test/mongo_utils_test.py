@@ -0,0 +1,137 @@
+import time
+
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from common_utils.mongo_utils import BulkWriter
+
+
+class _Result(object):
+
+    def __init__(self, bulk_api_result):
+        self.bulk_api_result = bulk_api_result
+
+
+class _FakeCollection(object):
+    """ 按_id模拟唯一键冲突的集合 """
+
+    def __init__(self):
+        self.ids = set()
+        self.batches = []
+        self.fail = False
+
+    def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise AutoReconnect('connection closed')
+        self.batches.append(len(ops))
+        result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+                  'upserted': [], 'writeErrors': [], 'writeConcernErrors': []}
+        for i, op in enumerate(ops):
+            if isinstance(op, InsertOne):
+                if op._doc['_id'] in self.ids:
+                    result['writeErrors'].append({'index': i, 'code': 11000, 'errmsg': 'duplicate key'})
+                    if ordered:
+                        break  # 按顺序执行时服务器在第一个错误处停止
+                    continue
+                self.ids.add(op._doc['_id'])
+                result['nInserted'] += 1
+            else:
+                result['upserted'].append({'index': i, '_id': 'new-%d' % i})
+                result['nUpserted'] += 1
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return _Result(result)
+
+
+def test_bulk_writer_batches_and_errors():
+    collection = _FakeCollection()
+    collection.ids.add(3)
+    with BulkWriter(collection, batch_size=4, flush_interval=None) as writer:
+        for i in range(10):
+            writer.insert_one({'_id': i})
+        writer.update_one({'name': 'x'}, {'$set': {'v': 1}}, upsert=True)
+        assert collection.batches == [4, 4]
+    summary = writer.summary
+    assert collection.batches == [4, 4, 3]
+    assert summary.inserted_count == 9 and summary.upserted_count == 1 and summary.batches == 3
+    assert summary.upserted_ids == {10: 'new-2'}
+    assert [(e['index'], e['code'], e['op']._doc) for e in summary.errors] == [(3, 11000, {'_id': 3})]
+
+
+def test_bulk_writer_interval_and_failure():
+    collection = _FakeCollection()
+    writer = BulkWriter(collection, batch_size=100, flush_interval=0.05)
+    writer.insert_one({'_id': 1})
+    time.sleep(0.3)
+    assert collection.batches == [1]
+
+    collection.fail = True
+    try:
+        writer.insert_one({'_id': 2})
+        writer.flush()
+        assert False
+    except AutoReconnect:
+        pass
+    # 失败的操作保留在缓冲区，关闭时重试写入
+    assert [op._doc for op in writer.pending] == [{'_id': 2}]
+    collection.fail = False
+    assert writer.close().inserted_count == 2
+
+
+def test_bulk_writer_stops_on_batch_failure():
+    collection = _FakeCollection()
+    writer = BulkWriter(collection, batch_size=100, flush_interval=None, ordered=True)
+    original = collection.bulk_write
+
+    def fail_second_batch(ops, ordered=True):
+        if len(collection.batches) == 1:
+            raise AutoReconnect('connection closed')
+        return original(ops, ordered)
+
+    collection.bulk_write = fail_second_batch
+    for i in range(6):
+        writer.insert_one({'_id': i})
+    writer.batch_size = 2
+    try:
+        writer.flush()
+        assert False
+    except AutoReconnect:
+        pass
+    # 第二批失败后不再写入第三批，未写入的操作按顺序留在缓冲区
+    assert collection.batches == [2]
+    assert [op._doc['_id'] for op in writer.pending] == [2, 3, 4, 5]
+
+    collection.bulk_write = original
+    summary = writer.close()
+    assert collection.batches == [2, 2, 2] and summary.inserted_count == 6 and not summary.errors
+
+
+def test_bulk_writer_ordered_write_error():
+    collection = _FakeCollection()
+    collection.ids.add(3)
+    writer = BulkWriter(collection, batch_size=100, flush_interval=None, ordered=True)
+    for i in range(8):
+        writer.insert_one({'_id': i})
+    writer.batch_size = 4
+    try:
+        writer.flush()
+        assert False
+    except OperationFailure:
+        pass
+    # 第一批在_id=3处停止，不再写入第二批；失败的操作记录在errors中，之后的操作留在缓冲区
+    assert collection.batches == [4] and writer.summary.inserted_count == 3
+    assert [(error['index'], error['code']) for error in writer.summary.errors] == [(3, 11000)]
+    assert [op._doc['_id'] for op in writer.pending] == [4, 5, 6, 7]
+
+    # 失败的操作在批末尾时同样停止
+    collection.ids.add(7)
+    try:
+        writer.flush()
+        assert False
+    except OperationFailure:
+        pass
+    assert writer.pending == [] and writer.summary.inserted_count == 6
+    assert [error['index'] for error in writer.summary.errors] == [3, 7]
+    writer.insert_one({'_id': 8})
+    summary = writer.close()
+    assert summary.inserted_count == 7 and summary.upserted_ids == {}
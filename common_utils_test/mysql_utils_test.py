@@ -0,0 +1,775 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import aiomysql
+import numpy as np
+import pandas as pd
+import pytest
+from pymysql.constants import FIELD_TYPE
+
+from common_utils import mysql_utils
+from common_utils.mysql_utils import (KeysetScanner, MysqlPool, QueryCache, QueryMetrics, SSHTunnelManager,
+                                      _column_dtype, _concat_arrays, _escape_row, _iter_insert_batches,
+                                      _resolve_address, _rows_to_arrays, close_mysql_pools, get_mysql_pool,
+                                      load_ssh_config, sql_fingerprint)
+
+_CONFIG = {'host': 'db', 'port': 3306, 'user': 'user', 'password': 'password', 'database': 'test', 'ssh': None}
+
+
+class _FakeCursor(object):
+
+    def __init__(self, conn, cursorclass):
+        self.conn = conn
+        self.cursorclass = cursorclass
+        self.rows = []
+        self.rowcount = 0
+        self.description = None
+        self.closed = False
+
+    async def execute(self, sql, args=None):
+        server = self.conn.server
+        await asyncio.sleep(random.random() * server.latency)
+        server.executed.append((sql, args))
+        server.cursorclasses.append(self.cursorclass)
+        # handler返回整数时表示写入语句的影响行数，否则为结果行
+        result = server.handler(sql, list(args or []))
+        if isinstance(result, int):
+            self.rows, self.rowcount = [], result
+        else:
+            self.rows = list(result)
+            self.rowcount = len(self.rows)
+        self.description = [(name,) for name in server.columns]
+        return self.rowcount
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchmany(self, size):
+        await asyncio.sleep(0)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    async def close(self):
+        self.closed = True
+        self.conn.server.cursors_closed.append(len(self.rows))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+
+class _FakeCursorContext(object):
+    """ 同aiomysql的conn.cursor()，既可以await也可以async with """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __await__(self):
+        async def get():
+            return self.cursor
+        return get().__await__()
+
+    async def __aenter__(self):
+        return self.cursor
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.cursor.close()
+
+
+class _FakeConnection(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.last_usage = asyncio.get_event_loop().time()
+        self.closed = False
+        self.dead = False  # 为True时ping失败
+
+    def cursor(self, cursorclass=None):
+        return _FakeCursorContext(_FakeCursor(self, cursorclass))
+
+    async def ping(self):
+        if self.dead:
+            raise aiomysql.OperationalError(2013, 'Lost connection to MySQL server')
+
+    def close(self):
+        self.closed = True
+
+
+class _FakePool(object):
+
+    def __init__(self, server, maxsize):
+        self.server = server
+        self.free = []
+        self.used = []
+        self.closed = False
+        self._semaphore = asyncio.Semaphore(maxsize)
+
+    @property
+    def size(self):
+        return len(self.free) + len(self.used)
+
+    @property
+    def freesize(self):
+        return len(self.free)
+
+    async def acquire(self):
+        await self._semaphore.acquire()
+        conn = self.free.pop(0) if self.free else _FakeConnection(self.server)
+        self.used.append(conn)
+        return conn
+
+    def release(self, conn):
+        self.used.remove(conn)
+        if not conn.closed:
+            self.free.append(conn)
+        self._semaphore.release()
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+
+class _FakeServer(object):
+    """ 替换aiomysql.create_pool，handler(sql, args)决定每条语句的结果 """
+
+    def __init__(self, monkeypatch, handler=None, columns=('id',)):
+        self.handler = handler or (lambda sql, args: [])
+        self.columns = columns
+        self.latency = 0.0  # 每条语句随机等待的最长秒数
+        self.pools = []
+        self.executed = []
+        self.cursorclasses = []
+        self.cursors_closed = []  # 关闭游标时未读取的行数
+
+        async def create_pool(host, port, minsize, maxsize, **kwargs):
+            await asyncio.sleep(0.01)
+            pool = _FakePool(self, maxsize)
+            self.pools.append(pool)
+            return pool
+
+        monkeypatch.setattr(aiomysql, 'create_pool', create_pool)
+
+
+def test_sql_fingerprint():
+    assert sql_fingerprint("SELECT * FROM t1 WHERE a = 12 AND b='x\\'y' AND c IN (1, 2,3) and d=%s;") == \
+        'select * from t1 where a = ? and b=? and c in (?+) and d=?'
+    assert sql_fingerprint("insert into t (a,b) values (1,'x'),\n (2,'y')") == 'insert into t (a,b) values (?+)+'
+
+
+def test_query_metrics_slow_log(caplog):
+    events = []
+    metrics = QueryMetrics(slow_query_threshold=0.5, hook=events.append)
+    for i in range(10):
+        metrics.record('select * from t where id = %s', [i], {'execute': 0.01 * i, 'total': 0.01 * i}, 1)
+    with caplog.at_level(logging.WARNING):
+        metrics.record("select * from users where password = 'secret'", [], {'total': 1.0}, 0)
+    assert 'secret' not in caplog.text and 'password = ?' in caplog.text
+
+    snapshot = metrics.snapshot()
+    stats = snapshot['select * from t where id = ?']
+    assert stats['count'] == 10 and stats['rows'] == 10 and stats['slow'] == 0
+    assert abs(stats['phases']['total']['avg'] - 0.045) < 1e-9
+    assert 0.0 < stats['phases']['total']['p50'] <= stats['phases']['total']['p95'] <= 0.09
+    assert len(events) == 11 and events[-1]['slow']
+    assert metrics.format_snapshot().splitlines()[1].endswith("select * from users where password = ?")
+
+
+def test_query_cache_single_flight_and_invalidation():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{'id': len(calls)}]
+
+    async def run():
+        cache = QueryCache(ttl=60)
+        results = await asyncio.gather(*[cache.get_or_load('k', {'t'}, loader) for _ in range(5)])
+        assert len(calls) == 1 and all(result is results[0] for result in results)
+        assert await cache.get_or_load('k', {'t'}, loader) is results[0]
+        cache.invalidate({'`db`.`T`'})
+        assert (await cache.get_or_load('k', {'t'}, loader)) == [{'id': 2}]
+
+        # 查询期间表被写入，结果不写入缓存
+        pending = asyncio.ensure_future(cache.get_or_load('k2', {'u'}, loader))
+        await asyncio.sleep(0)
+        cache.invalidate({'u'})
+        await pending
+        await cache.get_or_load('k2', {'u'}, loader)
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert len(calls) == 4
+    assert stats['hits'] == 1 and stats['coalesced'] == 4 and stats['invalidations'] == 1
+
+
+def test_integer_columns_keep_precision():
+    dtypes = [_column_dtype(FIELD_TYPE.LONGLONG, True), _column_dtype(FIELD_TYPE.DOUBLE, True)]
+    big = 2 ** 53 + 1
+    ids, scores = _rows_to_arrays([(big, 1.5), (2, None)], dtypes)
+    assert ids.dtype == np.int64 and ids[0] == big
+    assert np.isnan(scores[1])
+
+    # 实际出现NULL时使用Int64，不转换为float64
+    with_null, _ = _rows_to_arrays([(big, 1.0), (None, 2.0)], dtypes)
+    assert str(with_null.dtype) == 'Int64' and with_null[0] == big and with_null[1] is pd.NA
+
+    merged = _concat_arrays([ids, with_null])
+    assert str(merged.dtype) == 'Int64' and list(merged[:3]) == [big, 2, big]
+
+
+def test_escape_row_nulls_and_numpy_scalars():
+    assert _escape_row([None, float('nan'), pd.NaT, pd.NA, np.float64('nan'), np.datetime64('NaT')]) == \
+        '(NULL,NULL,NULL,NULL,NULL,NULL)'
+    assert _escape_row([np.bool_(True), np.bool_(False), np.int64(7), np.float32(0.5), 'a\'b']) == \
+        "(1,0,7,0.5e0,'a\\'b')"
+    assert _escape_row([pd.Timestamp('2024-01-02 03:04:05'), np.datetime64('2024-01-02T03:04:05')]) == \
+        "('2024-01-02 03:04:05','2024-01-02 03:04:05')"
+
+    # DataFrame的行（itertuples）中的空值和numpy类型
+    frame = pd.DataFrame({'flag': np.array([True, False]), 'at': [pd.Timestamp('2024-01-01'), pd.NaT]})
+    assert [_escape_row(row) for row in frame.itertuples(index=False)] == \
+        ["(1,'2024-01-01 00:00:00')", '(0,NULL)']
+
+
+def test_load_ssh_config(tmp_path, monkeypatch):
+    for name in ['MYSQL_SSH_HOST', 'MYSQL_SSH_PORT', 'MYSQL_SSH_USERNAME', 'MYSQL_SSH_PASSWORD', 'MYSQL_SSH_PKEY',
+                 'MYSQL_SSH_CONFIG_FILE']:
+        monkeypatch.delenv(name, raising=False)
+    # 默认没有跳板机，直连
+    assert load_ssh_config() is None
+
+    config_file = str(tmp_path / 'ssh.json')
+    with open(config_file, 'w') as f:
+        json.dump({'host': 'jump', 'port': 36000, 'username': 'user', 'pkey': '/path/key'}, f)
+    monkeypatch.setenv('MYSQL_SSH_CONFIG_FILE', config_file)
+    monkeypatch.setenv('MYSQL_SSH_PORT', '2222')
+    monkeypatch.setenv('MYSQL_SSH_PASSWORD', 'secret')
+    assert load_ssh_config() == {'host': 'jump', 'port': 2222, 'username': 'user', 'pkey': '/path/key',
+                                 'password': 'secret'}
+
+
+def test_pool_per_config_and_loop(monkeypatch):
+    server = _FakeServer(monkeypatch)
+
+    async def run():
+        created = len(server.pools)
+        entries = await asyncio.gather(*[get_mysql_pool(_CONFIG) for _ in range(5)])
+        assert all(entry is entries[0] for entry in entries)
+        other = await get_mysql_pool(dict(_CONFIG, database='other'))
+        assert other is not entries[0] and len(server.pools) == created + 2
+        await close_mysql_pools()
+        assert all(pool.closed for pool in server.pools[created:])
+        # 关闭后重新创建
+        assert await get_mysql_pool(_CONFIG) is not entries[0]
+        return entries[0]
+
+    first = asyncio.run(run())
+    # 每个事件循环有自己的连接池
+    assert asyncio.run(run()) is not first
+    assert len(server.pools) == 6
+
+
+def test_pool_pre_ping_drops_dead_connection(monkeypatch):
+    server = _FakeServer(monkeypatch)
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG, pre_ping_interval=0)
+        async with pool.acquire() as dead:
+            pass
+        dead.dead = True
+        async with pool.acquire() as conn:
+            assert conn is not dead and not conn.closed
+        assert dead.closed and server.pools[0].free == [conn]
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats['ping_failures'] == 1 and stats['acquire_count'] == 3 and stats['acquire_timeouts'] == 0
+    assert stats['in_use'] == 0 and stats['size'] == 1
+
+
+def test_pool_acquire_timeout_and_wait_stats(monkeypatch):
+    _FakeServer(monkeypatch)
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG, maxsize=1, acquire_timeout=0.05)
+        async with pool.acquire():
+            assert (await pool.pool_stats())['in_use'] == 1
+            with pytest.raises(asyncio.TimeoutError):
+                async with pool.acquire():
+                    pass
+            waiter = pool.acquire()
+
+            async def wait():
+                async with waiter:
+                    return (await pool.pool_stats())['in_use']
+
+            task = asyncio.ensure_future(wait())
+            await asyncio.sleep(0.02)
+        assert await task == 1
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return stats, waiter.wait_time
+
+    stats, wait_time = asyncio.run(run())
+    assert stats['acquire_count'] == 3 and stats['acquire_timeouts'] == 1
+    assert stats['wait_time_max'] >= 0.05 and 0.02 <= wait_time < 0.05
+    assert stats['wait_time_total'] >= 0.07
+    assert stats['in_use'] == 0 and stats['max_in_use'] == 1
+
+
+def _rows(count):
+    return [{'id': i} for i in range(count)]
+
+
+def test_stream_read_to_end_returns_connection(monkeypatch):
+    server = _FakeServer(monkeypatch, lambda sql, args: _rows(25))
+
+    async def run():
+        metrics = QueryMetrics()
+        pool = MysqlPool(config=_CONFIG, metrics=metrics)
+        async with pool.select_mysql_stream('select id from t where id > %s', [0], batch_size=10) as batches:
+            sizes = [len(batch) async for batch in batches]
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return sizes, batches.rows, stats, metrics.snapshot()
+
+    sizes, rows, stats, snapshot = asyncio.run(run())
+    assert sizes == [10, 10, 5] and rows == 25
+    pool = server.pools[0]
+    assert len(pool.free) == 1 and not pool.free[0].closed and not pool.used
+    assert server.cursors_closed == [0] and stats['in_use'] == 0
+    assert snapshot['select id from t where id > ?']['rows'] == 25
+
+
+def test_stream_break_closes_connection(monkeypatch):
+    server = _FakeServer(monkeypatch, lambda sql, args: _rows(25))
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        async with pool.select_mysql_stream('select id from t', batch_size=10) as batches:
+            async for batch in batches:
+                conn = server.pools[0].used[0]
+                break
+        stats = await pool.pool_stats()
+        # 关闭的连接不再复用
+        async with pool.acquire() as other:
+            assert other is not conn
+        await close_mysql_pools()
+        return conn, stats
+
+    conn, stats = asyncio.run(run())
+    assert conn.closed and conn not in server.pools[0].free
+    assert stats['in_use'] == 0 and stats['free'] == 0
+
+
+def test_stream_execute_error(monkeypatch):
+    def handler(sql, args):
+        raise aiomysql.ProgrammingError(1146, "Table 'test.missing' doesn't exist")
+
+    server = _FakeServer(monkeypatch, handler)
+
+    async def run():
+        metrics = QueryMetrics()
+        pool = MysqlPool(config=_CONFIG, metrics=metrics)
+        with pytest.raises(aiomysql.ProgrammingError):
+            async with pool.select_mysql_stream('select id from missing') as batches:
+                async for _ in batches:
+                    pass
+        # 出错后继续迭代直接结束
+        assert [batch async for batch in batches] == []
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return stats, metrics.snapshot()
+
+    stats, snapshot = asyncio.run(run())
+    assert stats['in_use'] == 0 and server.pools[0].free == []
+    assert snapshot['select id from missing']['errors'] == 1
+
+
+def test_select_all_yield_stream_default_batch_size(monkeypatch):
+    server = _FakeServer(monkeypatch, lambda sql, args: _rows(2500))
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        batches = [batch async for batch in pool.select_mysql_all_yield('select id from t', stream=True)]
+        await close_mysql_pools()
+        return batches
+
+    batches = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [1000, 1000, 500]
+    assert [row['id'] for batch in batches for row in batch] == list(range(2500))
+    assert server.cursorclasses == [aiomysql.SSDictCursor]
+    assert len(server.pools[0].free) == 1 and server.cursors_closed == [0]
+
+
+class _FakeTable(object):
+    """ 按KeysetScanner生成的语句返回结果的单列表 """
+
+    def __init__(self, keys, fail_after=None):
+        self.keys = sorted(keys)
+        self.fail_after = fail_after  # 读取该键之后的一页时出错
+
+    def __call__(self, sql, args):
+        if sql.startswith('SELECT MIN('):
+            return [(self.keys[0], self.keys[-1]) if self.keys else (None, None)]
+        if 'information_schema.TABLES' in sql:
+            return [(len(self.keys),)]
+        if 'RAND()' in sql:
+            # 固定抽取每10个键中的一个
+            return [(key,) for key in self.keys[::10]]
+        args = list(args)
+        after = args.pop(0) if '> %s' in sql else None
+        upto = args.pop(0) if '<= %s' in sql else None
+        if after is not None and after == self.fail_after:
+            raise aiomysql.OperationalError(2013, 'Lost connection to MySQL server during query')
+        limit = int(re.search(r'LIMIT (\d+)', sql).group(1))
+        keys = [key for key in self.keys if (after is None or key > after) and (upto is None or key <= upto)]
+        return [{'id': key} for key in keys[:limit]]
+
+
+def _scan(scanner, limit=None):
+    async def run():
+        rows = []
+        scan = scanner.scan()
+        try:
+            async for batch in scan:
+                rows.extend(row['id'] for row in batch)
+                if limit is not None and len(rows) >= limit:
+                    break
+        finally:
+            await scan.aclose()
+        return rows
+
+    return run()
+
+
+def test_keyset_plan_minmax(monkeypatch):
+    table = _FakeTable(range(1, 101))
+    _FakeServer(monkeypatch, table)
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        plans = [await KeysetScanner(pool, 't', 'id', ranges=4)._plan()]
+        # 区间数多于键的个数时合并重复的边界
+        table.keys = [1, 2, 3]
+        plans.append(await KeysetScanner(pool, 't', 'id', ranges=8)._plan())
+        table.keys = []
+        empty = KeysetScanner(pool, 't', 'id', ranges=8)
+        plans.append(await empty._plan())
+        rows = await _scan(empty)
+        table.keys = ['a', 'b']
+        with pytest.raises(ValueError):
+            await KeysetScanner(pool, 't', 'id')._plan()
+        await close_mysql_pools()
+        return plans, rows, empty.checkpoint()
+
+    plans, rows, checkpoint = asyncio.run(run())
+    assert [(state['after'], state['upto']) for state in plans[0]] == [(None, 25), (25, 50), (50, 75), (75, None)]
+    assert [(state['after'], state['upto']) for state in plans[1]] == [(None, 1), (1, 2), (2, 3), (3, None)]
+    assert plans[2] == [] and rows == [] and checkpoint == {'ranges': []}
+
+
+def test_keyset_plan_sample(monkeypatch):
+    server = _FakeServer(monkeypatch, _FakeTable(range(1000)))
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        scanner = KeysetScanner(pool, 't', 'id', ranges=4, split='sample', sample_size=100)
+        plan = await scanner._plan()
+        await close_mysql_pools()
+        return plan
+
+    plan = asyncio.run(run())
+    # 抽样到的100个键按分位数切分
+    assert [(state['after'], state['upto']) for state in plan] == [(None, 250), (250, 500), (500, 750), (750, None)]
+    assert [args for sql, args in server.executed if 'RAND()' in sql] == [[0.1]]
+
+
+def test_keyset_scan_ordered_and_unordered(monkeypatch):
+    keys = random.Random(1).sample(range(100000), 500)
+    server = _FakeServer(monkeypatch, _FakeTable(keys))
+    server.latency = 0.002
+
+    async def run(ordered):
+        pool = MysqlPool(config=_CONFIG)
+        scanner = KeysetScanner(pool, 't', 'id', batch_size=7, ranges=8, concurrency=3, ordered=ordered)
+        rows = await _scan(scanner)
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return rows, scanner, stats
+
+    rows, scanner, stats = asyncio.run(run(True))
+    assert rows == sorted(keys) and scanner.rows == 500
+    assert all(state['done'] for state in scanner.checkpoint()['ranges']) and stats['in_use'] == 0
+    rows, scanner, _ = asyncio.run(run(False))
+    assert sorted(rows) == sorted(keys)
+
+
+def test_keyset_resume_from_checkpoint(monkeypatch):
+    keys = list(range(0, 3000, 3))
+    _FakeServer(monkeypatch, _FakeTable(keys))
+
+    async def run(ordered):
+        pool = MysqlPool(config=_CONFIG)
+        scanner = KeysetScanner(pool, 't', 'id', batch_size=10, ranges=6, concurrency=2, ordered=ordered)
+        first = await _scan(scanner, limit=250)
+        checkpoint = json.loads(json.dumps(scanner.checkpoint()))
+        resumed = KeysetScanner(pool, 't', 'id', batch_size=10, concurrency=2, ordered=ordered,
+                                checkpoint=checkpoint)
+        rest = await _scan(resumed)
+        await close_mysql_pools()
+        return first, rest
+
+    for ordered in (True, False):
+        first, rest = asyncio.run(run(ordered))
+        # 断点之前最后产出的一批可能重新读取，但不会漏读
+        assert set(first) | set(rest) == set(keys)
+        assert len(first) + len(rest) - len(keys) <= 10
+    assert first != [] and rest != []
+
+
+def test_keyset_page_error_cancels_other_ranges(monkeypatch):
+    server = _FakeServer(monkeypatch, _FakeTable(range(1000), fail_after=509))
+    server.latency = 0.002
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        scanner = KeysetScanner(pool, 't', 'id', batch_size=10, ranges=4, concurrency=4)
+        with pytest.raises(aiomysql.OperationalError):
+            await _scan(scanner)
+        executed = len(server.executed)
+        await asyncio.sleep(0.05)
+        # 其他区间的读取已取消，不再执行新的查询
+        assert len(server.executed) == executed
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats['in_use'] == 0
+
+
+def test_iter_insert_batches_limits():
+    prefix, suffix = 'INSERT INTO `t` (`id`,`name`) VALUES ', ' ON DUPLICATE KEY UPDATE `name`=VALUES(`name`)'
+    rows = [(i, '名字' * (i % 7)) for i in range(100)]
+    batches = list(_iter_insert_batches(prefix, suffix, rows, 200, 5))
+    assert all(len(sql.encode('utf-8')) <= 200 and 0 < count <= 5 for sql, count in batches)
+    # 拼回原来的行，最后不满一批的行也已输出
+    values = [sql[len(prefix):-len(suffix)] for sql, _ in batches]
+    assert ','.join(values) == ','.join(_escape_row(row) for row in rows)
+    assert sum(count for _, count in batches) == 100 and batches[-1][1] < 5
+    assert [count for _, count in _iter_insert_batches(prefix, '', rows[:12], 10000, 5)] == [5, 5, 2]
+
+    with pytest.raises(ValueError):
+        list(_iter_insert_batches(prefix, suffix, [(1, 'x' * 200)], 200, 5))
+
+
+def _insert_handler(sql, args):
+    if sql == 'SELECT @@max_allowed_packet':
+        return [(4 * 1024 * 1024,)]
+    return sql.count('),(') + 1
+
+
+def test_bulk_upsert_statements(monkeypatch):
+    server = _FakeServer(monkeypatch, _insert_handler)
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        result = await pool.bulk_upsert('t', ['id', 'name'], ((i, 'n%d' % i) for i in range(25)),
+                                        update_columns=['name'], max_batch_rows=10, concurrency=2)
+        await pool.bulk_upsert('t', ['id', 'name'], [(1, 'a')])
+        await close_mysql_pools()
+        return result
+
+    result = asyncio.run(run())
+    assert result.rows == 25 and result.rowcount == 25
+    assert sorted(count for _, count, _ in result.batches) == [5, 10, 10]
+    statements = [sql for sql, _ in server.executed if sql.startswith('INSERT')]
+    assert len(statements) == 4
+    assert statements[0].startswith("INSERT INTO `t` (`id`,`name`) VALUES (0,'n0'),(1,'n1'),")
+    assert all(sql.endswith(') ON DUPLICATE KEY UPDATE `name`=VALUES(`name`)') for sql in statements[:3])
+    assert statements[3] == \
+        "INSERT INTO `t` (`id`,`name`) VALUES (1,'a') ON DUPLICATE KEY UPDATE `id`=VALUES(`id`),`name`=VALUES(`name`)"
+
+
+def test_bulk_insert_worker_failure_stops_producer(monkeypatch):
+    inserts = []
+
+    def handler(sql, args):
+        if sql.startswith('INSERT'):
+            inserts.append(sql)
+            if len(inserts) == 3:
+                raise aiomysql.IntegrityError(1062, "Duplicate entry '1' for key 'PRIMARY'")
+        return _insert_handler(sql, args)
+
+    server = _FakeServer(monkeypatch, handler)
+    server.latency = 0.002
+    produced = []
+
+    def rows():
+        for i in range(100000):
+            produced.append(i)
+            yield i, 'n%d' % i
+
+    async def run():
+        pool = MysqlPool(config=_CONFIG)
+        with pytest.raises(aiomysql.IntegrityError):
+            await asyncio.wait_for(pool.bulk_insert('t', ['id', 'name'], rows(), max_batch_rows=10, concurrency=2),
+                                   timeout=5)
+        stats = await pool.pool_stats()
+        await close_mysql_pools()
+        return stats
+
+    stats = asyncio.run(run())
+    # 队列最多积压concurrency*2批，出错后不再读取后面的行
+    assert len(produced) <= 10 * 10
+    assert stats['in_use'] == 0
+
+
+_SSH_CONFIG = {'host': 'jump', 'port': 22, 'username': 'user', 'pkey': '/path/key'}
+_SSH_ENV = ['MYSQL_SSH_HOST', 'MYSQL_SSH_PORT', 'MYSQL_SSH_USERNAME', 'MYSQL_SSH_PASSWORD', 'MYSQL_SSH_PKEY',
+            'MYSQL_SSH_CONFIG_FILE']
+
+
+class _FakeForwarder(object):
+    """ 替换sshtunnel.SSHTunnelForwarder """
+    instances = []
+    failures = 0  # 之后启动失败的次数
+    lock = threading.Lock()
+
+    def __init__(self, ssh_address, remote_bind_address, local_bind_address, **kwargs):
+        self.ssh_address = ssh_address
+        self.remote_bind_address = remote_bind_address
+        self.local_bind_port = local_bind_address[1] or 40000 + len(_FakeForwarder.instances)
+        self.is_active = False
+        self.stopped = False
+        with _FakeForwarder.lock:
+            _FakeForwarder.instances.append(self)
+
+    def start(self):
+        time.sleep(0.02)
+        with _FakeForwarder.lock:
+            if _FakeForwarder.failures:
+                _FakeForwarder.failures -= 1
+                raise RuntimeError('Could not establish session to SSH gateway')
+        self.is_active = True
+
+    def stop(self):
+        self.is_active = False
+        self.stopped = True
+
+
+def _fake_sshtunnel(monkeypatch):
+    _FakeForwarder.instances = []
+    _FakeForwarder.failures = 0
+    monkeypatch.setitem(sys.modules, 'sshtunnel', types.SimpleNamespace(SSHTunnelForwarder=_FakeForwarder))
+
+
+def test_tunnel_shared_by_concurrent_callers(monkeypatch):
+    _fake_sshtunnel(monkeypatch)
+    manager = SSHTunnelManager(check_interval=60)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            ports = list(executor.map(lambda _: manager.get_local_port(_SSH_CONFIG, 'db', 3306), range(16)))
+        assert len(set(ports)) == 1 and len(_FakeForwarder.instances) == 1
+
+        async def run():
+            return await asyncio.gather(*[manager.get_local_port_async(_SSH_CONFIG, 'db', 3306) for _ in range(4)] +
+                                        [manager.get_local_port_async(_SSH_CONFIG, 'db', 3307) for _ in range(4)])
+
+        ports = asyncio.run(run())
+        assert ports[:4] == [ports[0]] * 4 and ports[4:] == [ports[4]] * 4 and ports[0] != ports[4]
+        assert len(_FakeForwarder.instances) == 2
+        assert _FakeForwarder.instances[1].remote_bind_address == ('db', 3307)
+    finally:
+        manager.close()
+    assert all(forwarder.stopped for forwarder in _FakeForwarder.instances)
+
+
+def test_tunnel_restart_with_backoff(monkeypatch):
+    _fake_sshtunnel(monkeypatch)
+    manager = SSHTunnelManager(min_backoff=0.1, max_backoff=1.0, check_interval=60)
+    try:
+        port = manager.get_local_port(_SSH_CONFIG, 'db', 3306)
+        _FakeForwarder.instances[0].is_active = False
+        _FakeForwarder.failures = 1
+        with pytest.raises(RuntimeError):
+            manager.get_local_port(_SSH_CONFIG, 'db', 3306)
+        # 退避期间不重试
+        with pytest.raises(ConnectionError):
+            manager.get_local_port(_SSH_CONFIG, 'db', 3306)
+        assert len(_FakeForwarder.instances) == 2
+        time.sleep(0.1)
+        # 重建时沿用原来的本地端口
+        assert manager.get_local_port(_SSH_CONFIG, 'db', 3306) == port
+        assert _FakeForwarder.instances[0].stopped and len(_FakeForwarder.instances) == 3
+        stats = manager.stats()[('jump', 22, 'db', 3306)]
+        assert stats['up'] and stats['restarts'] == 1 and stats['failures'] == 0 and stats['last_error'] is None
+    finally:
+        manager.close()
+
+
+def test_tunnel_watchdog_restarts_and_stops(monkeypatch):
+    _fake_sshtunnel(monkeypatch)
+    manager = SSHTunnelManager(check_interval=0.01)
+    try:
+        manager.get_local_port(_SSH_CONFIG, 'db', 3306)
+        _FakeForwarder.instances[0].is_active = False
+        deadline = time.monotonic() + 5
+        while len(_FakeForwarder.instances) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(_FakeForwarder.instances) == 2
+    finally:
+        manager.close()
+    manager._watchdog.join(5)
+    assert not manager._watchdog.is_alive()
+    assert all(not forwarder.is_active for forwarder in _FakeForwarder.instances)
+    # 关闭后不再启动后台线程
+    manager.get_local_port(_SSH_CONFIG, 'db', 3306)
+    assert not manager._watchdog.is_alive()
+    manager.close()
+
+
+def test_resolve_address(monkeypatch):
+    _fake_sshtunnel(monkeypatch)
+    for name in _SSH_ENV:
+        monkeypatch.delenv(name, raising=False)
+    manager = SSHTunnelManager(check_interval=60)
+    monkeypatch.setattr(mysql_utils, 'tunnel_manager', manager)
+    config = {'host': 'db', 'port': 3306}
+
+    async def run():
+        addresses = [await _resolve_address(config), await _resolve_address(dict(config, ssh=None))]
+        addresses.append(await _resolve_address(dict(config, ssh=_SSH_CONFIG)))
+        # 隧道不可用时直连
+        _FakeForwarder.failures = 1
+        addresses.append(await _resolve_address(dict(config, port=3307, ssh=_SSH_CONFIG)))
+        return addresses
+
+    try:
+        addresses = asyncio.run(run())
+    finally:
+        manager.close()
+    assert addresses[:2] == [[('db', 3306)], [('db', 3306)]]
+    assert addresses[2] == [('127.0.0.1', _FakeForwarder.instances[0].local_bind_port), ('db', 3306)]
+    assert addresses[3] == [('db', 3307)]
@@ -0,0 +1,34 @@
+import os
+
+from common_utils.scan_utils import RECORD_FIELDS, scan_to_array, scan_to_frame, scan_tree
+
+
+def make_tree(root):
+    for directory in ['a', 'a/b', 'c', 'skip']:
+        os.makedirs(os.path.join(str(root), directory), exist_ok=True)
+    files = ['x.csv', 'a/y.csv', 'a/z.txt', 'a/b/w.csv', 'c/v.log', 'skip/u.csv']
+    for i, name in enumerate(files):
+        with open(os.path.join(str(root), name), 'w') as f:
+            f.write('x' * i)
+    return files
+
+
+def test_scan_tree(tmp_path):
+    files = make_tree(tmp_path)
+    batches = list(scan_tree(str(tmp_path), batch_size=2, max_workers=2))
+    assert all(len(batch) <= 2 for batch in batches)
+    records = [dict(zip(RECORD_FIELDS, record)) for batch in batches for record in batch]
+    assert sorted(os.path.relpath(r['path'], str(tmp_path)) for r in records) == sorted(files)
+    info = [r for r in records if r['name'] == 'w.csv'][0]
+    assert info['size'] == 3 and os.path.isabs(info['path'])
+
+
+def test_scan_filters(tmp_path):
+    make_tree(tmp_path)
+    frame = scan_to_frame(str(tmp_path), include='*.csv', exclude=['skip'])
+    assert sorted(frame['name']) == ['w.csv', 'x.csv', 'y.csv']
+    array = scan_to_array(str(tmp_path), include=['a/*.csv', '*.log'])
+    assert sorted(array['name']) == ['v.log', 'y.csv']
+    assert array['size'].sum() == 5
+    assert len(scan_to_array(str(tmp_path), include='*.none')) == 0
+    assert sorted(scan_to_array(str(tmp_path), include='a/**/*.csv')['name']) == ['w.csv', 'y.csv']
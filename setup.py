@@ -26,6 +26,8 @@ setup(
     extras_require={  # 额外的依赖列表
         'dev': ['check-manifest'],
         'test': ['coverage'],
+        'zstd': ['zstandard'],
+        'xxhash': ['xxhash'],
     },
     classifiers=[  # 分类器列表
         # 'License :: OSI Approved :: MIT License',